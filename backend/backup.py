@@ -0,0 +1,526 @@
+"""Streaming, incremental backup and restore of the CRM database.
+
+    python backup.py backup --out /var/backups/als [--full] [--include-sessions]
+    python backup.py restore /var/backups/als/20260101T020000Z [--drop] [--workers 4]
+    python backup.py verify /var/backups/als/20260101T020000Z
+    python backup.py prune --out /var/backups/als --keep 14
+
+Documents are streamed into gzip-compressed BSON chunks (readable with
+bsondump) with constant memory, and each run writes a manifest listing every
+chunk with its document count and checksums.
+
+A full run snapshots every collection. An incremental run writes, per
+collection, a delta against the previous run:
+
+- changed documents: those whose updated_at is past the previous run's
+  watermark (every API write stamps it), plus those whose _id is new;
+- deleted documents: the _ids that disappeared.
+
+New and deleted _ids come from merging the collection's _id index, read
+index-only in order on every run, with the _id list stored by the previous
+run. Documents themselves are only read when they changed. Users and
+sessions carry no updated_at and are small: they are snapshotted every run.
+
+The watermark trails the start of the run by BACKUP_WATERMARK_LAG_SECONDS so
+that writes still in flight, or not yet replicated to the secondary being
+read, are picked up by the next run. Restore loads the latest snapshot of
+each collection and replays the deltas after it in order; every
+BACKUP_FULL_EVERY-th run is a full one to keep that chain short.
+
+Collections are read one after the other, not as a cross-collection
+snapshot. Indexes are not backed up; the API recreates them at startup.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import bson
+from bson import decode_file_iter
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReplaceOne
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# Base names; per-division partitions and archives ("incidents_archive__als_pharma") are included
+BACKUP_COLLECTIONS = ['users', 'comptes', 'opportunites', 'opportunite_transitions', 'quality_records',
+                      'incidents', 'survey_responses', 'survey_scores', 'translation_keys', 'custom_statuses']
+SESSION_COLLECTIONS = ['user_sessions']
+# Every in-place write to these stamps updated_at
+WATERMARKED_COLLECTIONS = {'comptes', 'opportunites', 'quality_records', 'incidents',
+                           'translation_keys', 'custom_statuses'}
+# Only ever inserted and deleted, so the _id diff alone finds their changes
+APPEND_ONLY_COLLECTIONS = {'opportunite_transitions', 'survey_responses', 'survey_scores'}
+WATERMARK_FIELD = 'updated_at'
+WATERMARK_LAG_SECONDS = int(os.environ.get('BACKUP_WATERMARK_LAG_SECONDS', '300'))
+FULL_EVERY = int(os.environ.get('BACKUP_FULL_EVERY', '7'))
+CHUNK_DOCS = int(os.environ.get('BACKUP_CHUNK_DOCS', '50000'))
+CURSOR_BATCH_SIZE = 5000
+FETCH_BATCH_SIZE = 1000
+RESTORE_BATCH_SIZE = 1000
+COMPRESS_LEVEL = 6
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 2
+RAW = CodecOptions(document_class=RawBSONDocument)
+
+
+def no_progress(percent: int, message: str):
+    pass
+
+
+def base_collection(name: str) -> str:
+    return name.split('__', 1)[0].removesuffix('_archive')
+
+
+def strategy(name: str) -> str:
+    base = base_collection(name)
+    if base in WATERMARKED_COLLECTIONS:
+        return 'watermark'
+    if base in APPEND_ONLY_COLLECTIONS:
+        return 'append'
+    return 'snapshot'
+
+
+def id_order(value) -> tuple:
+    # MongoDB's cross-type sort order, so the merge compares _ids the way the index returned them.
+    # A mismatch on exotic types only costs efficiency: the _id is both deleted and re-fetched.
+    if isinstance(value, bool):
+        return 7, value
+    if isinstance(value, bson.Decimal128):
+        return 1, float(value.to_decimal())
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    if isinstance(value, bson.ObjectId):
+        return 6, value
+    if isinstance(value, datetime):
+        return 8, value
+    return 5, bson.encode({'_id': value})
+
+
+class HashingWriter:
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+class ChunkWriter:
+    # Cuts a stream of raw BSON documents into gzip chunks of CHUNK_DOCS; no file when nothing is written
+    def __init__(self, root: Path, backup_id: str, name: str, kind: str):
+        self.root = root
+        self.prefix = f'{backup_id}/{name}/{kind}'
+        self.chunks = []
+        self.state = None
+
+    def write(self, raw: bytes):
+        if self.state is None or self.state['count'] >= CHUNK_DOCS:
+            self.close_chunk()
+            self.open_chunk()
+        self.state['gz'].write(raw)
+        self.state['count'] += 1
+
+    def open_chunk(self):
+        relative = f'{self.prefix}-{len(self.chunks):06d}.bson.gz'
+        (self.root / relative).parent.mkdir(parents=True, exist_ok=True)
+        raw = open(self.root / relative, 'wb')
+        writer = HashingWriter(raw)
+        self.state = {'file': relative, 'raw': raw, 'writer': writer, 'count': 0,
+                      'gz': gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=COMPRESS_LEVEL)}
+
+    def close_chunk(self):
+        if self.state is None:
+            return
+        self.state['gz'].close()
+        self.state['raw'].close()
+        self.chunks.append({
+            'documents': self.state['count'],
+            'file': self.state['file'],
+            'file_sha256': self.state['writer'].sha.hexdigest(),
+            'bytes': self.state['writer'].size
+        })
+        self.state = None
+
+    def close(self) -> List[dict]:
+        self.close_chunk()
+        return self.chunks
+
+
+def read_chunks(root: Path, chunks: List[dict]) -> Iterator[RawBSONDocument]:
+    for chunk in chunks:
+        file = root / chunk['file']
+        if file_sha256(file) != chunk['file_sha256']:
+            raise ValueError(f'checksum mismatch for {chunk["file"]}')
+        with gzip.open(file, 'rb') as gz:
+            yield from decode_file_iter(gz, codec_options=RAW)
+
+
+def scan(db, name: str) -> Iterator[RawBSONDocument]:
+    collection = db.get_collection(name, codec_options=RAW)
+    return collection.find({}, sort=[('_id', 1)], batch_size=CURSOR_BATCH_SIZE)
+
+
+def scan_ids(db, name: str) -> Iterator[RawBSONDocument]:
+    # Covered by the _id index: no document is fetched
+    collection = db.get_collection(name, codec_options=RAW)
+    return collection.find({}, {'_id': 1}, sort=[('_id', 1)], batch_size=CURSOR_BATCH_SIZE).hint([('_id', 1)])
+
+
+def diff_ids(current: Iterator, previous: Iterator) -> tuple:
+    # Both in _id order: one merge pass gives the _ids that appeared and those that disappeared
+    added, removed = [], []
+    cur, prev = next(current, None), next(previous, None)
+    while cur is not None or prev is not None:
+        if prev is None or (cur is not None and id_order(cur) < id_order(prev)):
+            added.append(cur)
+            cur = next(current, None)
+        elif cur is None or id_order(prev) < id_order(cur):
+            removed.append(prev)
+            prev = next(previous, None)
+        else:
+            cur, prev = next(current, None), next(previous, None)
+    return added, removed
+
+
+def snapshot_collection(db, name: str, root: Path, backup_id: str) -> dict:
+    docs = ChunkWriter(root, backup_id, name, 'docs')
+    ids = ChunkWriter(root, backup_id, name, 'ids') if strategy(name) != 'snapshot' else None
+    count = 0
+    for doc in scan(db, name):
+        docs.write(doc.raw)
+        if ids:
+            ids.write(bson.encode({'_id': doc['_id']}))
+        count += 1
+    return {'mode': 'snapshot', 'documents': count, 'changed': count, 'deleted': 0,
+            'chunks': docs.close(), 'deleted_chunks': [], 'ids': ids.close() if ids else None}
+
+
+def delta_collection(db, name: str, root: Path, backup_id: str, previous: dict, since: str) -> dict:
+    ids = ChunkWriter(root, backup_id, name, 'ids')
+    count = 0
+
+    def current_ids():
+        nonlocal count
+        for doc in scan_ids(db, name):
+            ids.write(doc.raw)
+            count += 1
+            yield doc['_id']
+
+    added, removed = diff_ids(current_ids(), (doc['_id'] for doc in read_chunks(root, previous['ids'])))
+
+    collection = db.get_collection(name, codec_options=RAW)
+    docs = ChunkWriter(root, backup_id, name, 'docs')
+    seen = set()
+    changed = 0
+    if strategy(name) == 'watermark':
+        for doc in collection.find({WATERMARK_FIELD: {'$gt': since}}, batch_size=CURSOR_BATCH_SIZE):
+            docs.write(doc.raw)
+            seen.add(doc['_id'])
+            changed += 1
+    # An _id that was scanned and deleted before it is fetched shows up as removed next run
+    added = [i for i in added if i not in seen]
+    for start in range(0, len(added), FETCH_BATCH_SIZE):
+        for doc in collection.find({'_id': {'$in': added[start:start + FETCH_BATCH_SIZE]}}):
+            docs.write(doc.raw)
+            changed += 1
+
+    deleted = ChunkWriter(root, backup_id, name, 'deleted')
+    for value in removed:
+        deleted.write(bson.encode({'_id': value}))
+    return {'mode': 'delta', 'documents': count, 'changed': changed, 'deleted': len(removed),
+            'chunks': docs.close(), 'deleted_chunks': deleted.close(), 'ids': ids.close()}
+
+
+def backup_collection(db, name: str, root: Path, backup_id: str, previous: Optional[dict],
+                      since: Optional[str]) -> dict:
+    # A delta needs the previous _id list, and a watermark for collections updated in place
+    mode = strategy(name)
+    if not previous or previous.get('ids') is None or mode == 'snapshot' or (mode == 'watermark' and not since):
+        return snapshot_collection(db, name, root, backup_id)
+    return delta_collection(db, name, root, backup_id, previous, since)
+
+
+def list_backups(root: Path) -> List[dict]:
+    # Directories without a manifest are interrupted runs and are ignored
+    manifests = []
+    for path in sorted(root.glob(f'*/{MANIFEST_NAME}')):
+        with open(path) as f:
+            manifests.append(json.load(f))
+    return manifests
+
+
+def run_backup(db, root: Path, full: bool = False, include_sessions: bool = False,
+               base: Optional[str] = None, progress=no_progress) -> dict:
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    backup_id = now.strftime('%Y%m%dT%H%M%S%fZ')
+
+    previous = None
+    if not full:
+        backups = list_backups(root)
+        if base:
+            backups = [m for m in backups if m['id'] == base]
+            if not backups:
+                raise ValueError(f'Unknown base backup: {base}')
+        previous = backups[-1] if backups else None
+        # Restore replays every delta since the last full run
+        if previous and previous.get('chain_length', 0) + 1 >= FULL_EVERY:
+            previous = None
+
+    bases = set(BACKUP_COLLECTIONS + (SESSION_COLLECTIONS if include_sessions else []))
+    names = sorted(n for n in db.list_collection_names() if base_collection(n) in bases)
+    since = previous.get('watermark') if previous else None
+    collections = {}
+    for i, name in enumerate(names):
+        old = previous['collections'].get(name) if previous else None
+        collections[name] = backup_collection(db, name, root, backup_id, old, since)
+        progress(int((i + 1) * 100 / len(names)), name)
+
+    written = [c for col in collections.values() for c in chunk_files(col)]
+    stats = {
+        'written_chunks': len(written),
+        'changed_documents': sum(col['changed'] for col in collections.values()),
+        'deleted_documents': sum(col['deleted'] for col in collections.values()),
+        'bytes_written': sum(c['bytes'] for c in written),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+    manifest = {
+        'format': FORMAT_VERSION,
+        'id': backup_id,
+        'database': db.name,
+        'started_at': now.isoformat(),
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+        'base': previous['id'] if previous else None,
+        'chain_length': previous.get('chain_length', 0) + 1 if previous else 0,
+        'watermark': (now - timedelta(seconds=WATERMARK_LAG_SECONDS)).isoformat(),
+        'include_sessions': include_sessions,
+        'collections': collections,
+        'stats': stats
+    }
+    # The manifest is written last and atomically: it is what marks the backup as complete
+    directory = root / backup_id
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f'{MANIFEST_NAME}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, directory / MANIFEST_NAME)
+    return manifest
+
+
+def chunk_files(collection: dict) -> List[dict]:
+    return collection['chunks'] + collection.get('deleted_chunks', []) + (collection.get('ids') or [])
+
+
+def load_manifest(path: Path) -> tuple:
+    path = Path(path)
+    if path.is_dir():
+        path = path / MANIFEST_NAME
+    with open(path) as f:
+        return json.load(f), path.parent.parent
+
+
+def load_chain(manifest: dict, root: Path) -> List[dict]:
+    # The manifest and the runs it builds on, oldest first, back to the last full run
+    chain = [manifest]
+    while chain[0].get('base') and chain[0].get('chain_length', 0) > 0:
+        path = root / chain[0]['base'] / MANIFEST_NAME
+        if not path.exists():
+            raise ValueError(f'{chain[0]["id"]}: missing base backup {chain[0]["base"]}')
+        with open(path) as f:
+            chain.insert(0, json.load(f))
+    return chain
+
+
+def collection_chain(chain: List[dict], name: str) -> List[dict]:
+    # The collection's latest snapshot and the deltas written after it
+    entries = []
+    for manifest in reversed(chain):
+        entry = manifest['collections'].get(name)
+        if entry is None:
+            raise ValueError(f'{name}: missing from base backup {manifest["id"]}')
+        entries.insert(0, entry)
+        if entry.get('mode', 'snapshot') == 'snapshot':
+            return entries
+    raise ValueError(f'{name}: no snapshot in the backup chain')
+
+
+def file_sha256(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def verify_backup(path: Path) -> List[str]:
+    manifest, root = load_manifest(path)
+    try:
+        chain = load_chain(manifest, root)
+    except ValueError as e:
+        return [str(e)]
+    errors = []
+    for m in chain:
+        for name, collection in m['collections'].items():
+            for chunk in chunk_files(collection):
+                file = root / chunk['file']
+                if not file.exists():
+                    errors.append(f'{name}: missing {chunk["file"]}')
+                elif file_sha256(file) != chunk['file_sha256']:
+                    errors.append(f'{name}: checksum mismatch for {chunk["file"]}')
+    return errors
+
+
+def batched(docs: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def restore_collection(db, name: str, entries: List[dict], root: Path) -> int:
+    collection = db[name]
+    for entry in entries:
+        if entry.get('mode', 'snapshot') == 'snapshot':
+            # Raw documents go straight back to the server without a decode/encode round trip
+            for batch in batched(read_chunks(root, entry['chunks']), RESTORE_BATCH_SIZE):
+                collection.insert_many(batch, ordered=False)
+            continue
+        for batch in batched(read_chunks(root, entry['deleted_chunks']), RESTORE_BATCH_SIZE):
+            collection.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+        for batch in batched(read_chunks(root, entry['chunks']), RESTORE_BATCH_SIZE):
+            collection.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in batch], ordered=False)
+    return entries[-1]['documents']
+
+
+def run_restore(db, path: Path, drop: bool = False, workers: int = 4,
+                only: Optional[List[str]] = None, progress=no_progress) -> Dict[str, int]:
+    manifest, root = load_manifest(path)
+    chain = load_chain(manifest, root)
+    names = [n for n in manifest['collections'] if not only or base_collection(n) in only]
+    entries = {name: collection_chain(chain, name) for name in names}
+    existing = set(db.list_collection_names())
+    if not drop:
+        occupied = [n for n in names if n in existing and db[n].estimated_document_count()]
+        if occupied:
+            raise ValueError(f'Target collections are not empty (use --drop): {", ".join(occupied)}')
+    for name in names:
+        if drop:
+            db[name].drop()
+
+    restored = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(restore_collection, db, name, entries[name], root) for name in names}
+        for i, (name, future) in enumerate(futures.items()):
+            restored[name] = future.result()
+            progress(int((i + 1) * 100 / len(futures)), name)
+    return restored
+
+
+def prune_backups(root: Path, keep: int) -> List[str]:
+    # Older runs are only removed once no kept manifest builds on them
+    root = Path(root)
+    manifests = list_backups(root)
+    kept = manifests[-keep:] if keep > 0 else []
+    referenced = set()
+    for m in kept:
+        try:
+            chain = load_chain(m, root)
+        except ValueError:
+            chain = [m]
+        referenced |= {c['id'] for c in chain}
+        # Format 1 manifests pointed at unchanged chunks of earlier runs
+        referenced |= {f['file'].split('/', 1)[0] for c in chain for col in c['collections'].values()
+                       for f in chunk_files(col)}
+    removed = []
+    for m in manifests:
+        if m['id'] not in referenced:
+            shutil.rmtree(root / m['id'])
+            removed.append(m['id'])
+    return removed
+
+
+def connect(args):
+    client = MongoClient(args.mongo_url, readPreference=args.read_preference)
+    return client, client[args.db]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental backup and restore of the CRM database')
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default=os.environ.get('DB_NAME'))
+    parser.add_argument('--read-preference', default='secondaryPreferred')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup = commands.add_parser('backup', help='write a new backup (incremental unless --full)')
+    backup.add_argument('--out', default=os.environ.get('BACKUP_DIR', str(ROOT_DIR / 'backups')))
+    backup.add_argument('--full', action='store_true', help='ignore previous backups')
+    backup.add_argument('--base', help='backup id to take the delta against instead of the latest')
+    backup.add_argument('--include-sessions', action='store_true')
+
+    restore = commands.add_parser('restore', help='restore a backup directory or manifest')
+    restore.add_argument('path')
+    restore.add_argument('--drop', action='store_true', help='drop target collections first')
+    restore.add_argument('--workers', type=int, default=4, help='collections restored in parallel')
+    restore.add_argument('--only', nargs='*', help='base collection names to restore')
+
+    verify = commands.add_parser('verify', help='check every chunk of a backup and its bases against their checksums')
+    verify.add_argument('path')
+
+    prune = commands.add_parser('prune', help='delete old backups no kept backup builds on')
+    prune.add_argument('--out', default=os.environ.get('BACKUP_DIR', str(ROOT_DIR / 'backups')))
+    prune.add_argument('--keep', type=int, required=True)
+    args = parser.parse_args()
+
+    def report(percent: int, message: str):
+        print(f'[{percent:3d}%] {message}', file=sys.stderr)
+
+    if args.command == 'verify':
+        errors = verify_backup(Path(args.path))
+        for error in errors:
+            print(error)
+        sys.exit(1 if errors else 0)
+    if args.command == 'prune':
+        for backup_id in prune_backups(Path(args.out), args.keep):
+            print(f'removed {backup_id}')
+        return
+
+    client, db = connect(args)
+    try:
+        if args.command == 'backup':
+            manifest = run_backup(db, Path(args.out), args.full, args.include_sessions, args.base, report)
+            print(json.dumps({'id': manifest['id'], 'base': manifest['base'], **manifest['stats']}))
+        else:
+            restored = run_restore(db, Path(args.path), args.drop, args.workers, args.only, report)
+            print(json.dumps(restored))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
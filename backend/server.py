@@ -1,30 +1,408 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring, ReturnDocument
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.errors import CollectionInvalid, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Union
 import uuid
+import asyncio
+import json
+import base64
+import sys
+import math
+import re
+import unicodedata
+import time
+import random
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-import requests
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-import tempfile
+# bcrypt, requests, openpyxl and tempfile are imported where they are used
+# to keep them off the cold-start path (see tests/bench/cold_start.py)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ==================== METRICS ====================
+
+# Every thread (event loop, Motor executor threads) writes only to its own shard,
+# so recording needs no locks; /metrics merges the shards at scrape time.
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+metrics_local = threading.local()
+metrics_shards: List[dict] = []
+
+def metrics_shard() -> dict:
+    shard = getattr(metrics_local, 'shard', None)
+    if shard is None:
+        shard = metrics_local.shard = {}
+        metrics_shards.append(shard)
+    return shard
+
+def metrics_inc(name: str, labels: tuple, amount: float = 1):
+    shard = metrics_shard()
+    key = (name, labels)
+    shard[key] = shard.get(key, 0) + amount
+
+def metrics_observe(name: str, labels: tuple, seconds: float):
+    shard = metrics_shard()
+    key = (name, labels)
+    series = shard.get(key)
+    if series is None:
+        # One slot per bucket, one for +Inf, then the running sum
+        series = shard[key] = [0] * (len(METRICS_BUCKETS) + 2)
+    series[bisect_left(METRICS_BUCKETS, seconds)] += 1
+    series[-1] += seconds
+
+class MongoMetricsListener(monitoring.CommandListener):
+    def started(self, event):
+        pending = getattr(metrics_local, 'pending_commands', None)
+        if pending is None:
+            pending = metrics_local.pending_commands = {}
+        target = event.command.get(event.command_name)
+        pending[event.request_id] = (target if isinstance(target, str) else '', event.command)
+
+    def succeeded(self, event):
+        collection, command = getattr(metrics_local, 'pending_commands', {}).pop(event.request_id, ('', None))
+        labels = (('collection', collection), ('command', event.command_name))
+        metrics_observe('mongodb_command_duration_seconds', labels, event.duration_micros / 1e6)
+        if event.duration_micros >= SLOW_QUERY_MS * 1000 and command is not None:
+            record_slow_command(event.command_name, collection, command, event.duration_micros / 1000)
+        reply = event.reply or {}
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            documents = len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+        else:
+            documents = reply.get('n', 0)
+        if documents:
+            metrics_inc('mongodb_command_documents_total', labels, documents)
+
+    def failed(self, event):
+        collection, _ = getattr(metrics_local, 'pending_commands', {}).pop(event.request_id, ('', None))
+        labels = (('collection', collection), ('command', event.command_name))
+        metrics_observe('mongodb_command_duration_seconds', labels, event.duration_micros / 1e6)
+        metrics_inc('mongodb_command_failures_total', labels)
+
+def pool_address(event) -> tuple:
+    return (('address', f'{event.address[0]}:{event.address[1]}'),)
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    # In-use connections = checkouts - checkins, summed across metric shards
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        metrics_inc('mongodb_pool_connections_created_total', pool_address(event))
+
+    def connection_closed(self, event):
+        metrics_inc('mongodb_pool_connections_closed_total', pool_address(event))
+
+    def connection_check_out_failed(self, event):
+        metrics_inc('mongodb_pool_checkout_failures_total', pool_address(event))
+
+    def connection_checked_out(self, event):
+        metrics_inc('mongodb_pool_checkouts_total', pool_address(event))
+
+    def connection_checked_in(self, event):
+        metrics_inc('mongodb_pool_checkins_total', pool_address(event))
+
+def metrics_counter_total(name: str) -> Dict[tuple, float]:
+    totals: Dict[tuple, float] = {}
+    for shard in list(metrics_shards):
+        for (metric, labels), value in list(shard.items()):
+            if metric == name:
+                totals[labels] = totals.get(labels, 0) + value
+    return totals
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status_code[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            method = scope['method']
+            metrics_inc('http_requests_total', (('method', method), ('route', path), ('status', str(status_code[0]))))
+            metrics_observe('http_request_duration_seconds', (('method', method), ('route', path)), time.perf_counter() - start)
+
+def format_metric_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+def render_metrics(gauges: Dict[str, float]) -> str:
+    merged: Dict[tuple, Any] = {}
+    for shard in list(metrics_shards):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                total = merged.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    total[i] += v
+            else:
+                merged[key] = merged.get(key, 0) + value
+    
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(merged.items()):
+        if isinstance(value, list):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(METRICS_BUCKETS, value):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_metric_labels(labels, (("le", str(bound)),))} {cumulative}')
+            cumulative += value[len(METRICS_BUCKETS)]
+            lines.append(f'{name}_bucket{format_metric_labels(labels, (("le", "+Inf"),))} {cumulative}')
+            lines.append(f'{name}_sum{format_metric_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{format_metric_labels(labels)} {cumulative}')
+        else:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{format_metric_labels(labels)} {value}')
+    for name, value in gauges.items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+# ==================== SLOW OPERATIONS ====================
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', '1.0'))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '60'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_HEADER = 'x-profile'
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+
+slow_operations: deque = deque(maxlen=200)
+slow_explain_last: Dict[str, float] = {}
+slow_ops_state: Dict[str, Any] = {'loop': None, 'profiling': False}
+
+def query_shape(value):
+    # Keep field names and operators, replace literal values by their type
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [query_shape(v) for v in value[:3]]
+    return type(value).__name__
+
+def command_filter(command_name: str, command: dict):
+    if command_name == 'find':
+        return command.get('filter', {})
+    if command_name in ('count', 'distinct'):
+        return command.get('query', {})
+    if command_name == 'aggregate':
+        return command.get('pipeline', [])
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates') or command.get('deletes') or [{}]
+        return statements[0].get('q', {})
+    return {}
+
+def record_slow_command(command_name: str, collection: str, command: dict, duration_ms: float):
+    # Called from Motor executor threads: keep it cheap and hand explains to the event loop
+    if command_name in ('explain', 'getMore') or random.random() > SLOW_QUERY_SAMPLE_RATE:
+        return
+    shape = query_shape(command_filter(command_name, command))
+    entry = {
+        'ts': datetime.now(timezone.utc).isoformat(),
+        'command': command_name,
+        'collection': collection,
+        'duration_ms': round(duration_ms, 1),
+        'shape': shape,
+        'explain': None
+    }
+    slow_operations.append(entry)
+    logger.warning(f"Slow Mongo {command_name} on {collection} ({entry['duration_ms']} ms): {json.dumps(shape)}")
+    
+    # Rate limit explains per command shape
+    shape_key = f"{collection}:{command_name}:{json.dumps(shape, sort_keys=True)}"
+    now = time.monotonic()
+    loop = slow_ops_state['loop']
+    if command_name not in EXPLAINABLE_COMMANDS or loop is None:
+        return
+    if now - slow_explain_last.get(shape_key, -SLOW_QUERY_EXPLAIN_INTERVAL) < SLOW_QUERY_EXPLAIN_INTERVAL:
+        return
+    slow_explain_last[shape_key] = now
+    explained = {k: v for k, v in command.items() if k in (command_name, 'filter', 'query', 'pipeline', 'key', 'sort', 'projection', 'limit', 'skip', 'cursor')}
+    loop.call_soon_threadsafe(lambda: asyncio.create_task(capture_explain(entry, explained)))
+
+def summarize_explain(explain: dict) -> dict:
+    stats = explain.get('executionStats')
+    planner = explain.get('queryPlanner')
+    if stats is None and explain.get('stages'):
+        # Aggregations report the $cursor stage first
+        first = explain['stages'][0].get('$cursor', {})
+        stats = first.get('executionStats')
+        planner = first.get('queryPlanner')
+    stats = stats or {}
+    plan = (planner or {}).get('winningPlan', {})
+    plan = plan.get('queryPlan', plan)  # the SBE engine nests the classic plan
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        plan = plan.get('inputStage')
+    return {
+        'plan': [s for s in stages if s],
+        'n_returned': stats.get('nReturned'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'execution_ms': stats.get('executionTimeMillis')
+    }
+
+async def capture_explain(entry: dict, command: dict):
+    try:
+        explain = await db.command({'explain': command, 'verbosity': 'executionStats'})
+        entry['explain'] = summarize_explain(explain)
+        logger.warning(f"Explain for slow {entry['command']} on {entry['collection']}: {json.dumps(entry['explain'])}")
+    except Exception as e:
+        entry['explain'] = {'error': str(e)}
+
+class StackSampler:
+    # Samples one thread's Python stack and aggregates folded stacks (flamegraph format)
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return '\n'.join(f'{stack} {count}' for stack, count in sorted(self.counts.items()))
+
+class ProfilingMiddleware:
+    # Opt-in per request with the X-Profile header, Admin_Directeur only
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not any(k == PROFILE_HEADER.encode() for k, _ in scope['headers']):
+            await self.app(scope, receive, send)
+            return
+        try:
+            profiler_user = await get_current_user(Request(scope))
+        except HTTPException:
+            profiler_user = None
+        if profiler_user is None or profiler_user.role != 'Admin_Directeur' or slow_ops_state['profiling']:
+            await self.app(scope, receive, send)
+            return
+        
+        profile_id = str(uuid.uuid4())
+        
+        async def send_with_profile_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())]
+            await send(message)
+        
+        # Samples cover the event loop thread, so concurrent requests show up too
+        slow_ops_state['profiling'] = True
+        sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            slow_ops_state['profiling'] = False
+            await db.request_profiles.insert_one({
+                'id': profile_id,
+                'path': scope['path'],
+                'method': scope['method'],
+                'user_id': profiler_user.id,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+                'sample_interval': PROFILE_SAMPLE_INTERVAL,
+                'folded': sampler.folded(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'expire_at': datetime.now(timezone.utc) + timedelta(days=7)
+            })
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+# e.g. "zstd,snappy,zlib": zstd/snappy need the zstandard / python-snappy packages, zlib is built in
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+# Analytics and exports may read slightly stale data from secondaries (minimum 90s, -1 = no limit)
+MONGO_ANALYTICS_MAX_STALENESS = int(os.environ.get('MONGO_ANALYTICS_MAX_STALENESS', '120'))
+# List endpoints stay on the primary by default so users see their own writes immediately
+MONGO_LISTS_ON_ANALYTICS = os.environ.get('MONGO_LISTS_ON_ANALYTICS', 'false').lower() == 'true'
+
+mongo_options = {
+    'maxPoolSize': MONGO_MAX_POOL_SIZE,
+    'minPoolSize': MONGO_MIN_POOL_SIZE,
+    'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+    'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+}
+if MONGO_COMPRESSORS:
+    mongo_options['compressors'] = MONGO_COMPRESSORS
+
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[MongoMetricsListener(), MongoPoolListener()],
+    **mongo_options
+)
 db = client[os.environ['DB_NAME']]
+analytics_db = client.get_database(
+    os.environ['DB_NAME'],
+    read_preference=SecondaryPreferred(max_staleness=MONGO_ANALYTICS_MAX_STALENESS)
+)
+list_db = analytics_db if MONGO_LISTS_ON_ANALYTICS else db
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'als-groupe-frigo-kpi-secret-key-2025')
@@ -52,6 +430,13 @@ class User(BaseModel):
     region: Optional[str] = None  # IDF / HDF
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UserDirectoryEntry(BaseModel):
+    # Role-safe projection of User, visible to every authenticated user
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    role: str
+
 class UserSession(BaseModel):
     model_config = ConfigDict(extra="ignore")
     user_id: str
@@ -102,6 +487,16 @@ class CompteCreate(BaseModel):
     contact_telephone: Optional[str] = None
     source: Optional[str] = None
 
+class CompteExpanded(Compte):
+    created_by_name: Optional[str] = None  # ?expand=created_by
+
+class CompteSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    raison_sociale: str
+    division: str
+    region: str
+
 class Opportunite(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -122,6 +517,10 @@ class Opportunite(BaseModel):
     montant_estime: Optional[float] = None
     prochaine_relance: Optional[datetime] = None
     commentaires: Optional[str] = None
+    # Derived at write time from depart / arrivee / temperatures
+    lane_key: Optional[str] = None
+    temperature_regime: Optional[str] = None
+    division: Optional[str] = None  # Copied from the compte, routes the partition
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class OpportuniteCreate(BaseModel):
@@ -142,6 +541,19 @@ class OpportuniteCreate(BaseModel):
     prochaine_relance: Optional[datetime] = None
     commentaires: Optional[str] = None
 
+class OpportuniteExpanded(Opportunite):
+    compte: Optional[CompteSummary] = None  # ?expand=compte
+    commercial_responsable_name: Optional[str] = None  # ?expand=commercial_responsable
+
+class OpportuniteTransition(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    opportunite_id: str
+    from_statut: Optional[str] = None  # None for the initial status at creation
+    to_statut: str
+    changed_by: str
+    changed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class QualityRecord(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -177,6 +589,7 @@ class Incident(BaseModel):
     statut: str = "Ouvert"
     action_corrective: Optional[str] = None
     closed_at: Optional[datetime] = None
+    division: Optional[str] = None  # Copied from the fiche qualité, routes the partition
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class IncidentCreate(BaseModel):
@@ -234,12 +647,40 @@ class TokenResponse(BaseModel):
     token: str
     user: dict
 
+# ==================== REPORT MODELS ====================
+
+class PivotMeasure(BaseModel):
+    field: Optional[str] = None  # not needed for count
+    agg: str = "sum"  # sum / mean / count / min / max
+
+# Filter values are matched literally: a dict would reach $match as a query operator
+PivotFilterValue = Union[str, int, float, bool, None]
+
+class PivotSpec(BaseModel):
+    source: str  # opportunites, comptes, quality_records, incidents
+    rows: List[str]  # "statut", "compte.region", "created_at:month"
+    columns: List[str] = []
+    measures: List[PivotMeasure] = [PivotMeasure(agg="count")]
+    filters: Dict[str, Union[PivotFilterValue, List[PivotFilterValue]]] = {}
+    format: str = "json"  # json / xlsx
+
+# ==================== JOB MODELS ====================
+
+class JobSubmit(BaseModel):
+    type: str  # export, backup, delete_comptes, backfill_lanes, archive, migrate_divisions, init_translations, ...
+    params: Dict[str, Any] = {}
+
+class DeleteComptesParams(BaseModel):
+    compte_ids: List[str]
+
 # ==================== AUTH HELPER FUNCTIONS ====================
 
 def hash_password(password: str) -> str:
+    import bcrypt
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 def create_jwt_token(user_id: str) -> str:
@@ -285,6 +726,824 @@ async def get_current_user(request: Request) -> User:
     
     raise HTTPException(status_code=401, detail="Session invalide")
 
+# ==================== AUDIT LOG ====================
+
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', '2'))
+AUDIT_ENQUEUE_TIMEOUT = float(os.environ.get('AUDIT_ENQUEUE_TIMEOUT', '0.5'))
+AUDIT_EXCLUDED_FIELDS = {'password_hash'}
+
+# Mutation handlers only enqueue, the flusher task persists entries with insert_many
+audit_queue: asyncio.Queue = asyncio.Queue(maxsize=AUDIT_QUEUE_SIZE)
+audit_stats = {'enqueued': 0, 'flushed': 0, 'dropped': 0}
+
+def audit_diff(before: Optional[dict], after: Optional[dict]) -> dict:
+    before = before or {}
+    after = after or {}
+    changes = {}
+    for field in set(before) | set(after):
+        if field in AUDIT_EXCLUDED_FIELDS or field == '_id':
+            continue
+        if before.get(field) != after.get(field):
+            changes[field] = {'before': before.get(field), 'after': after.get(field)}
+    return changes
+
+async def audit_change(entity: str, entity_id: str, action: str, user_id: Optional[str],
+                       before: Optional[dict] = None, after: Optional[dict] = None):
+    changes = audit_diff(before, after)
+    if action == 'update' and not changes:
+        return
+    entry = {
+        'id': str(uuid.uuid4()),
+        'entity': entity,
+        'entity_id': entity_id,
+        'action': action,  # create / update / delete
+        'user_id': user_id,
+        'changes': changes,
+        'ts': datetime.now(timezone.utc).isoformat()
+    }
+    # Backpressure: wait briefly for room in the queue, then drop rather than block the request
+    try:
+        await asyncio.wait_for(audit_queue.put(entry), timeout=AUDIT_ENQUEUE_TIMEOUT)
+        audit_stats['enqueued'] += 1
+    except asyncio.TimeoutError:
+        audit_stats['dropped'] += 1
+        logger.warning(f"Audit queue full, dropped entry for {entity}/{entity_id}")
+
+async def flush_audit_batch(batch: List[dict]):
+    if not batch:
+        return
+    try:
+        await db.audit_log.insert_many(batch, ordered=False)
+        audit_stats['flushed'] += len(batch)
+    except Exception as e:
+        audit_stats['dropped'] += len(batch)
+        logger.error(f"Audit flush failed ({len(batch)} entries): {str(e)}")
+
+def drain_audit_queue(limit: Optional[int] = None) -> List[dict]:
+    batch = []
+    while not audit_queue.empty() and (limit is None or len(batch) < limit):
+        batch.append(audit_queue.get_nowait())
+    return batch
+
+async def collect_audit_entry(batch: List[dict], timeout: float) -> bool:
+    # asyncio.wait rather than wait_for: wait_for can swallow a cancellation that lands as the
+    # get completes, and shutdown would then wait on the flusher forever
+    getter = asyncio.ensure_future(audit_queue.get())
+    try:
+        done, _ = await asyncio.wait({getter}, timeout=timeout)
+    finally:
+        if getter.done() and not getter.cancelled():
+            batch.append(getter.result())
+        else:
+            getter.cancel()
+    return bool(done)
+
+async def audit_flusher():
+    loop = asyncio.get_running_loop()
+    batch: List[dict] = []
+    try:
+        while True:
+            batch = [await audit_queue.get()]
+            deadline = loop.time() + AUDIT_FLUSH_SECONDS
+            # Flush when the batch is full or the oldest entry has waited long enough
+            while len(batch) < AUDIT_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not await collect_audit_entry(batch, remaining):
+                    break
+            await flush_audit_batch(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # Graceful shutdown: persist whatever is still buffered
+        await flush_audit_batch(batch + drain_audit_queue())
+        raise
+
+# ==================== EVENT BUS ====================
+
+# In-process pub/sub fed by the write handlers. Handlers must not block:
+# subscribers only flag work for their own background tasks.
+event_subscribers: Dict[str, List[Any]] = {}
+
+def subscribe_event(topic: str, handler):
+    event_subscribers.setdefault(topic, []).append(handler)
+
+def publish_event(topic: str, action: str, entity_id: Optional[str] = None):
+    for handler in event_subscribers.get(topic, []):
+        try:
+            handler(topic, action, entity_id)
+        except Exception as e:
+            logger.error(f"Event handler for {topic} failed: {str(e)}")
+
+# ==================== RESPONSE CACHE ====================
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TAGS = ['comptes', 'opportunites', 'quality_records', 'incidents', 'users']
+
+class InMemoryResponseCache:
+    # Per-process LRU bounded by entry count and total body size
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        body, expires = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return body
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (body, time.monotonic() + ttl)
+        self.size += len(body)
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str):
+        body, _ = self.entries.pop(key)
+        self.size -= len(body)
+
+    async def tag_versions(self, tags: List[str]) -> List[int]:
+        return [self.versions.get(tag, 0) for tag in tags]
+
+    async def bump(self, tag: str):
+        self.versions[tag] = self.versions.get(tag, 0) + 1
+
+class RedisResponseCache:
+    # Shared across workers; tag versions live in Redis so any worker's write invalidates
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(f'rc:{key}')
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        await self.redis.set(f'rc:{key}', body, ex=max(1, math.ceil(ttl)))
+
+    async def tag_versions(self, tags: List[str]) -> List[int]:
+        values = await self.redis.mget([f'rc:tag:{tag}' for tag in tags])
+        return [int(v or 0) for v in values]
+
+    async def bump(self, tag: str):
+        await self.redis.incr(f'rc:tag:{tag}')
+
+def create_response_cache():
+    if RESPONSE_CACHE_BACKEND == 'redis':
+        import redis.asyncio as redis_asyncio  # only imported for this backend
+        return RedisResponseCache(redis_asyncio.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0')))
+    return InMemoryResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+response_cache = create_response_cache()
+response_cache_inflight: Dict[str, asyncio.Future] = {}
+# Tag bumps this worker has not finished yet. Readers here await them before reading the versions,
+# so a worker always sees its own writes, while keys only hold the backend's shared versions.
+pending_tag_bumps: Dict[str, set] = {}
+
+async def bump_tag(topic: str):
+    try:
+        await response_cache.bump(topic)
+    except Exception as e:
+        logger.warning(f"Response cache invalidation of {topic} failed: {str(e)}")
+        raise
+
+def invalidate_response_cache(topic: str, action: str, entity_id: Optional[str]):
+    # Readers await every pending bump of a topic, not only the latest one
+    task = asyncio.get_running_loop().create_task(bump_tag(topic))
+    pending_tag_bumps.setdefault(topic, set()).add(task)
+    task.add_done_callback(lambda t: pending_tag_bumps.get(topic, set()).discard(t))
+
+for _topic in RESPONSE_CACHE_TAGS:
+    subscribe_event(_topic, invalidate_response_cache)
+
+async def shared_tag_versions(tags: List[str]) -> Optional[List[int]]:
+    # The backend's versions, once this worker's own bumps have landed. None when one failed:
+    # the shared version may predate this worker's own write, so no cache can be trusted.
+    pending = [task for t in tags for task in pending_tag_bumps.get(t, ())]
+    if pending:
+        bumps = await asyncio.gather(*(asyncio.shield(t) for t in pending), return_exceptions=True)
+        if any(isinstance(b, BaseException) for b in bumps):
+            return None
+    return await response_cache.tag_versions(tags)
+
+async def cached_response(route: str, scope: str, tags: List[str], compute, adapter: Optional[TypeAdapter] = None,
+                          params: Optional[dict] = None) -> Response:
+    def render(result) -> bytes:
+        return adapter.dump_json(adapter.validate_python(result)) if adapter else json.dumps(result).encode()
+    
+    versions = await shared_tag_versions(tags)
+    if versions is None:
+        metrics_inc('response_cache_requests_total', (('route', route), ('result', 'bypass')))
+        return Response(content=render(await compute()), media_type='application/json')
+    query = '&'.join(f'{k}={v}' for k, v in sorted((params or {}).items()) if v is not None)
+    key = f"{route}?{query}|{scope}|{','.join(map(str, versions))}"
+    
+    body = await response_cache.get(key)
+    if body is not None:
+        metrics_inc('response_cache_requests_total', (('route', route), ('result', 'hit')))
+    elif key in response_cache_inflight:
+        # Stampede protection: concurrent misses wait for the first computation
+        metrics_inc('response_cache_requests_total', (('route', route), ('result', 'coalesced')))
+        body = await asyncio.shield(response_cache_inflight[key])
+    else:
+        metrics_inc('response_cache_requests_total', (('route', route), ('result', 'miss')))
+        future = asyncio.get_running_loop().create_future()
+        response_cache_inflight[key] = future
+        try:
+            body = render(await compute())
+            await response_cache.set(key, body, RESPONSE_CACHE_TTL_SECONDS)
+            future.set_result(body)
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            response_cache_inflight.pop(key, None)
+    return Response(content=body, media_type='application/json')
+
+def response_cache_stats() -> dict:
+    totals = metrics_counter_total('response_cache_requests_total')
+    stats: Dict[str, Dict[str, float]] = {}
+    for labels, count in totals.items():
+        label = dict(labels)
+        stats.setdefault(label['route'], {'hit': 0, 'miss': 0, 'coalesced': 0, 'bypass': 0})[label['result']] += count
+    for route_stats in stats.values():
+        total = sum(route_stats.values())
+        route_stats['hit_ratio'] = round((route_stats['hit'] + route_stats['coalesced']) / total, 4) if total else None
+    return stats
+
+# ==================== REFERENCE EXPANSION ====================
+
+USER_DIRECTORY_PROJECTION = {'_id': 0, 'id': 1, 'name': 1, 'role': 1}
+COMPTE_SUMMARY_PROJECTION = {'_id': 0, 'id': 1, 'raison_sociale': 1, 'division': 1, 'region': 1}
+
+def parse_expand(expand: Optional[str], allowed: List[str]) -> List[str]:
+    if not expand:
+        return []
+    fields = sorted({f.strip() for f in expand.split(',') if f.strip()})
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"expand inconnu: {', '.join(unknown)} (autorisés: {', '.join(allowed)})")
+    return fields
+
+async def lookup_by_ids(collection: str, ids, projection: dict) -> Dict[str, dict]:
+    # One batched $in query (per partition) for every distinct reference on the page
+    ids = list({i for i in ids if i})
+    if not ids:
+        return {}
+    docs = await find_partitioned(list_db, collection, {'id': {'$in': ids}}, projection, limit=len(ids))
+    return {d['id']: d for d in docs}
+
+async def expand_user_names(docs: List[dict], field: str, target: str):
+    users = await lookup_by_ids('users', (d.get(field) for d in docs), USER_DIRECTORY_PROJECTION)
+    for d in docs:
+        d[target] = users.get(d.get(field), {}).get('name')
+
+# ==================== JOBS ====================
+
+JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', '10'))
+JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_RESULT_TTL_HOURS = float(os.environ.get('JOB_RESULT_TTL_HOURS', '24'))
+JOB_RESULTS_DIR = Path(os.environ.get('JOB_RESULTS_DIR', str(ROOT_DIR / 'job_results')))
+BACKUP_DIR = Path(os.environ.get('BACKUP_DIR', str(ROOT_DIR / 'backups')))
+JOB_FINISHED_STATUSES = ['succeeded', 'failed', 'cancelled']
+WORKER_ID = str(uuid.uuid4())
+# Handlers run on the API's event loop, which Motor is bound to. Their CPU-bound steps (sheet
+# rows, derived fields, the backup) go to this pool, sized like the number of concurrent jobs
+job_executor = ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix='job')
+
+# Jobs are claimed from the jobs collection, so any worker process can run them
+job_wakeup = asyncio.Event()
+running_jobs: Dict[str, asyncio.Task] = {}
+cancelled_jobs: set = set()
+
+class JobCancelled(Exception):
+    pass
+
+async def no_progress(percent: int, message: str):
+    pass
+
+async def run_job_work(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(job_executor, fn, *args)
+
+class JobContext:
+    def __init__(self, job: dict):
+        self.job = job
+        self.last_update = 0.0
+
+    async def progress(self, percent: int, message: str):
+        # Progress writes are throttled and double as the cancellation check point
+        now = time.monotonic()
+        if percent < 100 and now - self.last_update < 1:
+            return
+        self.last_update = now
+        doc = await db.jobs.find_one_and_update(
+            {'id': self.job['id']},
+            {'$set': {'progress': percent, 'message': message, 'heartbeat_at': datetime.now(timezone.utc).isoformat()}},
+            projection={'_id': 0, 'cancel_requested': 1}
+        )
+        if doc and doc.get('cancel_requested'):
+            raise JobCancelled()
+
+    def result_file(self, suffix: str) -> str:
+        JOB_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        return str(JOB_RESULTS_DIR / f"{self.job['id']}{suffix}")
+
+async def finish_job(job_id: str, status: str, **fields):
+    await db.jobs.update_one(
+        {'id': job_id},
+        {'$set': {'status': status, 'finished_at': datetime.now(timezone.utc).isoformat(), **fields}}
+    )
+
+async def job_heartbeat(job_id: str):
+    # Keeps long steps without progress calls from being taken for a crashed worker
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        await db.jobs.update_one({'id': job_id}, {'$set': {'heartbeat_at': datetime.now(timezone.utc).isoformat()}})
+
+async def execute_job(job: dict):
+    job_id = job['id']
+    heartbeat = asyncio.create_task(job_heartbeat(job_id))
+    try:
+        handler = JOB_TYPES[job['type']]['handler']
+        outcome = await handler(JobContext(job), job.get('params', {}), job['created_by'])
+        await finish_job(job_id, 'succeeded', progress=100, message='Terminé', **outcome)
+    except JobCancelled:
+        await finish_job(job_id, 'cancelled', message='Annulé')
+    except asyncio.CancelledError:
+        if job_id in cancelled_jobs:
+            await finish_job(job_id, 'cancelled', message='Annulé')
+        else:
+            # Worker shutting down: hand the job back to the queue
+            await db.jobs.update_one({'id': job_id}, {'$set': {'status': 'queued', 'worker_id': None}})
+        raise
+    except Exception as e:
+        logger.error(f"Job {job_id} ({job['type']}) failed: {str(e)}")
+        await finish_job(job_id, 'failed', error=str(e))
+    finally:
+        heartbeat.cancel()
+        cancelled_jobs.discard(job_id)
+        running_jobs.pop(job_id, None)
+        job_wakeup.set()
+
+async def job_dispatcher():
+    try:
+        while True:
+            while len(running_jobs) < JOB_MAX_WORKERS:
+                now = datetime.now(timezone.utc).isoformat()
+                job = await db.jobs.find_one_and_update(
+                    {'status': 'queued'},
+                    {'$set': {'status': 'running', 'worker_id': WORKER_ID, 'started_at': now, 'heartbeat_at': now},
+                     '$inc': {'attempts': 1}},
+                    sort=[('created_at', 1)],
+                    projection={'_id': 0},
+                    return_document=ReturnDocument.AFTER
+                )
+                if not job:
+                    break
+                running_jobs[job['id']] = asyncio.create_task(execute_job(job))
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+    except asyncio.CancelledError:
+        tasks = list(running_jobs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def recover_stale_jobs():
+    # A running job whose heartbeat stopped belongs to a crashed worker: retry it
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+    stale = {'status': 'running', 'heartbeat_at': {'$lt': cutoff}}
+    await db.jobs.update_many(
+        {**stale, 'attempts': {'$lt': JOB_MAX_ATTEMPTS}},
+        {'$set': {'status': 'queued', 'worker_id': None}}
+    )
+    await db.jobs.update_many(
+        {**stale, 'attempts': {'$gte': JOB_MAX_ATTEMPTS}},
+        {'$set': {'status': 'failed', 'error': 'Abandonné après plusieurs tentatives',
+                  'finished_at': datetime.now(timezone.utc).isoformat()}}
+    )
+    job_wakeup.set()
+
+async def cleanup_job_results():
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=JOB_RESULT_TTL_HOURS)).isoformat()
+    async for job in db.jobs.find(
+        {'status': {'$in': JOB_FINISHED_STATUSES}, 'finished_at': {'$lt': cutoff}, 'result_path': {'$ne': None}},
+        {'_id': 0, 'id': 1, 'result_path': 1}
+    ):
+        try:
+            os.remove(job['result_path'])
+        except FileNotFoundError:
+            pass
+        await db.jobs.update_one({'id': job['id']}, {'$set': {'result_path': None, 'result_expired': True}})
+
+# ==================== PARTITIONING ====================
+
+# Per-division collections ("comptes__als_pharma"). Turn DIVISION_PARTITIONING on, then run the
+# migrate_divisions job: until it has emptied the legacy collections, reads cover them as well
+DIVISIONS = ['ALS FRESH FOOD', 'ALS PHARMA']
+PARTITIONED_COLLECTIONS = ['comptes', 'opportunites', 'quality_records', 'incidents']
+DIVISION_PARTITIONING = os.environ.get('DIVISION_PARTITIONING', 'false').lower() == 'true'
+ALL_DIVISIONS_ROLES = ['Admin_Directeur', 'Assistante_Direction']
+
+def is_partitioned(collection: str) -> bool:
+    return DIVISION_PARTITIONING and collection.removesuffix('_archive') in PARTITIONED_COLLECTIONS
+
+def check_division(division: Optional[str]):
+    if DIVISION_PARTITIONING and division not in DIVISIONS:
+        raise HTTPException(status_code=400, detail=f"Division inconnue: {division}")
+
+def partition_name(collection: str, division: Optional[str]) -> str:
+    if not is_partitioned(collection):
+        return collection
+    check_division(division)
+    return f"{collection}__{fold_text(division).replace(' ', '_')}"
+
+# Legacy single collections that still hold documents. They are read alongside the partitions,
+# unfiltered by division as before partitioning; new documents always go to a partition
+legacy_collections: set = set()
+
+async def refresh_legacy_collections():
+    for name in PARTITIONED_COLLECTIONS + list(ARCHIVE_COLLECTIONS.values()):
+        if await db[name].find_one({}, {'_id': 1}):
+            legacy_collections.add(name)
+        else:
+            legacy_collections.discard(name)
+
+def partition_names(collection: str, divisions: Optional[List[str]] = None) -> List[str]:
+    if not is_partitioned(collection):
+        return [collection]
+    names = [partition_name(collection, d) for d in divisions or DIVISIONS]
+    return names + ([collection] if collection in legacy_collections else [])
+
+def partition_base(name: str) -> str:
+    return name.split('__', 1)[0]
+
+def user_divisions(user: User) -> Optional[List[str]]:
+    # None reads every division: direction roles, and users without a known division
+    if not DIVISION_PARTITIONING or user.role in ALL_DIVISIONS_ROLES or user.division not in DIVISIONS:
+        return None
+    return [user.division]
+
+async def find_partitioned(database, collection: str, query: dict, projection: Optional[dict] = None,
+                           divisions: Optional[List[str]] = None, limit: int = 1000) -> List[dict]:
+    # Cross-division reads fan out concurrently, one query per partition
+    results = await asyncio.gather(*(
+        database[name].find(query, projection or {'_id': 0}).to_list(limit)
+        for name in partition_names(collection, divisions)
+    ))
+    return [doc for docs in results for doc in docs]
+
+async def find_one_partitioned(database, collection: str, query: dict,
+                               projection: Optional[dict] = None) -> Tuple[Optional[dict], Optional[str]]:
+    # Returns the document and the partition holding it, for the follow-up write
+    names = partition_names(collection)
+    results = await asyncio.gather(*(database[name].find_one(query, projection or {'_id': 0}) for name in names))
+    for name, doc in zip(names, results):
+        if doc:
+            return doc, name
+    return None, None
+
+async def count_partitioned(database, collection: str, query: dict, divisions: Optional[List[str]] = None) -> int:
+    counts = await asyncio.gather(*(
+        database[name].count_documents(query) for name in partition_names(collection, divisions)
+    ))
+    return sum(counts)
+
+def partitioned_pipeline(collection: str, head, divisions: Optional[List[str]] = None) -> Tuple[str, List[dict]]:
+    # head(route) builds one partition's leading stages; route maps a base collection to that
+    # partition, so $lookup stays within a division. The partitions are unioned server-side.
+    if is_partitioned(collection):
+        routes = [lambda name, d=d: partition_name(name, d) for d in divisions or DIVISIONS]
+        if collection in legacy_collections:
+            routes.append(lambda name: name)
+    else:
+        routes = [lambda name: name]
+    first, *rest = routes
+    pipeline = head(first) + [{'$unionWith': {'coll': route(collection), 'pipeline': head(route)}} for route in rest]
+    return first(collection), pipeline
+
+def lookup_across_partitions(collection: str, local_field: str, foreign_field: str, projection: dict,
+                             as_field: str) -> List[dict]:
+    # For references that may cross divisions: one $lookup per partition, the first match wins
+    names = partition_names(collection)
+    parts = [f'_{as_field}_{i}' for i in range(len(names))]
+    lookups = [{'$lookup': {
+        'from': name,
+        'localField': local_field,
+        'foreignField': foreign_field,
+        'pipeline': [{'$project': projection}],
+        'as': part
+    }} for name, part in zip(names, parts)]
+    return lookups + [
+        {'$set': {as_field: {'$first': {'$concatArrays': [f'${part}' for part in parts]}}}},
+        {'$unset': parts}
+    ]
+
+async def move_documents(source, target, criteria: dict, extra: Optional[dict] = None,
+                         batch_size: int = 500, on_moved=None) -> int:
+    from pymongo import ReplaceOne
+    
+    moved = 0
+    while True:
+        docs = await source.find(criteria, {'_id': 0}).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        ids = [d['id'] for d in docs]
+        # Copy before delete: an interrupted batch leaves a duplicate the next run overwrites, never a loss
+        await target.bulk_write(
+            [ReplaceOne({'id': d['id']}, {**d, **(extra or {})}, upsert=True) for d in docs],
+            ordered=False
+        )
+        result = await source.delete_many({'id': {'$in': ids}, **criteria})
+        still_there = []
+        if result.deleted_count < len(ids):
+            # Edited out of the criteria while the batch was in flight: the source copy wins
+            still_there = await source.distinct('id', {'id': {'$in': ids}})
+            await target.delete_many({'id': {'$in': still_there}})
+        if on_moved:
+            await on_moved([d for d in docs if d['id'] not in still_there])
+        moved += result.deleted_count
+        if result.deleted_count == 0:
+            break
+    return moved
+
+async def rehome(collection: str, query: dict, from_division: Optional[str], to_division: str) -> int:
+    # A division change moves the documents to the new partition, archived ones included
+    moved = 0
+    names = [collection] + ([ARCHIVE_COLLECTIONS[collection]] if collection in ARCHIVE_COLLECTIONS else [])
+    for name in names:
+        source, target = partition_name(name, from_division), partition_name(name, to_division)
+        if name == collection:
+            # Clients scoped to the old division drop them; the others get them back as updates,
+            # stamped after the tombstones so they supersede them. The update handlers have already
+            # written the new division, so the tombstones are filed under the old one explicitly.
+            projection = {'_id': 0, 'id': 1, **{f: 1 for f in SYNC_SCOPE_FIELDS}}
+            docs = await db[source].find(query, projection).to_list(None)
+            await record_tombstones(collection, [{**d, 'division': from_division} for d in docs])
+        now = datetime.now(timezone.utc).isoformat()
+        await db[source].update_many(query, {'$set': {'division': to_division, 'updated_at': now}})
+        if source != target:
+            moved += await move_documents(db[source], db[target], query)
+    return moved
+
+async def division_of(collection: str, doc_id: str) -> Optional[str]:
+    doc, _ = await find_one_partitioned(db, collection, {'id': doc_id}, {'_id': 0, 'division': 1})
+    return doc.get('division') if doc else None
+
+async def find_one_and_delete_partitioned(collection: str, query: dict) -> Optional[dict]:
+    _, name = await find_one_partitioned(db, collection, query, {'_id': 0, 'id': 1})
+    return await db[name].find_one_and_delete(query, projection={'_id': 0}) if name else None
+
+async def migrate_divisions(progress=no_progress) -> dict:
+    # Splits the legacy single collections into partitions; idempotent and resumable
+    if not DIVISION_PARTITIONING:
+        raise RuntimeError("DIVISION_PARTITIONING doit être activé avant la migration")
+    parents = {'opportunites': ('comptes', 'compte_id'), 'incidents': ('quality_records', 'quality_record_id')}
+    summary = {}
+    # Parents before children, so opportunités and incidents can look up their division
+    steps = []
+    for collection in PARTITIONED_COLLECTIONS:
+        steps.append(collection)
+        if collection in ARCHIVE_COLLECTIONS:
+            steps.append(ARCHIVE_COLLECTIONS[collection])
+    for i, name in enumerate(steps):
+        base = name.removesuffix('_archive')
+        moved, unrouted = 0, 0
+        last_id = None
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id else {}
+            docs = await db[name].find(query).sort('_id', 1).limit(1000).to_list(1000)
+            if not docs:
+                break
+            last_id = docs[-1]['_id']
+            if base in parents:
+                # Opportunités and incidents follow the division of their compte / fiche qualité
+                parent, key = parents[base]
+                owners = await find_partitioned(db, parent, {'id': {'$in': list({d.get(key) for d in docs})}},
+                                                {'_id': 0, 'id': 1, 'division': 1})
+                divisions = {o['id']: o.get('division') for o in owners}
+                for d in docs:
+                    d['division'] = divisions.get(d.get(key))
+            by_division: Dict[str, List[str]] = {}
+            for d in docs:
+                if d.get('division') in DIVISIONS:
+                    by_division.setdefault(d['division'], []).append(d['id'])
+                else:
+                    unrouted += 1
+            for division, ids in by_division.items():
+                extra = {'division': division} if base in parents else None
+                moved += await move_documents(db[name], db[partition_name(name, division)], {'id': {'$in': ids}}, extra)
+        summary[name] = {'moved': moved, 'unrouted': unrouted}
+        await progress(int((i + 1) * 100 / len(steps)), name)
+    await refresh_legacy_collections()
+    for collection in PARTITIONED_COLLECTIONS:
+        publish_event(collection, 'migrate')
+    return summary
+
+# ==================== ARCHIVE ====================
+
+# Closed records move out of the hot collections that lists, dashboards and counts scan
+ARCHIVE_COLLECTIONS = {'incidents': 'incidents_archive', 'opportunites': 'opportunites_archive'}
+ARCHIVE_INCIDENTS_AFTER_DAYS = int(os.environ.get('ARCHIVE_INCIDENTS_AFTER_DAYS', '90'))
+ARCHIVE_OPPORTUNITES_PERDU_AFTER_DAYS = int(os.environ.get('ARCHIVE_OPPORTUNITES_PERDU_AFTER_DAYS', '180'))
+ARCHIVE_OPPORTUNITES_AFTER_DAYS = int(os.environ.get('ARCHIVE_OPPORTUNITES_AFTER_DAYS', '730'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))  # 0 disables the scheduled mover
+ARCHIVE_COMPRESSOR = os.environ.get('ARCHIVE_COMPRESSOR', 'zstd')
+archive_lock = asyncio.Lock()
+archive_state: Dict[str, Any] = {'last_run_at': None, 'last_moved': None}
+
+def archive_criteria(collection: str, now: datetime) -> dict:
+    # Dates are stored as ISO strings in UTC, so they compare lexicographically
+    if collection == 'incidents':
+        cutoff = (now - timedelta(days=ARCHIVE_INCIDENTS_AFTER_DAYS)).isoformat()
+        return {'statut': {'$in': INCIDENT_CLOSED_STATUSES}, 'closed_at': {'$lt': cutoff}}
+    lost_cutoff = (now - timedelta(days=ARCHIVE_OPPORTUNITES_PERDU_AFTER_DAYS)).isoformat()
+    old_cutoff = (now - timedelta(days=ARCHIVE_OPPORTUNITES_AFTER_DAYS)).isoformat()
+    # Open opportunités stay hot whatever their age
+    return {'$or': [
+        {'statut': 'Perdu', 'created_at': {'$lt': lost_cutoff}},
+        {'statut': {'$in': OPPORTUNITE_CLOSED_STATUSES}, 'created_at': {'$lt': old_cutoff}}
+    ]}
+
+def union_archive(collection: str, match: Optional[dict] = None, route=partition_base) -> List[dict]:
+    # Leading pipeline stages reading hot and archived records as one set
+    stages = [{'$match': match}] if match is not None else []
+    return stages + [{'$unionWith': {'coll': route(ARCHIVE_COLLECTIONS[collection]), 'pipeline': stages}}]
+
+async def count_with_archive(database, collection: str, query: dict) -> int:
+    hot, archived = await asyncio.gather(
+        count_partitioned(database, collection, query),
+        count_partitioned(database, ARCHIVE_COLLECTIONS[collection], query)
+    )
+    return hot + archived
+
+async def find_with_archive(database, collection: str, query: dict, include_archived: bool,
+                            divisions: Optional[List[str]] = None) -> List[dict]:
+    docs = await find_partitioned(database, collection, query, divisions=divisions)
+    if include_archived:
+        docs += await find_partitioned(database, ARCHIVE_COLLECTIONS[collection], query,
+                                       {'_id': 0, 'archived_at': 0}, divisions)
+    return docs
+
+async def raise_if_archived(collection: str, doc_id: str, detail: str):
+    # Listed with include_archived but read-only: a 409 tells the client why, where a 404 would not
+    doc, _ = await find_one_partitioned(db, ARCHIVE_COLLECTIONS[collection], {'id': doc_id}, {'_id': 0, 'id': 1})
+    if doc:
+        raise HTTPException(status_code=409, detail=detail)
+
+async def ensure_archive_collections():
+    existing = set(await db.list_collection_names())
+    for name in (n for archive in ARCHIVE_COLLECTIONS.values() for n in partition_names(archive)):
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(
+                name, storageEngine={'wiredTiger': {'configString': f'block_compressor={ARCHIVE_COMPRESSOR}'}}
+            )
+        except CollectionInvalid:
+            pass  # created concurrently by another worker
+        except OperationFailure as e:
+            # Engines without per-collection compression (in-memory, some hosted tiers) store it plainly
+            logger.warning(f"Compressed storage unavailable for {name}: {str(e)}")
+            try:
+                await db.create_collection(name)
+            except CollectionInvalid:
+                pass
+
+async def archive_collection(collection: str) -> int:
+    criteria = archive_criteria(collection, datetime.now(timezone.utc))
+    extra = {'archived_at': datetime.now(timezone.utc).isoformat()}
+    moved = 0
+    for hot, cold in zip(partition_names(collection), partition_names(ARCHIVE_COLLECTIONS[collection])):
+        # Archived records leave the hot view that delta sync serves
+        moved += await move_documents(db[hot], db[cold], criteria, extra, ARCHIVE_BATCH_SIZE,
+                                      lambda docs: record_tombstones(collection, docs))
+    if moved:
+        publish_event(collection, 'archive')
+    return moved
+
+async def run_archiving(progress=no_progress) -> dict:
+    async with archive_lock:
+        moved = {}
+        for i, collection in enumerate(ARCHIVE_COLLECTIONS):
+            moved[collection] = await archive_collection(collection)
+            await progress(int((i + 1) * 100 / len(ARCHIVE_COLLECTIONS)), collection)
+        archive_state['last_run_at'] = datetime.now(timezone.utc).isoformat()
+        archive_state['last_moved'] = moved
+    if any(moved.values()):
+        logger.info(f"Archived {moved}")
+    return moved
+
+# ==================== SYNC ====================
+
+# Clients keep a local copy and pull changes since a watermark, keyed on (updated_at, id)
+SYNC_COLLECTIONS = ['comptes', 'opportunites', 'quality_records', 'incidents', 'custom_statuses']
+# Copied onto tombstones so deletions are filtered with the same scope as live documents
+SYNC_SCOPE_FIELDS = ['division', 'region', 'commercial_responsable']
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', '500'))
+# Writes stamp updated_at before they commit: the watermark trails the clock so none is skipped
+SYNC_LAG_SECONDS = int(os.environ.get('SYNC_LAG_SECONDS', '5'))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', '30'))
+BACKFILL_BATCH_SIZE = 1000
+
+async def record_tombstones(collection: str, docs: List[dict]):
+    # Deleted, archived, or moved out of a scope: syncing clients drop these ids
+    if not docs:
+        return
+    now = datetime.now(timezone.utc)
+    await db.tombstones.insert_many([{
+        'collection': collection,
+        'id': d['id'],
+        'updated_at': now.isoformat(),
+        'expire_at': now + timedelta(days=TOMBSTONE_RETENTION_DAYS),
+        **{f: d[f] for f in SYNC_SCOPE_FIELDS if f in d}
+    } for d in docs])
+
+async def delete_many_tombstoned(collection: str, name: str, query: dict):
+    projection = {'_id': 0, 'id': 1, **{f: 1 for f in SYNC_SCOPE_FIELDS}}
+    docs = await db[name].find(query, projection).to_list(None)
+    if docs:
+        await db[name].delete_many({'id': {'$in': [d['id'] for d in docs]}})
+        await record_tombstones(collection, docs)
+
+async def backfill_updated_at():
+    # Documents written before delta sync are stamped when they are backfilled, each batch with
+    # its own time: a client syncing mid-run holds a watermark past the start of the run, and
+    # SYNC_LAG_SECONDS covers the batch in flight. Idempotent.
+    missing = {'updated_at': {'$exists': False}}
+    try:
+        for collection in SYNC_COLLECTIONS:
+            for name in partition_names(collection):
+                while True:
+                    batch = await db[name].find(missing, {'_id': 1}).to_list(BACKFILL_BATCH_SIZE)
+                    if not batch:
+                        break
+                    now = datetime.now(timezone.utc).isoformat()
+                    await db[name].update_many({**missing, '_id': {'$in': [d['_id'] for d in batch]}},
+                                               {'$set': {'updated_at': now}})
+    except Exception as e:
+        logger.error(f"updated_at backfill failed: {str(e)}")
+
+def encode_sync_token(positions: Dict[str, list]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(',', ':')).encode()).decode()
+
+def decode_sync_token(token: str) -> Dict[str, list]:
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(token.encode()))
+        # Each position is [updated_at, id], id None once everything up to updated_at was read
+        if not isinstance(positions, dict) or not all(
+                isinstance(p, list) and len(p) == 2 and isinstance(p[0], str) and (p[1] is None or isinstance(p[1], str))
+                for p in positions.values()):
+            raise ValueError(token)
+        return positions
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Jeton de synchronisation invalide")
+
+async def changes_page(names: List[str], query: dict, position: Optional[list], upper: str,
+                       limit: int) -> Tuple[List[dict], list, bool]:
+    # Keyset page after position = [updated_at, id]; id None means everything up to updated_at was read
+    if position is None:
+        window = {'updated_at': {'$lte': upper}}
+    elif position[1] is None:
+        window = {'updated_at': {'$gt': position[0], '$lte': upper}}
+    else:
+        window = {'$or': [{'updated_at': {'$gt': position[0], '$lte': upper}},
+                          {'updated_at': position[0], 'id': {'$gt': position[1]}}]}
+    results = await asyncio.gather(*(
+        db[name].find({**query, **window}, {'_id': 0, 'expire_at': 0})
+        .sort([('updated_at', 1), ('id', 1)]).limit(limit + 1).to_list(limit + 1)
+        for name in names
+    ))
+    docs = sorted((d for batch in results for d in batch), key=lambda d: (d['updated_at'], d['id']))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if has_more:
+        position = [docs[-1]['updated_at'], docs[-1]['id']]
+    elif position is None or position[0] <= upper:
+        position = [upper, None]
+    return docs, position, has_more
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -304,6 +1563,8 @@ async def register(data: RegisterRequest):
     user_dict = user.model_dump()
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     await db.users.insert_one(user_dict)
+    await audit_change('users', user.id, 'create', user.id, None, user_dict)
+    publish_event('users', 'create', user.id)
     
     token = create_jwt_token(user.id)
     return TokenResponse(token=token, user=user.model_dump(exclude={'password_hash'}))
@@ -323,6 +1584,8 @@ async def login(data: LoginRequest):
 
 @api_router.post("/auth/google-session")
 async def google_session(data: SessionRequest, response: Response):
+    import requests
+    
     # Call Emergent Auth API
     try:
         resp = requests.get(
@@ -349,6 +1612,8 @@ async def google_session(data: SessionRequest, response: Response):
         user_dict = user.model_dump()
         user_dict['created_at'] = user_dict['created_at'].isoformat()
         await db.users.insert_one(user_dict)
+        await audit_change('users', user.id, 'create', user.id, None, user_dict)
+        publish_event('users', 'create', user.id)
     else:
         user = User(**user_doc)
     
@@ -396,24 +1661,42 @@ async def create_compte(data: CompteCreate, user: User = Depends(get_current_use
     compte = Compte(**data.model_dump(), created_by=user.id)
     compte_dict = compte.model_dump()
     compte_dict['created_at'] = compte_dict['created_at'].isoformat()
-    await db.comptes.insert_one(compte_dict)
+    compte_dict['updated_at'] = compte_dict['created_at']
+    await db[partition_name('comptes', compte.division)].insert_one(compte_dict)
+    await audit_change('comptes', compte.id, 'create', user.id, None, compte_dict)
+    publish_event('comptes', 'create', compte.id)
     return compte
 
-@api_router.get("/comptes", response_model=List[Compte])
-async def get_comptes(user: User = Depends(get_current_user)):
+COMPTES_ADAPTER = TypeAdapter(List[Compte])
+COMPTES_EXPANDED_ADAPTER = TypeAdapter(List[CompteExpanded])
+
+@api_router.get("/comptes", response_model=List[CompteExpanded])
+async def get_comptes(expand: Optional[str] = None, user: User = Depends(get_current_user)):
+    expand_fields = parse_expand(expand, ['created_by'])
+    divisions = user_divisions(user)
     query = {}
     if user.region and user.role not in ['Admin_Directeur', 'Assistante_Direction']:
         query['region'] = user.region
     
-    comptes = await db.comptes.find(query, {'_id': 0}).to_list(1000)
-    for c in comptes:
-        if isinstance(c.get('created_at'), str):
-            c['created_at'] = datetime.fromisoformat(c['created_at'])
-    return comptes
+    async def load():
+        comptes = await find_partitioned(list_db, 'comptes', query, divisions=divisions)
+        for c in comptes:
+            if isinstance(c.get('created_at'), str):
+                c['created_at'] = datetime.fromisoformat(c['created_at'])
+        if 'created_by' in expand_fields:
+            await expand_user_names(comptes, 'created_by', 'created_by_name')
+        return comptes
+    
+    scope = f"region:{query['region']}" if 'region' in query else 'all'
+    if divisions:
+        scope += f"|division:{divisions[0]}"
+    tags = ['comptes', 'users'] if expand_fields else ['comptes']
+    adapter = COMPTES_EXPANDED_ADAPTER if expand_fields else COMPTES_ADAPTER
+    return await cached_response('comptes', scope, tags, load, adapter, {'expand': ','.join(expand_fields) or None})
 
 @api_router.get("/comptes/{compte_id}", response_model=Compte)
 async def get_compte(compte_id: str, user: User = Depends(get_current_user)):
-    compte = await db.comptes.find_one({'id': compte_id}, {'_id': 0})
+    compte, _ = await find_one_partitioned(db, 'comptes', {'id': compte_id})
     if not compte:
         raise HTTPException(status_code=404, detail="Compte non trouvé")
     if isinstance(compte.get('created_at'), str):
@@ -422,20 +1705,34 @@ async def get_compte(compte_id: str, user: User = Depends(get_current_user)):
 
 @api_router.delete("/comptes/{compte_id}")
 async def delete_compte(compte_id: str, user: User = Depends(get_current_user)):
-    result = await db.comptes.delete_one({'id': compte_id})
-    if result.deleted_count == 0:
+    if not await delete_compte_cascade(compte_id, user.id):
         raise HTTPException(status_code=404, detail="Compte non trouvé")
-    
-    # Also delete related opportunites
-    await db.opportunites.delete_many({'compte_id': compte_id})
-    await db.quality_records.delete_many({'compte_id': compte_id})
-    
     return {'message': 'Compte et données associées supprimés'}
 
+async def delete_compte_cascade(compte_id: str, user_id: str) -> bool:
+    deleted = await find_one_and_delete_partitioned('comptes', {'id': compte_id})
+    if not deleted:
+        return False
+    await audit_change('comptes', compte_id, 'delete', user_id, deleted, None)
+    await record_tombstones('comptes', [deleted])
+    publish_event('comptes', 'delete', compte_id)
+    
+    # Also delete related opportunites, which live in the compte's division
+    division = deleted.get('division')
+    for name in partition_names('opportunites', [division]):
+        await delete_many_tombstoned('opportunites', name, {'compte_id': compte_id})
+    for name in partition_names('opportunites_archive', [division]):
+        await db[name].delete_many({'compte_id': compte_id})
+    for name in partition_names('quality_records'):
+        await delete_many_tombstoned('quality_records', name, {'compte_id': compte_id})
+    publish_event('opportunites', 'delete')
+    publish_event('quality_records', 'delete')
+    return True
+
 @api_router.put("/comptes/{compte_id}", response_model=Compte)
 async def update_compte(compte_id: str, data: CompteCreate, user: User = Depends(get_current_user)):
     # Get existing compte
-    existing = await db.comptes.find_one({'id': compte_id}, {'_id': 0})
+    existing, partition = await find_one_partitioned(db, 'comptes', {'id': compte_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Compte non trouvé")
     
@@ -448,10 +1745,22 @@ async def update_compte(compte_id: str, data: CompteCreate, user: User = Depends
     update_data['id'] = compte_id
     update_data['created_by'] = existing['created_by']
     update_data['created_at'] = existing['created_at']
-    
-    await db.comptes.update_one({'id': compte_id}, {'$set': update_data})
-    
-    updated_compte = await db.comptes.find_one({'id': compte_id}, {'_id': 0})
+    check_division(update_data.get('division', existing['division']))
+    if update_data.get('region', existing['region']) != existing['region']:
+        # Leaves the old region's scope: its syncing clients drop it
+        await record_tombstones('comptes', [existing])
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    
+    await db[partition].update_one({'id': compte_id}, {'$set': update_data})
+    
+    updated_compte = await db[partition].find_one({'id': compte_id}, {'_id': 0})
+    if updated_compte['division'] != existing['division']:
+        # Opportunités follow their compte into the new division
+        await rehome('comptes', {'id': compte_id}, existing['division'], updated_compte['division'])
+        await rehome('opportunites', {'compte_id': compte_id}, existing['division'], updated_compte['division'])
+        publish_event('opportunites', 'update')
+    await audit_change('comptes', compte_id, 'update', user.id, existing, updated_compte)
+    publish_event('comptes', 'update', compte_id)
     if isinstance(updated_compte.get('created_at'), str):
         updated_compte['created_at'] = datetime.fromisoformat(updated_compte['created_at'])
     
@@ -459,45 +1768,158 @@ async def update_compte(compte_id: str, data: CompteCreate, user: User = Depends
 
 # ==================== OPPORTUNITES ROUTES ====================
 
+POSTAL_CODE_RE = re.compile(r'\b(\d{5})\b')
+DEPARTMENT_RE = re.compile(r'\((\d{2,3}|2[ab])\)')
+# Checked in order, first match wins
+TEMPERATURE_KEYWORDS = [
+    ('Multi-température', ['multi', 'bi-temp', 'bitemp']),
+    ('Surgelé', ['surgel', 'congel', 'negatif']),
+    ('Pharma', ['pharma']),
+    ('Frais', ['frais', 'positif', 'refrig']),
+]
+# Without a keyword, the stated range (°C) must fit a band, checked in order
+TEMPERATURE_BANDS = [('Surgelé', -60, -10), ('Frais', -2, 8), ('Pharma', 8, 25)]
+# A sign right after a digit is a range separator: "2-8" is 2 to 8
+TEMPERATURE_RE = re.compile(r'(?<!\d)[+-]?\d+')
+
+def fold_text(value: str) -> str:
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(c for c in value if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9+/\-() ]', ' ', value).split())
+
+def place_key(place: Optional[str]) -> Optional[str]:
+    # "Rungis (94150)" / "rungis 94" / "RUNGIS" -> "rungis". The department is dropped since most
+    # entries don't give one; it is the key only when there is no city name ("94150" -> "94")
+    if not place or not place.strip():
+        return None
+    folded = fold_text(place)
+    # Drop parenthesised codes and any token with digits ("94150", "13e", "cedex 9")
+    city = re.sub(r'\(.*?\)|\S*\d\S*|\bcedex\b', ' ', folded)
+    city = ' '.join(re.sub(r'[^a-z ]', ' ', city).split())
+    city = re.sub(r'^(st|ste) ', lambda m: 'saint ' if m.group(1) == 'st' else 'sainte ', city).replace(' ', '-')
+    if city:
+        return city
+    postal = POSTAL_CODE_RE.search(folded)
+    if postal:
+        code = postal.group(1)
+        return code[:3] if code.startswith('97') else code[:2]
+    explicit = DEPARTMENT_RE.search(folded) or re.fullmatch(r'(\d{2,3}|2[ab])', folded)
+    return explicit.group(1) if explicit else None
+
+def temperature_regime(temperatures: Optional[str]) -> Optional[str]:
+    if not temperatures:
+        return None
+    folded = fold_text(temperatures).replace(' ', '')
+    for regime, markers in TEMPERATURE_KEYWORDS:
+        if any(marker in folded for marker in markers):
+            return regime
+    values = [int(v) for v in TEMPERATURE_RE.findall(folded)]
+    if not values:
+        return 'Autre'
+    low, high = min(values), max(values)
+    for regime, band_low, band_high in TEMPERATURE_BANDS:
+        if band_low <= low and high <= band_high:
+            return regime
+    if low <= -10 < high:
+        return 'Multi-température'  # frozen and chilled in one lane, "-18/+4"
+    return 'Autre'
+
+def lane_fields(opp: dict) -> dict:
+    depart = place_key(opp.get('depart'))
+    arrivee = place_key(opp.get('arrivee'))
+    return {
+        'lane_key': f'{depart}>{arrivee}' if depart and arrivee else None,
+        'temperature_regime': temperature_regime(opp.get('temperatures'))
+    }
+
+async def record_opportunite_transition(opp_id: str, from_statut: Optional[str], to_statut: str, user_id: str):
+    transition = OpportuniteTransition(
+        opportunite_id=opp_id,
+        from_statut=from_statut,
+        to_statut=to_statut,
+        changed_by=user_id
+    )
+    transition_dict = transition.model_dump()
+    transition_dict['changed_at'] = transition_dict['changed_at'].isoformat()
+    await db.opportunite_transitions.insert_one(transition_dict)
+
 @api_router.post("/opportunites", response_model=Opportunite)
 async def create_opportunite(data: OpportuniteCreate, user: User = Depends(get_current_user)):
-    opp = Opportunite(**data.model_dump(), commercial_responsable=user.id)
+    division = await division_of('comptes', data.compte_id)
+    if DIVISION_PARTITIONING and not division:
+        raise HTTPException(status_code=404, detail="Compte non trouvé")
+    opp = Opportunite(**data.model_dump(), **lane_fields(data.model_dump()), commercial_responsable=user.id,
+                      division=division)
     opp_dict = opp.model_dump()
     opp_dict['created_at'] = opp_dict['created_at'].isoformat()
+    opp_dict['updated_at'] = opp_dict['created_at']
     if opp_dict.get('date_premier_contact'):
         opp_dict['date_premier_contact'] = opp_dict['date_premier_contact'].isoformat()
     if opp_dict.get('prochaine_relance'):
         opp_dict['prochaine_relance'] = opp_dict['prochaine_relance'].isoformat()
-    await db.opportunites.insert_one(opp_dict)
+    await db[partition_name('opportunites', division)].insert_one(opp_dict)
+    await audit_change('opportunites', opp.id, 'create', user.id, None, opp_dict)
+    publish_event('opportunites', 'create', opp.id)
+    await record_opportunite_transition(opp.id, None, opp.statut, user.id)
     return opp
 
-@api_router.get("/opportunites", response_model=List[Opportunite])
-async def get_opportunites(user: User = Depends(get_current_user)):
+OPPORTUNITES_ADAPTER = TypeAdapter(List[Opportunite])
+OPPORTUNITES_EXPANDED_ADAPTER = TypeAdapter(List[OpportuniteExpanded])
+
+@api_router.get("/opportunites", response_model=List[OpportuniteExpanded])
+async def get_opportunites(expand: Optional[str] = None, include_archived: bool = False,
+                           user: User = Depends(get_current_user)):
+    expand_fields = parse_expand(expand, ['commercial_responsable', 'compte'])
+    divisions = user_divisions(user)
     query = {}
     if user.role in ['DevCo_IDF', 'DevCo_HDF']:
         query['commercial_responsable'] = user.id
     
-    opps = await db.opportunites.find(query, {'_id': 0}).to_list(1000)
-    for o in opps:
-        if isinstance(o.get('created_at'), str):
-            o['created_at'] = datetime.fromisoformat(o['created_at'])
-        if o.get('date_premier_contact') and isinstance(o['date_premier_contact'], str):
-            o['date_premier_contact'] = datetime.fromisoformat(o['date_premier_contact'])
-        if o.get('prochaine_relance') and isinstance(o['prochaine_relance'], str):
-            o['prochaine_relance'] = datetime.fromisoformat(o['prochaine_relance'])
-    return opps
+    async def load():
+        opps = await find_with_archive(list_db, 'opportunites', query, include_archived, divisions)
+        for o in opps:
+            if isinstance(o.get('created_at'), str):
+                o['created_at'] = datetime.fromisoformat(o['created_at'])
+            if o.get('date_premier_contact') and isinstance(o['date_premier_contact'], str):
+                o['date_premier_contact'] = datetime.fromisoformat(o['date_premier_contact'])
+            if o.get('prochaine_relance') and isinstance(o['prochaine_relance'], str):
+                o['prochaine_relance'] = datetime.fromisoformat(o['prochaine_relance'])
+        if 'compte' in expand_fields:
+            comptes = await lookup_by_ids('comptes', (o.get('compte_id') for o in opps), COMPTE_SUMMARY_PROJECTION)
+            for o in opps:
+                o['compte'] = comptes.get(o.get('compte_id'))
+        if 'commercial_responsable' in expand_fields:
+            await expand_user_names(opps, 'commercial_responsable', 'commercial_responsable_name')
+        return opps
+    
+    scope = f"user:{user.id}" if 'commercial_responsable' in query else 'all'
+    if divisions:
+        scope += f"|division:{divisions[0]}"
+    tags = ['opportunites']
+    if 'compte' in expand_fields:
+        tags.append('comptes')
+    if 'commercial_responsable' in expand_fields:
+        tags.append('users')
+    adapter = OPPORTUNITES_EXPANDED_ADAPTER if expand_fields else OPPORTUNITES_ADAPTER
+    params = {'expand': ','.join(expand_fields) or None, 'include_archived': include_archived or None}
+    return await cached_response('opportunites', scope, tags, load, adapter, params)
 
 @api_router.delete("/opportunites/{opp_id}")
 async def delete_opportunite(opp_id: str, user: User = Depends(get_current_user)):
-    result = await db.opportunites.delete_one({'id': opp_id})
-    if result.deleted_count == 0:
+    deleted = (await find_one_and_delete_partitioned('opportunites', {'id': opp_id})
+               or await find_one_and_delete_partitioned('opportunites_archive', {'id': opp_id}))
+    if not deleted:
         raise HTTPException(status_code=404, detail="Opportunité non trouvée")
+    await audit_change('opportunites', opp_id, 'delete', user.id, deleted, None)
+    await record_tombstones('opportunites', [deleted])
+    publish_event('opportunites', 'delete', opp_id)
     return {'message': 'Opportunité supprimée'}
 
 @api_router.put("/opportunites/{opp_id}", response_model=Opportunite)
 async def update_opportunite(opp_id: str, data: OpportuniteCreate, user: User = Depends(get_current_user)):
-    existing = await db.opportunites.find_one({'id': opp_id}, {'_id': 0})
+    existing, partition = await find_one_partitioned(db, 'opportunites', {'id': opp_id})
     if not existing:
+        await raise_if_archived('opportunites', opp_id, "Opportunité archivée, elle n'est plus modifiable")
         raise HTTPException(status_code=404, detail="Opportunité non trouvée")
     
     # Check permissions: owner or admin
@@ -508,6 +1930,12 @@ async def update_opportunite(opp_id: str, data: OpportuniteCreate, user: User =
     update_data['id'] = opp_id
     update_data['commercial_responsable'] = existing['commercial_responsable']
     update_data['created_at'] = existing['created_at']
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    update_data.update(lane_fields({**existing, **update_data}))
+    if update_data.get('compte_id', existing['compte_id']) != existing['compte_id']:
+        update_data['division'] = await division_of('comptes', update_data['compte_id'])
+        if DIVISION_PARTITIONING and not update_data['division']:
+            raise HTTPException(status_code=404, detail="Compte non trouvé")
     
     # Handle datetime fields
     if update_data.get('date_premier_contact') and isinstance(update_data['date_premier_contact'], datetime):
@@ -515,9 +1943,17 @@ async def update_opportunite(opp_id: str, data: OpportuniteCreate, user: User =
     if update_data.get('prochaine_relance') and isinstance(update_data['prochaine_relance'], datetime):
         update_data['prochaine_relance'] = update_data['prochaine_relance'].isoformat()
     
-    await db.opportunites.update_one({'id': opp_id}, {'$set': update_data})
+    await db[partition].update_one({'id': opp_id}, {'$set': update_data})
+    
+    # Keep the status history append-only for funnel analytics
+    if 'statut' in update_data and update_data['statut'] != existing.get('statut'):
+        await record_opportunite_transition(opp_id, existing.get('statut'), update_data['statut'], user.id)
     
-    updated = await db.opportunites.find_one({'id': opp_id}, {'_id': 0})
+    updated = await db[partition].find_one({'id': opp_id}, {'_id': 0})
+    if updated.get('division') != existing.get('division'):
+        await rehome('opportunites', {'id': opp_id}, existing.get('division'), updated['division'])
+    await audit_change('opportunites', opp_id, 'update', user.id, existing, updated)
+    publish_event('opportunites', 'update', opp_id)
     if isinstance(updated.get('created_at'), str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     if updated.get('date_premier_contact') and isinstance(updated['date_premier_contact'], str):
@@ -534,31 +1970,49 @@ async def create_quality_record(data: QualityRecordCreate, user: User = Depends(
     record = QualityRecord(**data.model_dump())
     record_dict = record.model_dump()
     record_dict['created_at'] = record_dict['created_at'].isoformat()
-    await db.quality_records.insert_one(record_dict)
+    record_dict['updated_at'] = record_dict['created_at']
+    await db[partition_name('quality_records', record.division)].insert_one(record_dict)
+    await audit_change('quality_records', record.id, 'create', user.id, None, record_dict)
+    publish_event('quality_records', 'create', record.id)
     return record
 
+QUALITY_RECORDS_ADAPTER = TypeAdapter(List[QualityRecord])
+
 @api_router.get("/quality", response_model=List[QualityRecord])
 async def get_quality_records(user: User = Depends(get_current_user)):
-    records = await db.quality_records.find({}, {'_id': 0}).to_list(1000)
-    for r in records:
-        if isinstance(r.get('created_at'), str):
-            r['created_at'] = datetime.fromisoformat(r['created_at'])
-    return records
+    divisions = user_divisions(user)
+    
+    async def load():
+        records = await find_partitioned(list_db, 'quality_records', {}, divisions=divisions)
+        for r in records:
+            if isinstance(r.get('created_at'), str):
+                r['created_at'] = datetime.fromisoformat(r['created_at'])
+        return records
+    
+    scope = f"division:{divisions[0]}" if divisions else 'all'
+    return await cached_response('quality', scope, ['quality_records'], load, QUALITY_RECORDS_ADAPTER)
 
 @api_router.delete("/quality/{quality_id}")
 async def delete_quality_record(quality_id: str, user: User = Depends(get_current_user)):
-    result = await db.quality_records.delete_one({'id': quality_id})
-    if result.deleted_count == 0:
+    deleted = await find_one_and_delete_partitioned('quality_records', {'id': quality_id})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Fiche qualité non trouvée")
+    await audit_change('quality_records', quality_id, 'delete', user.id, deleted, None)
+    await record_tombstones('quality_records', [deleted])
+    publish_event('quality_records', 'delete', quality_id)
     
     # Also delete related incidents
-    await db.incidents.delete_many({'quality_record_id': quality_id})
+    for name in partition_names('incidents', [deleted.get('division')]):
+        await delete_many_tombstoned('incidents', name, {'quality_record_id': quality_id})
+    for name in partition_names('incidents_archive', [deleted.get('division')]):
+        await db[name].delete_many({'quality_record_id': quality_id})
+    publish_event('incidents', 'delete')
     
     return {'message': 'Fiche qualité et incidents associés supprimés'}
 
 @api_router.put("/quality/{quality_id}", response_model=QualityRecord)
 async def update_quality_record(quality_id: str, data: QualityRecordCreate, user: User = Depends(get_current_user)):
-    existing = await db.quality_records.find_one({'id': quality_id}, {'_id': 0})
+    existing, partition = await find_one_partitioned(db, 'quality_records', {'id': quality_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Fiche qualité non trouvée")
     
@@ -570,10 +2024,19 @@ async def update_quality_record(quality_id: str, data: QualityRecordCreate, user
     update_data = data.model_dump(exclude_unset=True)
     update_data['id'] = quality_id
     update_data['created_at'] = existing['created_at']
-    
-    await db.quality_records.update_one({'id': quality_id}, {'$set': update_data})
-    
-    updated = await db.quality_records.find_one({'id': quality_id}, {'_id': 0})
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    check_division(update_data.get('division', existing['division']))
+    
+    await db[partition].update_one({'id': quality_id}, {'$set': update_data})
+    
+    updated = await db[partition].find_one({'id': quality_id}, {'_id': 0})
+    if updated['division'] != existing['division']:
+        # Incidents follow their fiche qualité into the new division
+        await rehome('quality_records', {'id': quality_id}, existing['division'], updated['division'])
+        await rehome('incidents', {'quality_record_id': quality_id}, existing['division'], updated['division'])
+        publish_event('incidents', 'update')
+    await audit_change('quality_records', quality_id, 'update', user.id, existing, updated)
+    publish_event('quality_records', 'update', quality_id)
     if isinstance(updated.get('created_at'), str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     
@@ -581,35 +2044,55 @@ async def update_quality_record(quality_id: str, data: QualityRecordCreate, user
 
 @api_router.post("/incidents", response_model=Incident)
 async def create_incident(data: IncidentCreate, user: User = Depends(get_current_user)):
-    incident = Incident(**data.model_dump())
+    division = await division_of('quality_records', data.quality_record_id)
+    if DIVISION_PARTITIONING and not division:
+        raise HTTPException(status_code=404, detail="Fiche qualité non trouvée")
+    incident = Incident(**data.model_dump(), division=division)
     incident_dict = incident.model_dump()
     incident_dict['created_at'] = incident_dict['created_at'].isoformat()
+    incident_dict['updated_at'] = incident_dict['created_at']
     if incident_dict.get('closed_at'):
         incident_dict['closed_at'] = incident_dict['closed_at'].isoformat()
-    await db.incidents.insert_one(incident_dict)
+    await db[partition_name('incidents', division)].insert_one(incident_dict)
+    await audit_change('incidents', incident.id, 'create', user.id, None, incident_dict)
+    publish_event('incidents', 'create', incident.id)
     return incident
 
+INCIDENTS_ADAPTER = TypeAdapter(List[Incident])
+
 @api_router.get("/incidents", response_model=List[Incident])
-async def get_incidents(user: User = Depends(get_current_user)):
-    incidents = await db.incidents.find({}, {'_id': 0}).to_list(1000)
-    for i in incidents:
-        if isinstance(i.get('created_at'), str):
-            i['created_at'] = datetime.fromisoformat(i['created_at'])
-        if i.get('closed_at') and isinstance(i['closed_at'], str):
-            i['closed_at'] = datetime.fromisoformat(i['closed_at'])
-    return incidents
+async def get_incidents(include_archived: bool = False, user: User = Depends(get_current_user)):
+    divisions = user_divisions(user)
+    
+    async def load():
+        incidents = await find_with_archive(list_db, 'incidents', {}, include_archived, divisions)
+        for i in incidents:
+            if isinstance(i.get('created_at'), str):
+                i['created_at'] = datetime.fromisoformat(i['created_at'])
+            if i.get('closed_at') and isinstance(i['closed_at'], str):
+                i['closed_at'] = datetime.fromisoformat(i['closed_at'])
+        return incidents
+    
+    scope = f"division:{divisions[0]}" if divisions else 'all'
+    return await cached_response('incidents', scope, ['incidents'], load, INCIDENTS_ADAPTER,
+                                 {'include_archived': include_archived or None})
 
 @api_router.delete("/incidents/{incident_id}")
 async def delete_incident(incident_id: str, user: User = Depends(get_current_user)):
-    result = await db.incidents.delete_one({'id': incident_id})
-    if result.deleted_count == 0:
+    deleted = (await find_one_and_delete_partitioned('incidents', {'id': incident_id})
+               or await find_one_and_delete_partitioned('incidents_archive', {'id': incident_id}))
+    if not deleted:
         raise HTTPException(status_code=404, detail="Incident non trouvé")
+    await audit_change('incidents', incident_id, 'delete', user.id, deleted, None)
+    await record_tombstones('incidents', [deleted])
+    publish_event('incidents', 'delete', incident_id)
     return {'message': 'Incident supprimé'}
 
 @api_router.put("/incidents/{incident_id}", response_model=Incident)
 async def update_incident(incident_id: str, data: IncidentCreate, user: User = Depends(get_current_user)):
-    existing = await db.incidents.find_one({'id': incident_id}, {'_id': 0})
+    existing, partition = await find_one_partitioned(db, 'incidents', {'id': incident_id})
     if not existing:
+        await raise_if_archived('incidents', incident_id, "Incident archivé, il n'est plus modifiable")
         raise HTTPException(status_code=404, detail="Incident non trouvé")
     
     # Incidents can be edited by Clientele roles and Admin
@@ -620,14 +2103,23 @@ async def update_incident(incident_id: str, data: IncidentCreate, user: User = D
     update_data = data.model_dump(exclude_unset=True)
     update_data['id'] = incident_id
     update_data['created_at'] = existing['created_at']
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    if update_data.get('quality_record_id', existing['quality_record_id']) != existing['quality_record_id']:
+        update_data['division'] = await division_of('quality_records', update_data['quality_record_id'])
+        if DIVISION_PARTITIONING and not update_data['division']:
+            raise HTTPException(status_code=404, detail="Fiche qualité non trouvée")
     
     # Handle closed_at if status changed to Clos
     if update_data.get('statut') in ['Clos', 'Résolu'] and not existing.get('closed_at'):
         update_data['closed_at'] = datetime.now(timezone.utc).isoformat()
     
-    await db.incidents.update_one({'id': incident_id}, {'$set': update_data})
+    await db[partition].update_one({'id': incident_id}, {'$set': update_data})
     
-    updated = await db.incidents.find_one({'id': incident_id}, {'_id': 0})
+    updated = await db[partition].find_one({'id': incident_id}, {'_id': 0})
+    if updated.get('division') != existing.get('division'):
+        await rehome('incidents', {'id': incident_id}, existing.get('division'), updated['division'])
+    await audit_change('incidents', incident_id, 'update', user.id, existing, updated)
+    publish_event('incidents', 'update', incident_id)
     if isinstance(updated.get('created_at'), str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     if updated.get('closed_at') and isinstance(updated['closed_at'], str):
@@ -635,10 +2127,176 @@ async def update_incident(incident_id: str, data: IncidentCreate, user: User = D
     
     return Incident(**updated)
 
+# ==================== SYNC ROUTES ====================
+
+def sync_scope(collection: str, user: User) -> dict:
+    # Same visibility as the list endpoints; divisions are applied by partition
+    if collection == 'comptes' and user.region and user.role not in ['Admin_Directeur', 'Assistante_Direction']:
+        return {'region': user.region}
+    if collection == 'opportunites' and user.role in ['DevCo_IDF', 'DevCo_HDF']:
+        return {'commercial_responsable': user.id}
+    return {}
+
+@api_router.get("/sync")
+async def sync_changes(since: Optional[str] = None, limit: int = SYNC_PAGE_SIZE,
+                       user: User = Depends(get_current_user)):
+    # Without a token: every live record. With one: what changed since, until has_more is false
+    limit = max(1, min(limit, 5000))
+    now = datetime.now(timezone.utc)
+    upper = (now - timedelta(seconds=SYNC_LAG_SECONDS)).isoformat()
+    positions = decode_sync_token(since) if since else {}
+    horizon = (now - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat()
+    if any(p[0] < horizon for p in positions.values()):
+        # Tombstones that old have expired, deletions can no longer be replayed
+        raise HTTPException(status_code=410, detail="Jeton expiré, resynchronisation complète requise")
+    divisions = user_divisions(user)
+    
+    async def collect(collection: str):
+        scope = sync_scope(collection, user)
+        deleted_key = f'{collection}:deleted'
+        upserts, upserts_position, upserts_more = await changes_page(
+            partition_names(collection, divisions), scope, positions.get(collection), upper, limit
+        )
+        if not positions:
+            # A full sync starts from the current state: there are no deletions to replay
+            return collection, upserts, [], {collection: upserts_position, deleted_key: [upper, None]}, upserts_more
+        tombstone_query = {'collection': collection, **scope}
+        if divisions and is_partitioned(collection):
+            tombstone_query['division'] = {'$in': divisions}
+        tombstones, deleted_position, deleted_more = await changes_page(
+            ['tombstones'], tombstone_query, positions.get(deleted_key), upper, limit
+        )
+        if tombstones:
+            # Moved back into scope, or rehomed for a reader of every division: the live version wins
+            live = await find_partitioned(db, collection, {**scope, 'id': {'$in': [t['id'] for t in tombstones]}},
+                                          {'_id': 0, 'id': 1, 'updated_at': 1}, divisions)
+            live_at = {d['id']: d.get('updated_at', '') for d in live}
+            tombstones = [t for t in tombstones if live_at.get(t['id'], '') < t['updated_at']]
+        positions_out = {collection: upserts_position, deleted_key: deleted_position}
+        return collection, upserts, [t['id'] for t in tombstones], positions_out, upserts_more or deleted_more
+    
+    results = await asyncio.gather(*(collect(c) for c in SYNC_COLLECTIONS))
+    next_positions = {}
+    for _, _, _, collection_positions, _ in results:
+        next_positions.update(collection_positions)
+    return {
+        'token': encode_sync_token(next_positions),
+        'has_more': any(more for *_, more in results),
+        'changes': {collection: {'upserts': upserts, 'deleted': deleted}
+                    for collection, upserts, deleted, _, _ in results}
+    }
+
 # ==================== SURVEY ROUTES ====================
 
+# Survey endpoints are public: admission control runs before the body is parsed
+SURVEY_PATHS = ('/api/surveys/responses', '/api/surveys/scores')
+SURVEY_MAX_BODY_BYTES = int(os.environ.get('SURVEY_MAX_BODY_BYTES', '16384'))
+SURVEY_MAX_CONCURRENCY = int(os.environ.get('SURVEY_MAX_CONCURRENCY', '20'))
+SURVEY_IP_RATE = float(os.environ.get('SURVEY_IP_RATE_PER_MINUTE', '30')) / 60
+SURVEY_IP_BURST = float(os.environ.get('SURVEY_IP_BURST', '10'))
+SURVEY_KEY_RATE = float(os.environ.get('SURVEY_KEY_RATE_PER_MINUTE', '60')) / 60
+SURVEY_KEY_BURST = float(os.environ.get('SURVEY_KEY_BURST', '20'))
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+# Enable only behind an ingress that sets X-Forwarded-For (the client address is its last hop);
+# exposed directly, clients could spoof the header to dodge the per-IP limit
+RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+
+class InMemoryRateLimitBackend:
+    # Token buckets in an LRU-bounded OrderedDict: O(1) per check, bounded memory
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: OrderedDict = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self.buckets[key] = (tokens, now)
+            wait = (1 - tokens) / rate
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+# Other backends (e.g. a shared store for multi-worker deployments) register here
+RATE_LIMIT_BACKENDS = {'memory': InMemoryRateLimitBackend}
+rate_limiter = RATE_LIMIT_BACKENDS[RATE_LIMIT_BACKEND](RATE_LIMIT_MAX_KEYS)
+survey_admission = {'in_flight': 0, 'rejected': 0}
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    survey_admission['rejected'] += 1
+    return HTTPException(
+        status_code=429,
+        detail="Trop de requêtes, veuillez réessayer plus tard",
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+    )
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope['headers']:
+            if name == b'x-forwarded-for':
+                return value.decode('latin-1').split(',')[-1].strip()
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+async def enforce_survey_key_limit(kind: str, key: str):
+    wait = await rate_limiter.take(f'survey:{kind}:{key}', SURVEY_KEY_RATE, SURVEY_KEY_BURST)
+    if wait:
+        raise too_many_requests(wait)
+
+class SurveyAdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in SURVEY_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        rejection = None
+        content_length = next((v for k, v in scope['headers'] if k == b'content-length'), None)
+        if content_length is not None and not content_length.strip().isdigit():
+            rejection = HTTPException(status_code=400, detail="En-tête Content-Length invalide")
+        elif content_length is not None and int(content_length) > SURVEY_MAX_BODY_BYTES:
+            rejection = HTTPException(status_code=413, detail="Requête trop volumineuse")
+        elif survey_admission['in_flight'] >= SURVEY_MAX_CONCURRENCY:
+            rejection = too_many_requests(1)
+        else:
+            wait = await rate_limiter.take(f'survey:ip:{client_ip(scope)}', SURVEY_IP_RATE, SURVEY_IP_BURST)
+            if wait:
+                rejection = too_many_requests(wait)
+        if rejection:
+            response = JSONResponse(status_code=rejection.status_code, content={'detail': rejection.detail},
+                                    headers=rejection.headers)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            # Chunked bodies carry no Content-Length, so count bytes as they arrive
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > SURVEY_MAX_BODY_BYTES:
+                    raise HTTPException(status_code=413, detail="Requête trop volumineuse")
+            return message
+        
+        survey_admission['in_flight'] += 1
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            survey_admission['in_flight'] -= 1
+
 @api_router.post("/surveys/responses", response_model=SurveyResponse)
 async def create_survey_response(data: SurveyResponse):
+    await enforce_survey_key_limit('compte', data.compte_id)
     response_dict = data.model_dump()
     response_dict['submitted_at'] = response_dict['submitted_at'].isoformat()
     await db.survey_responses.insert_one(response_dict)
@@ -646,44 +2304,82 @@ async def create_survey_response(data: SurveyResponse):
 
 @api_router.post("/surveys/scores", response_model=SurveyScore)
 async def create_survey_score(data: SurveyScore):
+    await enforce_survey_key_limit('response', data.response_id)
     await db.survey_scores.insert_one(data.model_dump())
     return data
 
 @api_router.get("/surveys/responses", response_model=List[SurveyResponse])
 async def get_survey_responses(user: User = Depends(get_current_user)):
-    responses = await db.survey_responses.find({}, {'_id': 0}).to_list(1000)
+    responses = await list_db.survey_responses.find({}, {'_id': 0}).to_list(1000)
     for r in responses:
         if isinstance(r.get('submitted_at'), str):
             r['submitted_at'] = datetime.fromisoformat(r['submitted_at'])
     return responses
 
+# ==================== HEALTH ROUTES ====================
+
+def pool_usage() -> dict:
+    checkouts = metrics_counter_total('mongodb_pool_checkouts_total')
+    checkins = metrics_counter_total('mongodb_pool_checkins_total')
+    failures = metrics_counter_total('mongodb_pool_checkout_failures_total')
+    servers = {}
+    for labels in set(checkouts) | set(failures):
+        in_use = int(checkouts.get(labels, 0) - checkins.get(labels, 0))
+        servers[dict(labels)['address']] = {
+            'in_use': in_use,
+            'max_pool_size': MONGO_MAX_POOL_SIZE,
+            'saturation': round(in_use / MONGO_MAX_POOL_SIZE, 3) if MONGO_MAX_POOL_SIZE else None,
+            'checkout_failures': int(failures.get(labels, 0))
+        }
+    return servers
+
+@api_router.get("/health")
+async def health():
+    start = time.perf_counter()
+    try:
+        await db.command('ping')
+        mongo_ok = True
+    except Exception as e:
+        logger.error(f"Health check ping failed: {str(e)}")
+        mongo_ok = False
+    return JSONResponse(
+        status_code=200 if mongo_ok else 503,
+        content={
+            'status': 'ok' if mongo_ok else 'degraded',
+            'mongo': {'reachable': mongo_ok, 'ping_ms': round((time.perf_counter() - start) * 1000, 1)},
+            'pool': pool_usage()
+        }
+    )
+
 # ==================== DASHBOARD ROUTES ====================
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(user: User = Depends(get_current_user)):
+async def compute_dashboard_stats() -> dict:
+    # Recomputed right after writes (SSE deltas, cache invalidation): read the primary, a lagging
+    # secondary would miss the write that triggered it
+    
     # Commercial Stats
-    total_comptes = await db.comptes.count_documents({})
-    total_opps = await db.opportunites.count_documents({})
-    opps_signees = await db.opportunites.count_documents({'statut': 'Signé'})
+    total_comptes = await count_partitioned(db, 'comptes', {})
+    total_opps = await count_with_archive(db, 'opportunites', {})
+    opps_signees = await count_with_archive(db, 'opportunites', {'statut': 'Signé'})
     
     # Calculate CA signé
-    pipeline = [
-        {'$match': {'statut': 'Signé'}},
-        {'$group': {'_id': None, 'total': {'$sum': '$montant_estime'}}}
-    ]
-    ca_result = await db.opportunites.aggregate(pipeline).to_list(1)
+    source, pipeline = partitioned_pipeline(
+        'opportunites', lambda route: union_archive('opportunites', {'statut': 'Signé'}, route)
+    )
+    pipeline.append({'$group': {'_id': None, 'total': {'$sum': '$montant_estime'}}})
+    ca_result = await db[source].aggregate(pipeline).to_list(1)
     ca_signe = ca_result[0]['total'] if ca_result and ca_result[0]['total'] else 0
     
     # Quality Stats
-    total_quality = await db.quality_records.count_documents({})
-    total_incidents = await db.incidents.count_documents({})
-    incidents_ouverts = await db.incidents.count_documents({'statut': 'Ouvert'})
+    total_quality = await count_partitioned(db, 'quality_records', {})
+    total_incidents = await count_with_archive(db, 'incidents', {})
+    # Open incidents are never archived
+    incidents_ouverts = await count_partitioned(db, 'incidents', {'statut': 'Ouvert'})
     
     # Average satisfaction
-    satisfaction_pipeline = [
-        {'$group': {'_id': None, 'avg': {'$avg': '$score_satisfaction'}}}
-    ]
-    satisfaction_result = await db.quality_records.aggregate(satisfaction_pipeline).to_list(1)
+    source, satisfaction_pipeline = partitioned_pipeline('quality_records', lambda route: [])
+    satisfaction_pipeline.append({'$group': {'_id': None, 'avg': {'$avg': '$score_satisfaction'}}})
+    satisfaction_result = await db[source].aggregate(satisfaction_pipeline).to_list(1)
     avg_satisfaction = satisfaction_result[0]['avg'] if satisfaction_result and satisfaction_result[0]['avg'] else 0
     
     return {
@@ -701,18 +2397,768 @@ async def get_dashboard_stats(user: User = Depends(get_current_user)):
         }
     }
 
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(user: User = Depends(get_current_user)):
+    return await cached_response('dashboard_stats', 'all', DASHBOARD_TOPICS, compute_dashboard_stats)
+
+# Live dashboard: one recomputation per change burst, fanned out to every open stream
+DASHBOARD_TOPICS = ['comptes', 'opportunites', 'quality_records', 'incidents']
+DASHBOARD_DEBOUNCE_SECONDS = float(os.environ.get('DASHBOARD_DEBOUNCE_SECONDS', '1'))
+DASHBOARD_HEARTBEAT_SECONDS = float(os.environ.get('DASHBOARD_HEARTBEAT_SECONDS', '15'))
+DASHBOARD_CLIENT_QUEUE_SIZE = int(os.environ.get('DASHBOARD_CLIENT_QUEUE_SIZE', '8'))
+DASHBOARD_CHANGE_STREAM = os.environ.get('DASHBOARD_CHANGE_STREAM', 'false').lower() == 'true'
+
+dashboard_dirty = asyncio.Event()
+dashboard_streams: set = set()
+dashboard_snapshot: Dict[str, Any] = {'data': None}
+
+def mark_dashboard_dirty(topic: str, action: str, entity_id: Optional[str]):
+    dashboard_dirty.set()
+
+for _topic in DASHBOARD_TOPICS:
+    subscribe_event(_topic, mark_dashboard_dirty)
+
+def dashboard_delta(previous: dict, current: dict) -> dict:
+    delta = {}
+    for section, values in current.items():
+        changed = {k: v for k, v in values.items() if previous.get(section, {}).get(k) != v}
+        if changed:
+            delta[section] = changed
+    return delta
+
+def push_dashboard_message(queue: asyncio.Queue, message: dict):
+    if queue.full():
+        # Slow consumer: drop its backlog and resync it with a full snapshot
+        while not queue.empty():
+            queue.get_nowait()
+        message = {'type': 'snapshot', 'data': dashboard_snapshot['data']}
+    queue.put_nowait(message)
+
+async def dashboard_broadcaster():
+    while True:
+        await dashboard_dirty.wait()
+        # Coalesce bursts of writes into a single recomputation
+        await asyncio.sleep(DASHBOARD_DEBOUNCE_SECONDS)
+        dashboard_dirty.clear()
+        if not dashboard_streams:
+            dashboard_snapshot['data'] = None
+            continue
+        try:
+            current = await compute_dashboard_stats()
+        except Exception as e:
+            logger.error(f"Dashboard recomputation failed: {str(e)}")
+            continue
+        previous = dashboard_snapshot['data'] or {}
+        dashboard_snapshot['data'] = current
+        delta = dashboard_delta(previous, current)
+        if delta:
+            for queue in list(dashboard_streams):
+                push_dashboard_message(queue, {'type': 'delta', 'data': delta})
+
+async def dashboard_change_stream():
+    # Optional source for multi-worker deployments, requires a replica set
+    collections = [name for topic in DASHBOARD_TOPICS for name in partition_names(topic)]
+    pipeline = [{'$match': {'ns.coll': {'$in': collections}}}]
+    while True:
+        try:
+            async with db.watch(pipeline) as stream:
+                async for change in stream:
+                    publish_event(partition_base(change['ns']['coll']), change['operationType'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Dashboard change stream interrupted: {str(e)}")
+            await asyncio.sleep(5)
+
+@api_router.get("/dashboard/stream")
+async def stream_dashboard_stats(request: Request, user: User = Depends(get_current_user)):
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DASHBOARD_CLIENT_QUEUE_SIZE)
+    if dashboard_snapshot['data'] is None:
+        dashboard_snapshot['data'] = await compute_dashboard_stats()
+    queue.put_nowait({'type': 'snapshot', 'data': dashboard_snapshot['data']})
+    dashboard_streams.add(queue)
+    
+    async def event_source():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=DASHBOARD_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            dashboard_streams.discard(queue)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ==================== ANALYTICS ROUTES ====================
+
+OPPORTUNITE_STAGES = ['Prospecté', 'En discussion', 'Devis envoyé', 'Négociation', 'Signé']
+OPPORTUNITE_CLOSED_STATUSES = ['Signé', 'Perdu']
+FUNNEL_REFRESH_SECONDS = int(os.environ.get('FUNNEL_REFRESH_SECONDS', '300'))
+
+# Funnel analytics are refreshed by a background task, requests only read this snapshot
+funnel_cache: Dict[str, Any] = {'data': None, 'computed_at': None}
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    # Linear interpolation between closest ranks
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+# percentile() computed server-side without collecting a group's values into one array (16MB
+# document limit): rank each value within its group, keep the closest ranks with $max, then
+# interpolate in Python. Usage: percentile_rank_stages, then $group with percentile_accumulators.
+# Documents whose field is not a number are still grouped but left out of the ranking.
+def percentile_rank_stages(partition_by, field: str) -> List[dict]:
+    return [
+        {'$set': {'_ranked': {'$isNumber': f'${field}'}}},
+        {'$setWindowFields': {
+            'partitionBy': {'group': partition_by, 'ranked': '$_ranked'},
+            'sortBy': {field: 1},
+            'output': {
+                '_rank': {'$documentNumber': {}},
+                '_n': {'$count': {}, 'window': {'documents': ['unbounded', 'unbounded']}}
+            }
+        }}
+    ]
+
+def percentile_accumulators(field: str, quantiles: List[float]) -> dict:
+    accumulators = {'_n': {'$max': {'$cond': ['$_ranked', '$_n', None]}}}
+    for q in quantiles:
+        # Ranks are 1-based, percentile() positions 0-based
+        lower = {'$add': [{'$floor': {'$multiply': [{'$subtract': ['$_n', 1]}, q]}}, 1]}
+        upper = {'$min': [{'$add': [lower, 1]}, '$_n']}
+        for bound, rank in (('lo', lower), ('hi', upper)):
+            picked = {'$and': ['$_ranked', {'$eq': ['$_rank', rank]}]}
+            accumulators[f'_p{round(q * 100)}_{bound}'] = {'$max': {'$cond': [picked, f'${field}', None]}}
+    return accumulators
+
+def ranked_percentile(row: dict, q: float, scale: float = 1) -> Optional[float]:
+    key = f'_p{round(q * 100)}'
+    if not row.get('_n') or row.get(f'{key}_lo') is None:
+        return None
+    lower, upper = row[f'{key}_lo'] / scale, row[f'{key}_hi'] / scale
+    pos = (row['_n'] - 1) * q
+    return lower + (upper - lower) * (pos - int(pos))
+
+async def compute_funnel_analytics() -> dict:
+    # Highest stage reached per opportunité, "Perdu" does not count as progress
+    reached_pipeline = [
+        {'$match': {'to_statut': {'$in': OPPORTUNITE_STAGES}}},
+        {'$group': {
+            '_id': '$opportunite_id',
+            'max_rank': {'$max': {'$indexOfArray': [OPPORTUNITE_STAGES, '$to_statut']}}
+        }},
+        {'$group': {'_id': '$max_rank', 'count': {'$sum': 1}}}
+    ]
+    reached_by_rank = {r['_id']: r['count'] async for r in analytics_db.opportunite_transitions.aggregate(reached_pipeline)}
+    
+    # An opportunité that reached stage N also went through every earlier stage
+    reached = []
+    running = 0
+    for rank in range(len(OPPORTUNITE_STAGES) - 1, -1, -1):
+        running += reached_by_rank.get(rank, 0)
+        reached.insert(0, running)
+    
+    conversions = []
+    for i in range(len(OPPORTUNITE_STAGES) - 1):
+        conversions.append({
+            'from': OPPORTUNITE_STAGES[i],
+            'to': OPPORTUNITE_STAGES[i + 1],
+            'entered': reached[i],
+            'converted': reached[i + 1],
+            'ratio': round(reached[i + 1] / reached[i], 4) if reached[i] else None
+        })
+    
+    # Dwell time: time between entering a stage and the next transition of the same opportunité
+    dwell_pipeline = [
+        {'$addFields': {'changed_at_date': {'$toDate': '$changed_at'}}},
+        {'$setWindowFields': {
+            'partitionBy': '$opportunite_id',
+            'sortBy': {'changed_at_date': 1},
+            'output': {'next_at': {'$shift': {'output': '$changed_at_date', 'by': 1}}}
+        }},
+        {'$match': {'next_at': {'$ne': None}}},
+        {'$set': {'duration_ms': {'$subtract': ['$next_at', '$changed_at_date']}}},
+        *percentile_rank_stages('$to_statut', 'duration_ms'),
+        {'$group': {'_id': '$to_statut', **percentile_accumulators('duration_ms', [0.5, 0.9])}}
+    ]
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+    
+    dwell = {}
+    async for r in analytics_db.opportunite_transitions.aggregate(dwell_pipeline, allowDiskUse=True):
+        # A stage whose durations are all missing has no percentile: null, as in the SLA stats
+        dwell[r['_id']] = {
+            'count': r['_n'] or 0,
+            'median_hours': rounded(ranked_percentile(r, 0.5, 3600000)),
+            'p90_hours': rounded(ranked_percentile(r, 0.9, 3600000))
+        }
+    
+    def win_rate_group(key: str) -> List[dict]:
+        return [
+            {'$group': {
+                '_id': key,
+                'signees': {'$sum': {'$cond': [{'$eq': ['$statut', 'Signé']}, 1, 0]}},
+                'closes': {'$sum': 1}
+            }},
+            {'$project': {
+                '_id': 0,
+                'key': '$_id',
+                'signees': 1,
+                'closes': 1,
+                'win_rate': {'$round': [{'$divide': ['$signees', '$closes']}, 4]}
+            }},
+            {'$sort': {'win_rate': -1}}
+        ]
+    
+    def win_head(route) -> List[dict]:
+        return [
+            *union_archive('opportunites', {'statut': {'$in': OPPORTUNITE_CLOSED_STATUSES}}, route),
+            {'$lookup': {
+                'from': route('comptes'),
+                'localField': 'compte_id',
+                'foreignField': 'id',
+                'pipeline': [{'$project': {'_id': 0, 'region': 1, 'division': 1}}],
+                'as': 'compte'
+            }},
+            {'$set': {'compte': {'$first': '$compte'}}}
+        ]
+    
+    source, win_pipeline = partitioned_pipeline('opportunites', win_head)
+    win_pipeline.append({'$facet': {
+        'commercial': win_rate_group('$commercial_responsable'),
+        'region': win_rate_group('$compte.region'),
+        'division': win_rate_group('$compte.division')
+    }})
+    win_result = await analytics_db[source].aggregate(win_pipeline).to_list(1)
+    win_rates = win_result[0] if win_result else {'commercial': [], 'region': [], 'division': []}
+    
+    return {
+        'stages': [
+            {'statut': stage, 'reached': reached[i], 'dwell': dwell.get(stage)}
+            for i, stage in enumerate(OPPORTUNITE_STAGES)
+        ],
+        'conversions': conversions,
+        'win_rates': win_rates
+    }
+
+async def refresh_funnel_cache():
+    funnel_cache['data'] = await compute_funnel_analytics()
+    funnel_cache['computed_at'] = datetime.now(timezone.utc).isoformat()
+
+async def run_periodic(name: str, interval_seconds: float, job):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Periodic job {name} failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+@api_router.get("/analytics/opportunites/funnel")
+async def get_opportunites_funnel(user: User = Depends(get_current_user)):
+    if funnel_cache['data'] is None:
+        await refresh_funnel_cache()
+    return {**funnel_cache['data'], 'computed_at': funnel_cache['computed_at']}
+
+QUALITY_TREND_GROUPS = {'compte': '$compte_id', 'division': '$division', 'region': '$region'}
+QUALITY_TREND_METRICS = ['taux_service', 'score_satisfaction', 'nb_incidents']
+QUALITY_TREND_CACHE_SIZE = 256
+
+# LRU keyed by the filters and the shared quality_records tag version, so a write on any
+# worker invalidates every worker's entries. A computation that raced with a write is stored
+# under the version it started from, which no later request asks for.
+quality_trend_cache: OrderedDict = OrderedDict()
+
+def compute_quality_trends(rows: List[dict], top: int) -> dict:
+    # pandas is only needed here, keep it off the cold-start path
+    import numpy as np
+    import pandas as pd
+    
+    if not rows:
+        return {'series': [], 'degrading': []}
+    
+    df = pd.DataFrame(rows)
+    # periode values are "YYYY-MM" / "YYYY-Qn" strings, which sort chronologically
+    df = df.sort_values(['key', 'periode']).reset_index(drop=True)
+    grouped = df.groupby('key', sort=False)
+    for metric in QUALITY_TREND_METRICS:
+        by_key = grouped[metric]
+        df[f'{metric}_avg3'] = by_key.rolling(3, min_periods=1).mean().reset_index(level=0, drop=True)
+        df[f'{metric}_avg12'] = by_key.rolling(12, min_periods=1).mean().reset_index(level=0, drop=True)
+        df[f'{metric}_delta'] = by_key.diff()
+    
+    # Degradation: short-term average below the long-term one on the latest période
+    latest = df.groupby('key', sort=False).tail(1).copy()
+    latest['taux_service_trend'] = latest['taux_service_avg3'] - latest['taux_service_avg12']
+    latest['satisfaction_trend'] = latest['score_satisfaction_avg3'] - latest['score_satisfaction_avg12']
+    latest['incidents_trend'] = latest['nb_incidents_avg3'] - latest['nb_incidents_avg12']
+    latest = latest.sort_values(
+        ['taux_service_trend', 'satisfaction_trend', 'incidents_trend'],
+        ascending=[True, True, False],
+        na_position='last'
+    )
+    degrading = latest[latest['taux_service_trend'].fillna(0) < 0].head(top)
+    
+    def records(frame, columns):
+        frame = frame[columns].round(3).astype(object)
+        return frame.where(pd.notna(frame), None).to_dict(orient='records')
+    
+    series_columns = ['key', 'periode', 'records'] + [
+        f'{metric}{suffix}' for metric in QUALITY_TREND_METRICS for suffix in ('', '_avg3', '_avg12', '_delta')
+    ]
+    return {
+        'series': records(df, series_columns),
+        'degrading': records(degrading, [
+            'key', 'periode', 'taux_service_avg3', 'taux_service_avg12', 'taux_service_trend',
+            'score_satisfaction_avg3', 'satisfaction_trend', 'nb_incidents_avg3', 'incidents_trend'
+        ]),
+        'periodes': int(np.unique(df['periode']).size)
+    }
+
+@api_router.get("/analytics/quality/trends")
+async def get_quality_trends(
+    group_by: str = 'compte',
+    division: Optional[str] = None,
+    region: Optional[str] = None,
+    compte_id: Optional[str] = None,
+    top: int = 10,
+    user: User = Depends(get_current_user)
+):
+    if group_by not in QUALITY_TREND_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by doit être parmi {', '.join(QUALITY_TREND_GROUPS)}")
+    
+    versions = await shared_tag_versions(['quality_records'])
+    cache_key = (group_by, division, region, compte_id, top, tuple(versions)) if versions is not None else None
+    cached = quality_trend_cache.get(cache_key)
+    if cached is not None:
+        quality_trend_cache.move_to_end(cache_key)
+        return cached
+    
+    match = {}
+    if division:
+        match['division'] = division
+    if region:
+        match['region'] = region
+    if compte_id:
+        match['compte_id'] = compte_id
+    
+    # A division filter only reads that division's partition
+    source, pipeline = partitioned_pipeline('quality_records', lambda route: [{'$match': match}],
+                                            [division] if division else None)
+    pipeline += [
+        {'$group': {
+            '_id': {'key': QUALITY_TREND_GROUPS[group_by], 'periode': '$periode'},
+            'taux_service': {'$avg': '$taux_service'},
+            'score_satisfaction': {'$avg': '$score_satisfaction'},
+            'nb_incidents': {'$sum': '$nb_incidents'},
+            'records': {'$sum': 1}
+        }},
+        {'$project': {
+            '_id': 0,
+            'key': '$_id.key',
+            'periode': '$_id.periode',
+            'taux_service': 1,
+            'score_satisfaction': 1,
+            'nb_incidents': 1,
+            'records': 1
+        }}
+    ]
+    rows = await analytics_db[source].aggregate(pipeline).to_list(None)
+    result = await asyncio.to_thread(compute_quality_trends, rows, top)
+    result['group_by'] = group_by
+    
+    if cache_key is not None:
+        quality_trend_cache[cache_key] = result
+        if len(quality_trend_cache) > QUALITY_TREND_CACHE_SIZE:
+            quality_trend_cache.popitem(last=False)
+    return result
+
+INCIDENT_CLOSED_STATUSES = ['Clos', 'Résolu']
+INCIDENT_SLA_DIMENSIONS = {'gravite': '$gravite', 'type': '$type', 'division': '$record.division', 'region': '$record.region'}
+# Hours allowed to close an incident, per gravité; override with a JSON object
+INCIDENT_SLA_HOURS = json.loads(os.environ.get('INCIDENT_SLA_HOURS', '{"Critique": 24, "Moyen": 72, "Faible": 168}'))
+INCIDENT_SLA_DEFAULT_HOURS = float(os.environ.get('INCIDENT_SLA_DEFAULT_HOURS', '168'))
+
+@api_router.get("/analytics/incidents/sla")
+async def get_incident_sla(
+    gravite: Optional[str] = None,
+    type: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    now = datetime.now(timezone.utc)
+    match = {}
+    if gravite:
+        match['gravite'] = gravite
+    if type:
+        match['type'] = type
+    threshold_hours = {
+        '$switch': {
+            'branches': [{'case': {'$eq': ['$gravite', g]}, 'then': h} for g, h in INCIDENT_SLA_HOURS.items()],
+            'default': INCIDENT_SLA_DEFAULT_HOURS
+        }
+    }
+    
+    def sla_group(key: str) -> List[dict]:
+        return [
+            *percentile_rank_stages(key, 'close_hours'),
+            {'$group': {
+                '_id': key,
+                'total': {'$sum': 1},
+                **percentile_accumulators('close_hours', [0.5, 0.9, 0.99]),
+                'mean_close_hours': {'$avg': '$close_hours'},
+                'open': {'$sum': {'$cond': ['$is_open', 1, 0]}},
+                'open_past_sla': {'$sum': {'$cond': [{'$and': ['$is_open', {'$gt': ['$age_hours', '$threshold_hours']}]}, 1, 0]}},
+                'backlog_mean_age_hours': {'$avg': {'$cond': ['$is_open', '$age_hours', None]}},
+                'backlog_max_age_hours': {'$max': {'$cond': ['$is_open', '$age_hours', None]}}
+            }},
+            {'$sort': {'_id': 1}}
+        ]
+    
+    def sla_head(route) -> List[dict]:
+        return [
+            *union_archive('incidents', match, route),
+            {'$project': {
+                '_id': 0,
+                'gravite': 1,
+                'type': 1,
+                'quality_record_id': 1,
+                'created': {'$toDate': '$created_at'},
+                'closed': {'$convert': {'input': '$closed_at', 'to': 'date', 'onError': None, 'onNull': None}},
+                'is_open': {'$not': [{'$in': ['$statut', INCIDENT_CLOSED_STATUSES]}]}
+            }},
+            {'$lookup': {
+                'from': route('quality_records'),
+                'localField': 'quality_record_id',
+                'foreignField': 'id',
+                'pipeline': [{'$project': {'_id': 0, 'division': 1, 'region': 1}}],
+                'as': 'record'
+            }},
+            {'$set': {
+                'record': {'$first': '$record'},
+                'threshold_hours': threshold_hours,
+                'age_hours': {'$divide': [{'$subtract': [now, '$created']}, 3600000]},
+                'close_hours': {'$cond': [
+                    {'$and': [{'$not': ['$is_open']}, {'$ne': ['$closed', None]}]},
+                    {'$divide': [{'$subtract': ['$closed', '$created']}, 3600000]},
+                    '$$REMOVE'
+                ]}
+            }}
+        ]
+    
+    source, pipeline = partitioned_pipeline('incidents', sla_head)
+    pipeline.append({'$facet': {name: sla_group(key) for name, key in INCIDENT_SLA_DIMENSIONS.items()}})
+    result = await analytics_db[source].aggregate(pipeline, allowDiskUse=True).to_list(1)
+    facets = result[0] if result else {}
+    
+    def summarize(row: dict) -> dict:
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+        
+        return {
+            'key': row['_id'],
+            'total': row['total'],
+            'closed': row['_n'] or 0,
+            'mean_hours': rounded(row['mean_close_hours']),
+            'median_hours': rounded(ranked_percentile(row, 0.5)),
+            'p90_hours': rounded(ranked_percentile(row, 0.9)),
+            'p99_hours': rounded(ranked_percentile(row, 0.99)),
+            'open': row['open'],
+            'open_past_sla': row['open_past_sla'],
+            'backlog_mean_age_hours': rounded(row['backlog_mean_age_hours']),
+            'backlog_max_age_hours': rounded(row['backlog_max_age_hours'])
+        }
+    
+    return {
+        'thresholds_hours': {**INCIDENT_SLA_HOURS, 'default': INCIDENT_SLA_DEFAULT_HOURS},
+        'computed_at': now.isoformat(),
+        **{name: [summarize(row) for row in facets.get(name, [])] for name in INCIDENT_SLA_DIMENSIONS}
+    }
+
+LANE_SORTS = {'count': 'count', 'revenue': 'montant_estime', 'signed_ratio': 'signed_ratio'}
+
+@api_router.get("/analytics/lanes")
+async def get_lane_analytics(
+    sort: str = 'count',
+    temperature_regime: Optional[str] = None,
+    min_count: int = 1,
+    limit: int = 50,
+    user: User = Depends(get_current_user)
+):
+    if sort not in LANE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort doit être parmi {', '.join(LANE_SORTS)}")
+    
+    match = {'lane_key': {'$ne': None}}
+    if temperature_regime:
+        match['temperature_regime'] = temperature_regime
+    
+    source, pipeline = partitioned_pipeline('opportunites', lambda route: union_archive('opportunites', match, route))
+    pipeline += [
+        {'$group': {
+            '_id': {'lane': '$lane_key', 'regime': '$temperature_regime'},
+            'count': {'$sum': 1},
+            'montant_estime': {'$sum': {'$ifNull': ['$montant_estime', 0]}},
+            'signees': {'$sum': {'$cond': [{'$eq': ['$statut', 'Signé']}, 1, 0]}}
+        }},
+        {'$group': {
+            '_id': '$_id.lane',
+            'count': {'$sum': '$count'},
+            'montant_estime': {'$sum': '$montant_estime'},
+            'signees': {'$sum': '$signees'},
+            'regimes': {'$push': {
+                'temperature_regime': '$_id.regime',
+                'count': '$count',
+                'montant_estime': {'$round': ['$montant_estime', 2]},
+                'signees': '$signees'
+            }}
+        }},
+        {'$match': {'count': {'$gte': min_count}}},
+        {'$project': {
+            '_id': 0,
+            'lane_key': '$_id',
+            'count': 1,
+            'montant_estime': {'$round': ['$montant_estime', 2]},
+            'signees': 1,
+            'signed_ratio': {'$round': [{'$divide': ['$signees', '$count']}, 4]},
+            'regimes': {'$sortArray': {'input': '$regimes', 'sortBy': {'count': -1}}}
+        }},
+        {'$sort': {LANE_SORTS[sort]: -1, 'count': -1}},
+        {'$limit': min(limit, 500)}
+    ]
+    lanes = await analytics_db[source].aggregate(pipeline).to_list(None)
+    for lane in lanes:
+        lane['depart'], _, lane['arrivee'] = lane['lane_key'].partition('>')
+    return lanes
+
+# ==================== REPORT ROUTES ====================
+
+# Whitelisted fields per source; "compte.*" fields are joined from comptes
+REPORT_SOURCES = {
+    'opportunites': {
+        'fields': ['compte_id', 'type_besoin', 'temperatures', 'frequence', 'canal', 'statut', 'urgence',
+                   'commercial_responsable', 'montant_estime', 'created_at', 'date_premier_contact'],
+        'join_compte': True
+    },
+    'comptes': {
+        'fields': ['division', 'region', 'secteur', 'taille', 'source', 'ville', 'created_by', 'created_at'],
+        'join_compte': False
+    },
+    'quality_records': {
+        'fields': ['compte_id', 'division', 'region', 'periode', 'type_prestation', 'taux_service',
+                   'nb_incidents', 'score_satisfaction', 'created_at'],
+        'join_compte': True
+    },
+    'incidents': {
+        'fields': ['type', 'gravite', 'statut', 'created_at', 'closed_at'],
+        'join_compte': False
+    }
+}
+REPORT_COMPTE_FIELDS = ['division', 'region', 'secteur', 'taille']
+REPORT_DATE_PARTS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+REPORT_AGGS = {'sum', 'mean', 'count', 'min', 'max'}
+REPORT_CACHE_SIZE = int(os.environ.get('REPORT_CACHE_SIZE', '64'))
+REPORT_ROLES = ['Admin_Directeur', 'Assistante_Direction']
+
+# LRU keyed by the spec and the shared tag versions of its source and of comptes (joined),
+# so a write on any worker invalidates every worker's pivots
+report_cache: OrderedDict = OrderedDict()
+
+def report_field(dimension: str) -> tuple:
+    # "created_at:month" -> ("created_at", "month")
+    field, _, part = dimension.partition(':')
+    return field, part or None
+
+def validate_pivot_spec(spec: PivotSpec) -> List[str]:
+    source = REPORT_SOURCES.get(spec.source)
+    if not source:
+        raise HTTPException(status_code=400, detail=f"Source inconnue: {spec.source}")
+    allowed = set(source['fields'])
+    if source['join_compte']:
+        allowed |= {f'compte.{f}' for f in REPORT_COMPTE_FIELDS}
+    if not spec.rows:
+        raise HTTPException(status_code=400, detail="Au moins une dimension en ligne est requise")
+    
+    needed = set()
+    for dimension in spec.rows + spec.columns:
+        field, part = report_field(dimension)
+        if field not in allowed or (part and part not in REPORT_DATE_PARTS):
+            raise HTTPException(status_code=400, detail=f"Dimension invalide: {dimension}")
+        needed.add(field)
+    for measure in spec.measures:
+        if measure.agg not in REPORT_AGGS:
+            raise HTTPException(status_code=400, detail=f"Agrégation invalide: {measure.agg}")
+        if measure.field:
+            if measure.field not in allowed:
+                raise HTTPException(status_code=400, detail=f"Mesure invalide: {measure.field}")
+            needed.add(measure.field)
+        elif measure.agg != 'count':
+            raise HTTPException(status_code=400, detail="Seul count peut être utilisé sans champ")
+    for field in spec.filters:
+        if field not in allowed:
+            raise HTTPException(status_code=400, detail=f"Filtre invalide: {field}")
+    return sorted(needed)
+
+async def load_report_columns(spec: PivotSpec, fields: List[str]) -> Dict[str, list]:
+    def condition(value):
+        return {'$in': value} if isinstance(value, list) else value
+    
+    base_filters = {k: condition(v) for k, v in spec.filters.items() if not k.startswith('compte.')}
+    compte_filters = {k: condition(v) for k, v in spec.filters.items() if k.startswith('compte.')}
+    def head(route) -> List[dict]:
+        if spec.source in ARCHIVE_COLLECTIONS:
+            stages = union_archive(spec.source, base_filters, route)
+        else:
+            stages = [{'$match': base_filters}]
+        if any(f.startswith('compte.') for f in fields) or compte_filters:
+            projection = {'_id': 0, **{f: 1 for f in REPORT_COMPTE_FIELDS}}
+            if spec.source == 'quality_records':
+                # A fiche's division is entered on its own and may differ from its compte's
+                stages += lookup_across_partitions('comptes', 'compte_id', 'id', projection, 'compte')
+            else:
+                stages += [
+                    {'$lookup': {
+                        'from': route('comptes'),
+                        'localField': 'compte_id',
+                        'foreignField': 'id',
+                        'pipeline': [{'$project': projection}],
+                        'as': 'compte'
+                    }},
+                    {'$set': {'compte': {'$first': '$compte'}}}
+                ]
+            stages.append({'$match': compte_filters})
+        return stages
+    
+    source, pipeline = partitioned_pipeline(spec.source, head)
+    pipeline.append({'$project': {'_id': 0, **{f: 1 for f in fields}}})
+    
+    # Stream only the projected fields into column arrays
+    columns: Dict[str, list] = {f: [] for f in fields}
+    async for doc in analytics_db[source].aggregate(pipeline, allowDiskUse=True, batchSize=5000):
+        compte = doc.get('compte') or {}
+        for f in fields:
+            columns[f].append(compte.get(f[7:]) if f.startswith('compte.') else doc.get(f))
+    return columns
+
+def compute_pivot(spec: PivotSpec, columns: Dict[str, list]) -> dict:
+    import pandas as pd
+    
+    df = pd.DataFrame(columns)
+    for dimension in spec.rows + spec.columns:
+        field, part = report_field(dimension)
+        if part:
+            dates = pd.to_datetime(df[field], utc=True, errors='coerce', format='ISO8601')
+            periods = dates.dt.tz_localize(None).dt.to_period(REPORT_DATE_PARTS[part])
+            # Missing or unparseable dates join the '(vide)' bucket, not a 'NaT' one
+            df[dimension] = periods.astype(str).where(periods.notna(), None)
+        df[dimension] = df[dimension].fillna('(vide)')
+    
+    aggfunc = {}
+    for measure in spec.measures:
+        name = f'{measure.agg}({measure.field or "*"})'
+        if measure.field:
+            df[name] = pd.to_numeric(df[measure.field], errors='coerce') if measure.agg != 'count' else df[measure.field]
+        else:
+            df[name] = 1
+        aggfunc[name] = 'sum' if not measure.field and measure.agg == 'count' else measure.agg
+    
+    if df.empty:
+        return {'columns': spec.rows, 'rows': []}
+    pivot = pd.pivot_table(df, index=spec.rows, columns=spec.columns or None, values=list(aggfunc),
+                           aggfunc=aggfunc, observed=True)
+    if spec.columns:
+        # Flatten (measure, column values...) headers
+        pivot.columns = [' | '.join(str(part) for part in col) for col in pivot.columns]
+    pivot = pivot.reset_index().round(2).astype(object)
+    pivot = pivot.where(pd.notna(pivot), None)
+    return {'columns': [str(c) for c in pivot.columns], 'rows': pivot.values.tolist()}
+
+def pivot_to_xlsx(result: dict) -> bytes:
+    import io
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill
+    
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Pivot"
+    ws.append(result['columns'])
+    for row in result['rows']:
+        ws.append(row)
+    for cell in ws[1]:
+        cell.fill = PatternFill(start_color="2563EB", end_color="2563EB", fill_type="solid")
+        cell.font = Font(color="FFFFFF", bold=True)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+@api_router.post("/reports/pivot")
+async def run_pivot_report(spec: PivotSpec, user: User = Depends(get_current_user)):
+    if user.role not in REPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction")
+    if spec.format not in ('json', 'xlsx'):
+        raise HTTPException(status_code=400, detail="Format invalide (json ou xlsx)")
+    
+    fields = validate_pivot_spec(spec)
+    versions = await shared_tag_versions([spec.source, 'comptes'])
+    cache_key = None
+    if versions is not None:
+        cache_key = (json.dumps(spec.model_dump(exclude={'format'}), sort_keys=True, default=str), tuple(versions))
+    
+    result = report_cache.get(cache_key)
+    if result is not None:
+        report_cache.move_to_end(cache_key)
+    else:
+        columns = await load_report_columns(spec, fields)
+        result = await asyncio.to_thread(compute_pivot, spec, columns)
+        if cache_key is not None:
+            report_cache[cache_key] = result
+            if len(report_cache) > REPORT_CACHE_SIZE:
+                report_cache.popitem(last=False)
+    
+    if spec.format == 'xlsx':
+        content = await asyncio.to_thread(pivot_to_xlsx, result)
+        return Response(
+            content=content,
+            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename="pivot_{spec.source}.xlsx"'}
+        )
+    return result
+
 # ==================== ADMIN ROUTES ====================
 
+USERS_ADAPTER = TypeAdapter(List[User])
+USER_DIRECTORY_ADAPTER = TypeAdapter(List[UserDirectoryEntry])
+
+@api_router.get("/users/directory", response_model=List[UserDirectoryEntry])
+async def get_user_directory(user: User = Depends(get_current_user)):
+    async def load():
+        return await list_db.users.find({}, USER_DIRECTORY_PROJECTION).sort('name', 1).to_list(1000)
+    
+    return await cached_response('user_directory', 'all', ['users'], load, USER_DIRECTORY_ADAPTER)
+
 @api_router.get("/admin/users", response_model=List[User])
 async def get_all_users(user: User = Depends(get_current_user)):
     if user.role != 'Admin_Directeur':
         raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
     
-    users = await db.users.find({}, {'_id': 0}).to_list(1000)
-    for u in users:
-        if isinstance(u.get('created_at'), str):
-            u['created_at'] = datetime.fromisoformat(u['created_at'])
-    return users
+    async def load():
+        users = await list_db.users.find({}, {'_id': 0}).to_list(1000)
+        for u in users:
+            if isinstance(u.get('created_at'), str):
+                u['created_at'] = datetime.fromisoformat(u['created_at'])
+        return users
+    
+    return await cached_response('admin_users', 'admin', ['users'], load, USERS_ADAPTER)
 
 @api_router.post("/admin/users", response_model=User)
 async def create_user_admin(data: User, user: User = Depends(get_current_user)):
@@ -727,6 +3173,8 @@ async def create_user_admin(data: User, user: User = Depends(get_current_user)):
     user_dict = new_user.model_dump()
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     await db.users.insert_one(user_dict)
+    await audit_change('users', new_user.id, 'create', user.id, None, user_dict)
+    publish_event('users', 'create', new_user.id)
     return new_user
 
 @api_router.delete("/admin/users/{user_id}")
@@ -738,20 +3186,108 @@ async def delete_user(user_id: str, user: User = Depends(get_current_user)):
     if user_id == user.id:
         raise HTTPException(status_code=400, detail="Vous ne pouvez pas supprimer votre propre compte")
     
-    result = await db.users.delete_one({'id': user_id})
-    if result.deleted_count == 0:
+    deleted = await db.users.find_one_and_delete({'id': user_id}, projection={'_id': 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    await audit_change('users', user_id, 'delete', user.id, deleted, None)
+    publish_event('users', 'delete', user_id)
     
     # Also delete user sessions
     await db.user_sessions.delete_many({'user_id': user_id})
     
     return {'message': 'Utilisateur supprimé avec succès'}
 
+@api_router.get("/admin/audit")
+async def get_audit_log(
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    limit: int = 100,
+    user: User = Depends(get_current_user)
+):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    
+    query = {}
+    if entity:
+        query['entity'] = entity
+        if entity_id:
+            query['entity_id'] = entity_id
+    
+    entries = await db.audit_log.find(query, {'_id': 0}).sort('ts', -1).to_list(min(limit, 1000))
+    return {'entries': entries, 'stats': audit_stats, 'pending': audit_queue.qsize()}
+
+@api_router.get("/admin/backups")
+async def get_backups(user: User = Depends(get_current_user)):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    import backup
+    
+    manifests = await asyncio.to_thread(backup.list_backups, BACKUP_DIR)
+    return [
+        {
+            'id': m['id'],
+            'base': m['base'],
+            'started_at': m['started_at'],
+            'finished_at': m['finished_at'],
+            'documents': {name: c['documents'] for name, c in m['collections'].items()},
+            **m['stats']
+        }
+        for m in reversed(manifests)
+    ]
+
+@api_router.get("/admin/archive")
+async def get_archive_status(user: User = Depends(get_current_user)):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    
+    collections = {}
+    for collection, archive in ARCHIVE_COLLECTIONS.items():
+        hot, archived, eligible = await asyncio.gather(
+            count_partitioned(db, collection, {}),
+            count_partitioned(db, archive, {}),
+            count_partitioned(db, collection, archive_criteria(collection, datetime.now(timezone.utc)))
+        )
+        collections[collection] = {'hot': hot, 'archived': archived, 'eligible': eligible}
+    return {
+        'collections': collections,
+        'thresholds_days': {
+            'incidents': ARCHIVE_INCIDENTS_AFTER_DAYS,
+            'opportunites_perdu': ARCHIVE_OPPORTUNITES_PERDU_AFTER_DAYS,
+            'opportunites': ARCHIVE_OPPORTUNITES_AFTER_DAYS
+        },
+        **archive_state
+    }
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(user: User = Depends(get_current_user)):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    return {'backend': RESPONSE_CACHE_BACKEND, 'routes': response_cache_stats()}
+
+@api_router.get("/admin/slow-operations")
+async def get_slow_operations(user: User = Depends(get_current_user)):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    return {'threshold_ms': SLOW_QUERY_MS, 'operations': list(reversed(slow_operations))}
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, user: User = Depends(get_current_user)):
+    if user.role != 'Admin_Directeur':
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    
+    profile = await db.request_profiles.find_one({'id': profile_id}, {'_id': 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    # Folded stacks, usable directly with flamegraph.pl or speedscope
+    return PlainTextResponse(profile['folded'])
+
 @api_router.get("/admin/translations/init")
 async def init_translations(user: User = Depends(get_current_user)):
     if user.role != 'Admin_Directeur':
         raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
-    
+    return await seed_default_translations(user.id)
+
+async def seed_default_translations(user_id: str, progress=no_progress) -> dict:
     # Default translations for the app
     default_translations = [
         {'key': 'app.title', 'value': 'Suivi Activité Commerciale', 'lang': 'fr-FR'},
@@ -811,11 +3347,13 @@ async def init_translations(user: User = Depends(get_current_user)):
         return {'message': 'Traductions déjà initialisées', 'count': existing_count}
     
     # Insert default translations
-    for trans in default_translations:
-        translation = TranslationKey(**trans, updated_by=user.id)
+    for i, trans in enumerate(default_translations):
+        translation = TranslationKey(**trans, updated_by=user_id)
         trans_dict = translation.model_dump()
         trans_dict['updated_at'] = trans_dict['updated_at'].isoformat()
         await db.translation_keys.insert_one(trans_dict)
+        await audit_change('translation_keys', translation.id, 'create', user_id, None, trans_dict)
+        await progress(int((i + 1) * 100 / len(default_translations)), trans['key'])
     
     return {'message': f'{len(default_translations)} traductions initialisées avec succès'}
 
@@ -837,6 +3375,7 @@ async def create_custom_status(data: CustomStatus, user: User = Depends(get_curr
     status = CustomStatus(**data.model_dump(), created_by=user.id)
     status_dict = status.model_dump()
     status_dict['created_at'] = status_dict['created_at'].isoformat()
+    status_dict['updated_at'] = status_dict['created_at']
     await db.custom_statuses.insert_one(status_dict)
     return status
 
@@ -845,16 +3384,19 @@ async def delete_custom_status(status_id: str, user: User = Depends(get_current_
     if user.role != 'Admin_Directeur':
         raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
     
-    result = await db.custom_statuses.delete_one({'id': status_id})
-    if result.deleted_count == 0:
+    deleted = await db.custom_statuses.find_one_and_delete({'id': status_id}, projection={'_id': 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Statut non trouvé")
+    await record_tombstones('custom_statuses', [deleted])
     return {'message': 'Statut supprimé'}
 
 @api_router.post("/admin/custom-status/init")
 async def init_custom_statuses(user: User = Depends(get_current_user)):
     if user.role != 'Admin_Directeur':
         raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
-    
+    return await seed_default_statuses(user.id)
+
+async def seed_default_statuses(user_id: str, progress=no_progress) -> dict:
     # Default statuses
     default_statuses = [
         # Opportunités
@@ -881,11 +3423,13 @@ async def init_custom_statuses(user: User = Depends(get_current_user)):
     if existing > 0:
         return {'message': 'Statuts déjà initialisés', 'count': existing}
     
-    for status_data in default_statuses:
-        status = CustomStatus(**status_data, created_by=user.id)
+    for i, status_data in enumerate(default_statuses):
+        status = CustomStatus(**status_data, created_by=user_id)
         status_dict = status.model_dump()
         status_dict['created_at'] = status_dict['created_at'].isoformat()
+        status_dict['updated_at'] = status_dict['created_at']
         await db.custom_statuses.insert_one(status_dict)
+        await progress(int((i + 1) * 100 / len(default_statuses)), status_data['label'])
     
     return {'message': f'{len(default_statuses)} statuts initialisés avec succès'}
 
@@ -909,6 +3453,7 @@ async def create_translation(data: TranslationKey, user: User = Depends(get_curr
     trans_dict = translation.model_dump()
     trans_dict['updated_at'] = trans_dict['updated_at'].isoformat()
     await db.translation_keys.insert_one(trans_dict)
+    await audit_change('translation_keys', translation.id, 'create', user.id, None, trans_dict)
     return translation
 
 @api_router.put("/admin/translations/{key_id}", response_model=TranslationKey)
@@ -919,6 +3464,7 @@ async def update_translation(key_id: str, data: dict, user: User = Depends(get_c
     data['updated_by'] = user.id
     data['updated_at'] = datetime.now(timezone.utc).isoformat()
     
+    existing = await db.translation_keys.find_one({'id': key_id}, {'_id': 0})
     result = await db.translation_keys.update_one(
         {'id': key_id},
         {'$set': data}
@@ -928,186 +3474,392 @@ async def update_translation(key_id: str, data: dict, user: User = Depends(get_c
         raise HTTPException(status_code=404, detail="Clé de traduction non trouvée")
     
     updated = await db.translation_keys.find_one({'id': key_id}, {'_id': 0})
+    await audit_change('translation_keys', key_id, 'update', user.id, existing, updated)
     if isinstance(updated.get('updated_at'), str):
         updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
     return TranslationKey(**updated)
 
+def write_sheet(wb, title: str, headers: List[str], fields: List[str], docs: List[dict]):
+    ws = wb.create_sheet(title)
+    ws.append(headers)
+    for doc in docs:
+        ws.append([doc.get(field, '') for field in fields])
+
+def save_workbook(wb, path: str):
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    # Style headers
+    header_fill = PatternFill(start_color="2563EB", end_color="2563EB", fill_type="solid")
+    header_font = Font(color="FFFFFF", bold=True)
+    
+    for sheet in wb.worksheets:
+        for cell in sheet[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+    wb.save(path)
+
+async def build_export_workbook(path: str, progress=no_progress):
+    # Reads stay on the event loop; building the rows and saving run in the job pool
+    from openpyxl import Workbook
+    
+    # Create workbook
+    wb = Workbook()
+    
+    # Remove default sheet
+    wb.remove(wb.active)
+    
+    await progress(5, 'Utilisateurs')
+    users = await analytics_db.users.find({}, {'_id': 0, 'password_hash': 0}).to_list(1000)
+    await run_job_work(write_sheet, wb, "Utilisateurs",
+                       ["ID", "Nom", "Email", "Rôle", "Division", "Région", "Date création"],
+                       ['id', 'name', 'email', 'role', 'division', 'region', 'created_at'], users)
+    
+    await progress(20, 'Clients_Prospects')
+    comptes = await find_partitioned(analytics_db, 'comptes', {})
+    await run_job_work(write_sheet, wb, "Clients_Prospects", [
+        "ID", "Raison Sociale", "Division", "Région", "Adresse", "Ville", "Code Postal",
+        "Secteur", "Taille", "Contact Nom", "Contact Poste", "Contact Email",
+        "Contact Téléphone", "Source", "Créé par", "Date création"
+    ], [
+        'id', 'raison_sociale', 'division', 'region', 'adresse', 'ville', 'code_postal',
+        'secteur', 'taille', 'contact_nom', 'contact_poste', 'contact_email',
+        'contact_telephone', 'source', 'created_by', 'created_at'
+    ], comptes)
+    
+    await progress(40, 'Opportunités')
+    opps = await find_with_archive(analytics_db, 'opportunites', {}, True)
+    await run_job_work(write_sheet, wb, "Opportunités", [
+        "ID", "Compte ID", "Type Besoin", "Volumes Estimés", "Températures", "Fréquence",
+        "Marchandises", "Départ", "Arrivée", "Contraintes Horaires", "Urgence",
+        "Commercial Responsable", "Date Premier Contact", "Canal", "Statut",
+        "Montant Estimé", "Prochaine Relance", "Commentaires", "Date création"
+    ], [
+        'id', 'compte_id', 'type_besoin', 'volumes_estimes', 'temperatures', 'frequence',
+        'marchandises', 'depart', 'arrivee', 'contraintes_horaires', 'urgence',
+        'commercial_responsable', 'date_premier_contact', 'canal', 'statut',
+        'montant_estime', 'prochaine_relance', 'commentaires', 'created_at'
+    ], opps)
+    
+    await progress(60, 'Fiches_Qualité')
+    quality_records = await find_partitioned(analytics_db, 'quality_records', {})
+    await run_job_work(write_sheet, wb, "Fiches_Qualité", [
+        "ID", "Compte ID", "Division", "Région", "Période", "Type Prestation",
+        "Taux Service", "Nb Incidents", "Score Satisfaction", "Commentaires", "Date création"
+    ], [
+        'id', 'compte_id', 'division', 'region', 'periode', 'type_prestation',
+        'taux_service', 'nb_incidents', 'score_satisfaction', 'commentaires', 'created_at'
+    ], quality_records)
+    
+    await progress(75, 'Incidents')
+    incidents = await find_with_archive(analytics_db, 'incidents', {}, True)
+    await run_job_work(write_sheet, wb, "Incidents", [
+        "ID", "Quality Record ID", "Type", "Gravité", "Description", "Statut",
+        "Action Corrective", "Date Clôture", "Date création"
+    ], [
+        'id', 'quality_record_id', 'type', 'gravite', 'description', 'statut',
+        'action_corrective', 'closed_at', 'created_at'
+    ], incidents)
+    
+    await progress(85, 'Enquêtes_Satisfaction')
+    survey_responses = await analytics_db.survey_responses.find({}, {'_id': 0}).to_list(1000)
+    await run_job_work(write_sheet, wb, "Enquêtes_Satisfaction", [
+        "ID", "Compte ID", "Division", "Période", "Note Globale",
+        "Commentaires", "Date soumission"
+    ], ['id', 'compte_id', 'division', 'periode', 'note_globale', 'commentaires', 'submitted_at'], survey_responses)
+    
+    await progress(95, 'Enregistrement')
+    await run_job_work(save_workbook, wb, path)
+
 @api_router.get("/admin/export-data")
 async def export_all_data(user: User = Depends(get_current_user)):
     if user.role != 'Admin_Directeur':
         raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
     
+    import tempfile
+    
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+    temp_file.close()
     try:
-        # Create workbook
-        wb = Workbook()
-        
-        # Remove default sheet
-        wb.remove(wb.active)
-        
-        # Export Users
-        ws_users = wb.create_sheet("Utilisateurs")
-        ws_users.append(["ID", "Nom", "Email", "Rôle", "Division", "Région", "Date création"])
-        users = await db.users.find({}, {'_id': 0, 'password_hash': 0}).to_list(1000)
-        for u in users:
-            ws_users.append([
-                u.get('id', ''),
-                u.get('name', ''),
-                u.get('email', ''),
-                u.get('role', ''),
-                u.get('division', ''),
-                u.get('region', ''),
-                u.get('created_at', '')
-            ])
+        await build_export_workbook(temp_file.name)
         
-        # Export Comptes
-        ws_comptes = wb.create_sheet("Clients_Prospects")
-        ws_comptes.append([
-            "ID", "Raison Sociale", "Division", "Région", "Adresse", "Ville", "Code Postal",
-            "Secteur", "Taille", "Contact Nom", "Contact Poste", "Contact Email", 
-            "Contact Téléphone", "Source", "Créé par", "Date création"
-        ])
-        comptes = await db.comptes.find({}, {'_id': 0}).to_list(1000)
-        for c in comptes:
-            ws_comptes.append([
-                c.get('id', ''),
-                c.get('raison_sociale', ''),
-                c.get('division', ''),
-                c.get('region', ''),
-                c.get('adresse', ''),
-                c.get('ville', ''),
-                c.get('code_postal', ''),
-                c.get('secteur', ''),
-                c.get('taille', ''),
-                c.get('contact_nom', ''),
-                c.get('contact_poste', ''),
-                c.get('contact_email', ''),
-                c.get('contact_telephone', ''),
-                c.get('source', ''),
-                c.get('created_by', ''),
-                c.get('created_at', '')
-            ])
-        
-        # Export Opportunités
-        ws_opps = wb.create_sheet("Opportunités")
-        ws_opps.append([
-            "ID", "Compte ID", "Type Besoin", "Volumes Estimés", "Températures", "Fréquence",
-            "Marchandises", "Départ", "Arrivée", "Contraintes Horaires", "Urgence",
-            "Commercial Responsable", "Date Premier Contact", "Canal", "Statut",
-            "Montant Estimé", "Prochaine Relance", "Commentaires", "Date création"
-        ])
-        opps = await db.opportunites.find({}, {'_id': 0}).to_list(1000)
-        for o in opps:
-            ws_opps.append([
-                o.get('id', ''),
-                o.get('compte_id', ''),
-                o.get('type_besoin', ''),
-                o.get('volumes_estimes', ''),
-                o.get('temperatures', ''),
-                o.get('frequence', ''),
-                o.get('marchandises', ''),
-                o.get('depart', ''),
-                o.get('arrivee', ''),
-                o.get('contraintes_horaires', ''),
-                o.get('urgence', ''),
-                o.get('commercial_responsable', ''),
-                o.get('date_premier_contact', ''),
-                o.get('canal', ''),
-                o.get('statut', ''),
-                o.get('montant_estime', ''),
-                o.get('prochaine_relance', ''),
-                o.get('commentaires', ''),
-                o.get('created_at', '')
-            ])
-        
-        # Export Quality Records
-        ws_quality = wb.create_sheet("Fiches_Qualité")
-        ws_quality.append([
-            "ID", "Compte ID", "Division", "Région", "Période", "Type Prestation",
-            "Taux Service", "Nb Incidents", "Score Satisfaction", "Commentaires", "Date création"
-        ])
-        quality_records = await db.quality_records.find({}, {'_id': 0}).to_list(1000)
-        for q in quality_records:
-            ws_quality.append([
-                q.get('id', ''),
-                q.get('compte_id', ''),
-                q.get('division', ''),
-                q.get('region', ''),
-                q.get('periode', ''),
-                q.get('type_prestation', ''),
-                q.get('taux_service', ''),
-                q.get('nb_incidents', ''),
-                q.get('score_satisfaction', ''),
-                q.get('commentaires', ''),
-                q.get('created_at', '')
-            ])
-        
-        # Export Incidents
-        ws_incidents = wb.create_sheet("Incidents")
-        ws_incidents.append([
-            "ID", "Quality Record ID", "Type", "Gravité", "Description", "Statut",
-            "Action Corrective", "Date Clôture", "Date création"
-        ])
-        incidents = await db.incidents.find({}, {'_id': 0}).to_list(1000)
-        for i in incidents:
-            ws_incidents.append([
-                i.get('id', ''),
-                i.get('quality_record_id', ''),
-                i.get('type', ''),
-                i.get('gravite', ''),
-                i.get('description', ''),
-                i.get('statut', ''),
-                i.get('action_corrective', ''),
-                i.get('closed_at', ''),
-                i.get('created_at', '')
-            ])
-        
-        # Export Survey Responses
-        ws_surveys = wb.create_sheet("Enquêtes_Satisfaction")
-        ws_surveys.append([
-            "ID", "Compte ID", "Division", "Période", "Note Globale", 
-            "Commentaires", "Date soumission"
-        ])
-        survey_responses = await db.survey_responses.find({}, {'_id': 0}).to_list(1000)
-        for s in survey_responses:
-            ws_surveys.append([
-                s.get('id', ''),
-                s.get('compte_id', ''),
-                s.get('division', ''),
-                s.get('periode', ''),
-                s.get('note_globale', ''),
-                s.get('commentaires', ''),
-                s.get('submitted_at', '')
-            ])
-        
-        # Style headers
-        header_fill = PatternFill(start_color="2563EB", end_color="2563EB", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True)
-        
-        for sheet in wb.worksheets:
-            for cell in sheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Save to temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        wb.save(temp_file.name)
-        temp_file.close()
-        
-        # Return file
+        # Return file, removed once it has been sent
         return FileResponse(
             temp_file.name,
             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            filename=f'export_als_groupe_{datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")}.xlsx'
+            filename=f'export_als_groupe_{datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")}.xlsx',
+            background=BackgroundTask(os.remove, temp_file.name)
         )
         
     except Exception as e:
+        os.remove(temp_file.name)
         logger.error(f"Error exporting data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'export: {str(e)}")
 
+# ==================== JOB ROUTES ====================
+
+async def export_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    path = ctx.result_file('.xlsx')
+    await build_export_workbook(path, ctx.progress)
+    return {
+        'result_path': path,
+        'result_filename': f'export_als_groupe_{datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")}.xlsx',
+        'result_media_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    }
+
+async def backup_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    # backup.py is the CLI module; it runs on a sync client in a worker thread
+    import backup
+    from pymongo import MongoClient
+    
+    loop = asyncio.get_running_loop()
+    
+    def progress(percent: int, message: str):
+        # Raises JobCancelled inside the thread when the job is cancelled
+        asyncio.run_coroutine_threadsafe(ctx.progress(percent, message), loop).result()
+    
+    def run():
+        sync_client = MongoClient(mongo_url, readPreference='secondaryPreferred')
+        try:
+            return backup.run_backup(sync_client[os.environ['DB_NAME']], BACKUP_DIR,
+                                     full=bool(params.get('full')),
+                                     include_sessions=bool(params.get('include_sessions')),
+                                     progress=progress)
+        finally:
+            sync_client.close()
+    
+    manifest = await run_job_work(run)
+    return {'result': {'id': manifest['id'], 'base': manifest['base'], **manifest['stats']}}
+
+async def delete_comptes_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    compte_ids = DeleteComptesParams.model_validate(params).compte_ids
+    deleted = 0
+    for i, compte_id in enumerate(compte_ids):
+        if await delete_compte_cascade(compte_id, user_id):
+            deleted += 1
+        await ctx.progress(int((i + 1) * 100 / len(compte_ids)), compte_id)
+    return {'result': {'requested': len(compte_ids), 'deleted': deleted}}
+
+def lane_updates(opps: List[dict], now: str) -> list:
+    from pymongo import UpdateOne
+    
+    updates = []
+    for opp in opps:
+        fields = lane_fields(opp)
+        if any(opp.get(k) != v for k, v in fields.items()):
+            # Only real changes move the sync watermark
+            fields['updated_at'] = now
+        updates.append(UpdateOne({'id': opp['id']}, {'$set': fields}))
+    return updates
+
+async def backfill_lanes_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    # Idempotent: recomputes the derived fields, so a retried run just redoes them
+    total = await count_partitioned(db, 'opportunites', {})
+    done = 0
+    projection = {'_id': 0, 'id': 1, 'depart': 1, 'arrivee': 1, 'temperatures': 1, 'lane_key': 1, 'temperature_regime': 1}
+    now = datetime.now(timezone.utc).isoformat()
+    for name in partition_names('opportunites'):
+        batch = []
+        async for opp in db[name].find({}, projection):
+            batch.append(opp)
+            if len(batch) >= 1000:
+                await db[name].bulk_write(await run_job_work(lane_updates, batch, now), ordered=False)
+                done += len(batch)
+                batch = []
+                await ctx.progress(int(done * 100 / max(total, 1)), f'{done}/{total}')
+        if batch:
+            await db[name].bulk_write(await run_job_work(lane_updates, batch, now), ordered=False)
+            done += len(batch)
+    return {'result': {'updated': done}}
+
+def build_seed_transitions(opps: List[dict], first: Dict[str, Optional[str]]) -> List[dict]:
+    seeds = []
+    for opp in opps:
+        if opp['id'] in first and first[opp['id']] is None:
+            continue  # initial transition already recorded
+        transition = OpportuniteTransition(
+            opportunite_id=opp['id'],
+            to_statut=first.get(opp['id']) or opp.get('statut') or 'Prospecté',
+            changed_by=opp.get('commercial_responsable') or 'system'
+        )
+        transition_dict = transition.model_dump()
+        created_at = opp.get('created_at')
+        transition_dict['changed_at'] = created_at.isoformat() if isinstance(created_at, datetime) else created_at
+        transition_dict['seeded'] = True
+        seeds.append(transition_dict)
+    return seeds
+
+async def seed_transitions(opps: List[dict]) -> int:
+    # The initial status of each opportunité, dated at its creation. One already edited since
+    # transitions are recorded started from the from_statut of its first transition.
+    first = {r['_id']: r['from_statut'] async for r in db.opportunite_transitions.aggregate([
+        {'$match': {'opportunite_id': {'$in': [o['id'] for o in opps]}}},
+        {'$sort': {'changed_at': 1}},
+        {'$group': {'_id': '$opportunite_id', 'from_statut': {'$first': '$from_statut'}}}
+    ])}
+    seeds = await run_job_work(build_seed_transitions, opps, first)
+    if seeds:
+        await db.opportunite_transitions.insert_many(seeds)
+    return len(seeds)
+
+async def seed_transitions_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    # Idempotent: opportunités that already have an initial transition are skipped
+    total = await count_with_archive(db, 'opportunites', {})
+    done, seeded = 0, 0
+    projection = {'_id': 0, 'id': 1, 'statut': 1, 'created_at': 1, 'commercial_responsable': 1}
+    for name in partition_names('opportunites') + partition_names('opportunites_archive'):
+        batch = []
+        async for opp in db[name].find({}, projection):
+            batch.append(opp)
+            if len(batch) >= 1000:
+                seeded += await seed_transitions(batch)
+                done += len(batch)
+                batch = []
+                await ctx.progress(int(done * 100 / max(total, 1)), f'{done}/{total}')
+        if batch:
+            seeded += await seed_transitions(batch)
+            done += len(batch)
+    return {'result': {'scanned': done, 'seeded': seeded}}
+
+async def migrate_divisions_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    return {'result': await migrate_divisions(ctx.progress)}
+
+async def archive_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    return {'result': await run_archiving(ctx.progress)}
+
+async def init_translations_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    return {'result': await seed_default_translations(user_id, ctx.progress)}
+
+async def init_custom_statuses_job(ctx: JobContext, params: dict, user_id: str) -> dict:
+    return {'result': await seed_default_statuses(user_id, ctx.progress)}
+
+# roles=None means any authenticated user, as for the matching inline endpoint
+JOB_TYPES = {
+    'export': {'handler': export_job, 'roles': ['Admin_Directeur']},
+    'backup': {'handler': backup_job, 'roles': ['Admin_Directeur']},
+    'delete_comptes': {'handler': delete_comptes_job, 'roles': ['Admin_Directeur'], 'params': DeleteComptesParams},
+    'backfill_lanes': {'handler': backfill_lanes_job, 'roles': ['Admin_Directeur']},
+    'seed_transitions': {'handler': seed_transitions_job, 'roles': ['Admin_Directeur']},
+    'archive': {'handler': archive_job, 'roles': ['Admin_Directeur']},
+    'migrate_divisions': {'handler': migrate_divisions_job, 'roles': ['Admin_Directeur']},
+    'init_translations': {'handler': init_translations_job, 'roles': ['Admin_Directeur']},
+    'init_custom_statuses': {'handler': init_custom_statuses_job, 'roles': ['Admin_Directeur']},
+}
+
+async def get_visible_job(job_id: str, user: User) -> dict:
+    job = await db.jobs.find_one({'id': job_id}, {'_id': 0})
+    if not job or (job['created_by'] != user.id and user.role != 'Admin_Directeur'):
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    return job
+
+@api_router.post("/jobs")
+async def submit_job(data: JobSubmit, user: User = Depends(get_current_user)):
+    job_type = JOB_TYPES.get(data.type)
+    if not job_type:
+        raise HTTPException(status_code=400, detail=f"Type de tâche inconnu: {data.type}")
+    if job_type['roles'] and user.role not in job_type['roles']:
+        raise HTTPException(status_code=403, detail="Accès réservé à la Direction commerciale")
+    params = data.params
+    if job_type.get('params'):
+        try:
+            params = job_type['params'].model_validate(data.params).model_dump()
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Paramètres invalides: {e.errors(include_url=False)}")
+    
+    job = {
+        'id': str(uuid.uuid4()),
+        'type': data.type,
+        'params': params,
+        'status': 'queued',
+        'progress': 0,
+        'message': None,
+        'attempts': 0,
+        'cancel_requested': False,
+        'created_by': user.id,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    await db.jobs.insert_one(job)
+    job_wakeup.set()
+    job.pop('_id', None)
+    return job
+
+@api_router.get("/jobs")
+async def get_jobs(user: User = Depends(get_current_user)):
+    query = {} if user.role == 'Admin_Directeur' else {'created_by': user.id}
+    return await db.jobs.find(query, {'_id': 0, 'result_path': 0}).sort('created_at', -1).to_list(50)
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: User = Depends(get_current_user)):
+    job = await get_visible_job(job_id, user)
+    job.pop('result_path', None)
+    return job
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job_progress(job_id: str, request: Request, user: User = Depends(get_current_user)):
+    await get_visible_job(job_id, user)
+    
+    async def event_source():
+        last = None
+        while not await request.is_disconnected():
+            job = await db.jobs.find_one({'id': job_id}, {'_id': 0, 'status': 1, 'progress': 1, 'message': 1, 'error': 1})
+            if job != last:
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+                last = job
+            if not job or job['status'] in JOB_FINISHED_STATUSES:
+                break
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(event_source(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, user: User = Depends(get_current_user)):
+    job = await get_visible_job(job_id, user)
+    if job['status'] != 'succeeded':
+        raise HTTPException(status_code=409, detail="Tâche non terminée")
+    if job.get('result_expired'):
+        raise HTTPException(status_code=410, detail="Résultat expiré")
+    if job.get('result_path'):
+        return FileResponse(job['result_path'], media_type=job['result_media_type'], filename=job['result_filename'])
+    return job.get('result')
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, user: User = Depends(get_current_user)):
+    await get_visible_job(job_id, user)
+    
+    result = await db.jobs.update_one(
+        {'id': job_id, 'status': 'queued'},
+        {'$set': {'status': 'cancelled', 'finished_at': datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.modified_count:
+        return {'message': 'Tâche annulée'}
+    
+    # Running: the owning worker stops at its next progress checkpoint
+    await db.jobs.update_one({'id': job_id, 'status': 'running'}, {'$set': {'cancel_requested': True}})
+    task = running_jobs.get(job_id)
+    if task:
+        cancelled_jobs.add(job_id)
+        task.cancel()
+    return {'message': 'Annulation demandée'}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(status_code=401, detail="Non authentifié")
+    gauges = {
+        'audit_queue_depth': audit_queue.qsize(),
+        'audit_entries_dropped': audit_stats['dropped'],
+        'dashboard_streams': len(dashboard_streams),
+        'survey_requests_in_flight': survey_admission['in_flight'],
+        'survey_requests_rejected': survey_admission['rejected']
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type='text/plain; version=0.0.4')
+
 # Include router
 app.include_router(api_router)
 
+# Added before CORS so rejected survey requests still carry CORS headers
+app.add_middleware(SurveyAdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1116,12 +3868,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def startup_background_jobs():
+    slow_ops_state['loop'] = asyncio.get_running_loop()
+    # Readiness: fail startup rather than accept traffic without a database
+    try:
+        await db.command('ping')
+    except Exception as e:
+        logger.error(f"MongoDB not reachable at startup: {str(e)}")
+        raise
+    await db.opportunite_transitions.create_index([('opportunite_id', 1), ('changed_at', 1)])
+    await db.opportunite_transitions.create_index([('to_statut', 1)])
+    await db.audit_log.create_index([('entity', 1), ('entity_id', 1), ('ts', -1)])
+    # Per-entity listing without an entity_id: equality on entity, sorted by ts
+    await db.audit_log.create_index([('entity', 1), ('ts', -1)])
+    await db.audit_log.create_index([('ts', -1)])
+    if DIVISION_PARTITIONING:
+        await refresh_legacy_collections()
+        if legacy_collections:
+            logger.warning(f"Division partitioning is on but legacy collections {sorted(legacy_collections)} still hold documents; they are read alongside the partitions until the migrate_divisions job has moved them")
+    await ensure_archive_collections()
+    for name in partition_names('quality_records'):
+        await db[name].create_index([('compte_id', 1), ('periode', 1)])
+        await db[name].create_index([('division', 1), ('region', 1), ('periode', 1)])
+        await db[name].create_index('id')
+    for name in partition_names('incidents'):
+        await db[name].create_index([('gravite', 1), ('type', 1), ('statut', 1)])
+        await db[name].create_index('quality_record_id')
+        await db[name].create_index([('statut', 1), ('closed_at', 1)])
+    for name in partition_names('opportunites'):
+        await db[name].create_index([('lane_key', 1), ('temperature_regime', 1)])
+        await db[name].create_index([('statut', 1), ('created_at', 1)])
+    for name in partition_names('incidents_archive'):
+        await db[name].create_index('id', unique=True)
+        await db[name].create_index('quality_record_id')
+    for name in partition_names('opportunites_archive'):
+        await db[name].create_index('id', unique=True)
+        await db[name].create_index('compte_id')
+    await db.jobs.create_index('id', unique=True)
+    await db.jobs.create_index([('status', 1), ('created_at', 1)])
+    await db.jobs.create_index([('created_by', 1), ('created_at', -1)])
+    await db.request_profiles.create_index('expire_at', expireAfterSeconds=0)
+    for collection in SYNC_COLLECTIONS:
+        for name in partition_names(collection):
+            await db[name].create_index([('updated_at', 1), ('id', 1)])
+    await db.tombstones.create_index([('collection', 1), ('updated_at', 1), ('id', 1)])
+    await db.tombstones.create_index('expire_at', expireAfterSeconds=0)
+    background_tasks.append(asyncio.create_task(audit_flusher()))
+    background_tasks.append(asyncio.create_task(backfill_updated_at()))
+    background_tasks.append(asyncio.create_task(dashboard_broadcaster()))
+    background_tasks.append(asyncio.create_task(job_dispatcher()))
+    background_tasks.append(asyncio.create_task(
+        run_periodic('job_recovery', JOB_STALE_SECONDS, recover_stale_jobs)
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodic('job_cleanup', 3600, cleanup_job_results)
+    ))
+    if DASHBOARD_CHANGE_STREAM:
+        background_tasks.append(asyncio.create_task(dashboard_change_stream()))
+    background_tasks.append(asyncio.create_task(
+        run_periodic('funnel_analytics', FUNNEL_REFRESH_SECONDS, refresh_funnel_cache)
+    ))
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodic('archive', ARCHIVE_INTERVAL_SECONDS, run_archiving)
+        ))
+    if legacy_collections:
+        # Notices a migration finished by another worker
+        background_tasks.append(asyncio.create_task(
+            run_periodic('legacy_collections', 300, refresh_legacy_collections)
+        ))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    job_executor.shutdown(wait=False, cancel_futures=True)
     client.close()
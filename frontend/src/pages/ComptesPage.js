@@ -16,7 +16,6 @@ const API = `${BACKEND_URL}/api`;
 
 const ComptesPage = () => {
   const [comptes, setComptes] = useState([]);
-  const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [dialogOpen, setDialogOpen] = useState(false);
@@ -43,12 +42,10 @@ const ComptesPage = () => {
   const fetchComptes = async () => {
     try {
       const token = localStorage.getItem('session_token');
-      const [comptesRes, usersRes] = await Promise.all([
-        axios.get(`${API}/comptes`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/admin/users`, { headers: { Authorization: `Bearer ${token}` } }).catch(() => ({ data: [] }))
-      ]);
-      setComptes(comptesRes.data);
-      setUsers(usersRes.data);
+      const response = await axios.get(`${API}/comptes?expand=created_by`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setComptes(response.data);
     } catch (error) {
       console.error('Error fetching comptes:', error);
       toast.error('Erreur lors du chargement des comptes');
@@ -94,11 +91,6 @@ const ComptesPage = () => {
     compte.contact_nom?.toLowerCase().includes(searchTerm.toLowerCase())
   );
 
-  const getCreatorName = (createdBy) => {
-    const creator = users.find(u => u.id === createdBy);
-    return creator ? creator.name : 'Inconnu';
-  };
-
   return (
     <Layout>
       <div className="p-6 space-y-6" data-testid="comptes-page">
@@ -362,7 +354,7 @@ const ComptesPage = () => {
                     </div>
                   )}
                   <div className="text-xs text-gray-500 mt-3 pt-3 border-t">
-                    Créé par: <strong>{getCreatorName(compte.created_by)}</strong>
+                    Créé par: <strong>{compte.created_by_name || 'Inconnu'}</strong>
                   </div>
                 </CardContent>
               </Card>
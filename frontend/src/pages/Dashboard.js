@@ -15,8 +15,64 @@ const Dashboard = () => {
 
   useEffect(() => {
     fetchDashboardStats();
+    const controller = new AbortController();
+    streamDashboardStats(controller.signal);
+    return () => controller.abort();
   }, []);
 
+  const applyDashboardEvent = (type, data) => {
+    if (type === 'snapshot') {
+      setStats(data);
+    } else if (type === 'delta') {
+      setStats((prev) => {
+        if (!prev) return prev;
+        const next = { ...prev };
+        Object.entries(data).forEach(([section, values]) => {
+          next[section] = { ...prev[section], ...values };
+        });
+        return next;
+      });
+    }
+  };
+
+  // Server-Sent Events over fetch so the bearer token stays in the headers
+  const streamDashboardStats = async (signal) => {
+    while (!signal.aborted) {
+      try {
+        const token = localStorage.getItem('session_token');
+        const response = await fetch(`${API}/dashboard/stream`, {
+          headers: { Authorization: `Bearer ${token}` },
+          credentials: 'include',
+          signal
+        });
+        if (!response.ok || !response.body) return;
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          const events = buffer.split('\n\n');
+          buffer = events.pop();
+          events.forEach((raw) => {
+            let type = 'message';
+            let data = '';
+            raw.split('\n').forEach((line) => {
+              if (line.startsWith('event: ')) type = line.slice(7);
+              else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (data) applyDashboardEvent(type, JSON.parse(data));
+          });
+        }
+      } catch (error) {
+        if (signal.aborted) return;
+        console.error('Dashboard stream error:', error);
+      }
+      // Reconnect after a short pause if the stream dropped
+      await new Promise((resolve) => setTimeout(resolve, 5000));
+    }
+  };
+
   const fetchDashboardStats = async () => {
     try {
       const token = localStorage.getItem('session_token');
@@ -44,15 +44,20 @@ const OpportunitesPage = () => {
     fetchData();
   }, []);
 
+  // The comptes list is only needed by the creation form's selector
+  useEffect(() => {
+    if (dialogOpen && comptes.length === 0) {
+      fetchComptes();
+    }
+  }, [dialogOpen]);
+
   const fetchData = async () => {
     try {
       const token = localStorage.getItem('session_token');
-      const [oppsRes, comptesRes] = await Promise.all([
-        axios.get(`${API}/opportunites`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/comptes`, { headers: { Authorization: `Bearer ${token}` } })
-      ]);
-      setOpportunites(oppsRes.data);
-      setComptes(comptesRes.data);
+      const response = await axios.get(`${API}/opportunites?expand=compte`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setOpportunites(response.data);
     } catch (error) {
       console.error('Error fetching data:', error);
       toast.error('Erreur lors du chargement');
@@ -61,6 +66,19 @@ const OpportunitesPage = () => {
     }
   };
 
+  const fetchComptes = async () => {
+    try {
+      const token = localStorage.getItem('session_token');
+      const response = await axios.get(`${API}/comptes`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setComptes(response.data);
+    } catch (error) {
+      console.error('Error fetching comptes:', error);
+      toast.error('Erreur lors du chargement des comptes');
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -109,8 +127,6 @@ const OpportunitesPage = () => {
     return badges[statut] || 'badge-prospected';
   };
 
-  const getCompteById = (id) => comptes.find(c => c.id === id);
-
   const handleEditStart = (opp) => {
     setEditingId(opp.id);
     setEditData({
@@ -387,7 +403,7 @@ const OpportunitesPage = () => {
         ) : (
           <div className="grid grid-cols-1 gap-4">
             {opportunites.map((opp) => {
-              const compte = getCompteById(opp.compte_id);
+              const compte = opp.compte;
               const isEditing = editingId === opp.id;
               const editable = canEdit(opp);
               
@@ -0,0 +1,111 @@
+"""Cold-start budget check: import time and time-to-first-request.
+
+    python -m tests.bench.cold_start --budget-ms 1500 [--runs 5] [--with-startup]
+
+Each run starts a fresh interpreter, imports server.py and serves one
+request in-process. Exits non-zero when the median exceeds the budget.
+Without --with-startup no MongoDB is needed (the probe hits /metrics).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+PROBE = r'''
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import server
+t_import = time.perf_counter()
+
+async def first_request():
+    # Bare ASGI call: nothing but server.py and its imports is inside the measured window
+    if {with_startup!r}:
+        await server.app.router.startup()
+    scope = {{'type': 'http', 'asgi': {{'version': '3.0'}}, 'http_version': '1.1', 'method': 'GET',
+              'scheme': 'http', 'path': {path!r}, 'raw_path': {path!r}.encode(), 'query_string': b'',
+              'root_path': '', 'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0),
+              'server': ('localhost', 80)}}
+    messages = []
+
+    async def receive():
+        return {{'type': 'http.request', 'body': b'', 'more_body': False}}
+
+    async def send(message):
+        messages.append(message)
+
+    await server.app(scope, receive, send)
+    if {with_startup!r}:
+        await server.app.router.shutdown()
+    return next(m['status'] for m in messages if m['type'] == 'http.response.start')
+
+status = asyncio.run(first_request())
+t_first = time.perf_counter()
+print(json.dumps({{'import_ms': (t_import - t0) * 1000, 'first_request_ms': (t_first - t0) * 1000,
+                  'status': status, 'modules': len(sys.modules)}}))
+'''
+
+
+def run_probe(with_startup: bool, path: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'als_cold_start')
+    code = PROBE.format(backend=str(ROOT_DIR / 'backend'), with_startup=with_startup, path=path)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(limit: int) -> list:
+    # Cumulative cost of each package imported by server.py, from -X importtime
+    env = dict(os.environ)
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'als_cold_start')
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import server'],
+                         cwd=ROOT_DIR / 'backend', env=env, capture_output=True, text=True)
+    costs = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, raw_name = line[len('import time:'):].split('|')
+        # Nested imports are indented two spaces per level; keep server.py's direct imports
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        name = raw_name.strip().split('.')[0]
+        costs[name] = max(costs.get(name, 0), int(cumulative) / 1000)
+    return sorted(costs.items(), key=lambda item: -item[1])[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start against a time budget')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('COLD_START_BUDGET_MS', '1500')))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--with-startup', action='store_true', help='include startup hooks (needs MongoDB)')
+    parser.add_argument('--path', default='/metrics')
+    parser.add_argument('--top', type=int, default=10, help='show the N most expensive imports')
+    args = parser.parse_args()
+
+    runs = [run_probe(args.with_startup, args.path) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in runs)
+    first_ms = statistics.median(r['first_request_ms'] for r in runs)
+    print(f'import server:        {import_ms:8.1f} ms (median of {args.runs})')
+    print(f'time to first request: {first_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)')
+    print(f'modules loaded:       {runs[-1]["modules"]}')
+    if args.top:
+        print('slowest imports from server.py:')
+        for name, ms in top_imports(args.top):
+            print(f'  {name:24} {ms:8.1f} ms')
+
+    if first_ms > args.budget_ms:
+        print('FAIL: cold start over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
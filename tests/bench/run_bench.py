@@ -0,0 +1,251 @@
+"""In-process API benchmark.
+
+    python -m tests.bench.run_bench --scale 1k --concurrency 16 --requests 200 \
+        --output bench_results/$(git rev-parse --short HEAD).json [--compare previous.json]
+
+Seeds (unless --no-seed) a dedicated database, drives the FastAPI app
+directly through ASGI, and reports p50/p95/p99 latency, throughput and
+peak RSS per endpoint as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tests.bench.seed import seed, parse_scale, BENCH_ADMIN_EMAIL, BENCH_PASSWORD
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+# (name, method, path, requests divisor) - heavy endpoints run fewer iterations
+ENDPOINTS = [
+    ('login', 'POST', '/api/auth/login', 1),
+    ('comptes', 'GET', '/api/comptes', 1),
+    ('opportunites', 'GET', '/api/opportunites', 1),
+    ('quality', 'GET', '/api/quality', 1),
+    ('incidents', 'GET', '/api/incidents', 1),
+    ('survey_responses', 'GET', '/api/surveys/responses', 1),
+    ('dashboard_stats', 'GET', '/api/dashboard/stats', 1),
+    ('export_data', 'GET', '/api/admin/export-data', 10),
+]
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client: calls the ASGI app without sockets."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, headers: dict = None, body: bytes = b''):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        request_sent = False
+        response = {'status': None, 'body': bytearray()}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await asyncio.sleep(3600)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+        await self.app(scope, receive, send)
+        return response['status'], bytes(response['body'])
+
+
+class RSSSampler:
+    """Tracks peak resident memory over a window (Linux /proc, ru_maxrss elsewhere)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def _current(self) -> int:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self._page_size
+        except OSError:
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._current())
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+async def bench_endpoint(client: ASGIClient, method: str, path: str, headers: dict, body: bytes,
+                         total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in counter:
+            start = time.perf_counter()
+            status, _ = await client.request(method, path, headers, body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+async def run(args) -> dict:
+    # server.py reads its configuration at import time
+    os.environ['MONGO_URL'] = args.mongo_url
+    os.environ['DB_NAME'] = args.db
+    sys.path.insert(0, str(ROOT_DIR / 'backend'))
+    import server
+
+    await server.app.router.startup()
+    try:
+        client = ASGIClient(server.app)
+        login_body = json.dumps({'email': BENCH_ADMIN_EMAIL, 'password': BENCH_PASSWORD}).encode()
+        json_headers = {'content-type': 'application/json'}
+        status, payload = await client.request('POST', '/api/auth/login', json_headers, login_body)
+        if status != 200:
+            raise SystemExit(f'Login failed ({status}): is the database seeded?')
+        auth_headers = {'authorization': f"Bearer {json.loads(payload)['token']}"}
+
+        results = {}
+        for name, method, path, divisor in ENDPOINTS:
+            if args.only and name not in args.only:
+                continue
+            total = max(1, args.requests // divisor)
+            if name == 'login':
+                results[name] = await bench_endpoint(client, method, path, json_headers, login_body,
+                                                     total, args.concurrency)
+            else:
+                results[name] = await bench_endpoint(client, method, path, auth_headers, b'',
+                                                     total, min(args.concurrency, total))
+            print(f"{name:18} p50={results[name]['p50_ms']:>9}ms p95={results[name]['p95_ms']:>9}ms "
+                  f"p99={results[name]['p99_ms']:>9}ms {results[name]['throughput_rps']:>8} req/s "
+                  f"rss={results[name]['peak_rss_mb']}MB errors={results[name]['errors']}")
+        return results
+    finally:
+        await server.app.router.shutdown()
+
+
+def compare(current: dict, previous: dict):
+    print('\nDelta vs previous run (p95 / throughput):')
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if not before:
+            continue
+        p95 = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        rps = (result['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100 \
+            if before['throughput_rps'] else 0
+        print(f'{name:18} p95 {p95:+7.1f}%  throughput {rps:+7.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API in-process against a seeded MongoDB')
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default=os.environ.get('BENCH_DB_NAME', 'als_bench'))
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m or a number of comptes')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-seed', action='store_true', help='reuse an already seeded database')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+    parser.add_argument('--only', nargs='*', help='subset of endpoint names')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--compare', help='previous JSON results to diff against')
+    args = parser.parse_args()
+
+    n_comptes = parse_scale(args.scale)
+    seed_counts = None
+    if not args.no_seed:
+        seed_counts = seed(args.mongo_url, args.db, n_comptes, args.seed)
+
+    results = asyncio.run(run(args))
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'scale': n_comptes,
+            'seed': args.seed,
+            'seed_counts': seed_counts,
+            'concurrency': args.concurrency,
+            'requests_per_endpoint': args.requests,
+        },
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == '__main__':
+    main()
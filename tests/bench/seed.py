@@ -0,0 +1,224 @@
+"""Deterministic synthetic data seeder for benchmarks.
+
+    python -m tests.bench.seed --scale 1k --db als_bench
+
+Scales: 1k / 100k / 1m comptes (or any integer). Other collections are
+generated proportionally. The same seed always yields the same documents.
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import bcrypt
+from pymongo import MongoClient
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+BATCH_SIZE = 10_000
+
+# Documents generated per compte
+OPPORTUNITES_PER_COMPTE = 2
+QUALITY_RECORDS_PER_COMPTE = 2
+INCIDENTS_PER_QUALITY_RECORD = 0.5
+SURVEYS_PER_COMPTE = 1
+SCORES_PER_SURVEY = 4
+
+BENCH_PASSWORD = 'bench-password'
+BENCH_ADMIN_EMAIL = 'admin@bench.als'
+
+DIVISIONS = ['ALS FRESH FOOD', 'ALS PHARMA']
+REGIONS = ['IDF', 'HDF']
+SECTEURS = ['GMS', 'Restauration', 'Industrie', 'Pharmacie', 'Grossiste']
+TAILLES = ['TPE', 'PME', 'enseigne', 'groupe']
+VILLES = [('Paris', '75001'), ('Rungis', '94150'), ('Lille', '59000'), ('Amiens', '80000'),
+          ('Roissy', '95700'), ('Arras', '62000'), ('Évry', '91000'), ('Beauvais', '60000')]
+STATUTS = ['Prospecté', 'En discussion', 'Devis envoyé', 'Négociation', 'Signé', 'Perdu']
+TEMPERATURES = ['Frais +2/+4', 'Surgelé -18', 'Pharma +15/+25', 'Multi-température']
+CANAUX = ['Salon', 'Recommandation', 'Appel entrant', 'Prospection']
+GRAVITES = ['Faible', 'Moyen', 'Critique']
+INCIDENT_TYPES = ['Retard', 'Rupture froid', 'Casse', 'Erreur livraison']
+INCIDENT_STATUTS = ['Ouvert', 'En cours', 'Résolu', 'Clos']
+THEMES = ['Conducteurs', 'Matériel', 'Tournées', 'Service client']
+ROLES = ['Admin_Directeur', 'Assistante_Direction', 'Directrice_Clientele',
+         'Assistante_Clientele', 'DevCo_IDF', 'DevCo_HDF']
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value)
+
+
+def det_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def det_date(rng: random.Random, max_days: int = 700) -> datetime:
+    return EPOCH + timedelta(seconds=rng.randrange(max_days * 86400))
+
+
+def build_users(rng: random.Random) -> list:
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    users = []
+    for i, role in enumerate(ROLES * 3):
+        users.append({
+            'id': det_uuid(rng),
+            'email': BENCH_ADMIN_EMAIL if i == 0 else f'user{i}@bench.als',
+            'name': f'Bench {role} {i}',
+            'password_hash': password_hash,
+            'picture': None,
+            'role': role,
+            'division': DIVISIONS[i % 2],
+            'region': REGIONS[i % 2],
+            'created_at': EPOCH.isoformat()
+        })
+    return users
+
+
+def generate(n_comptes: int, seed: int, users: list):
+    """Yields (collection, document) in a single streaming pass."""
+    rng = random.Random(seed)
+    commerciaux = [u['id'] for u in users if u['role'].startswith('DevCo') or u['role'] == 'Admin_Directeur']
+    for _ in range(n_comptes):
+        ville, code_postal = rng.choice(VILLES)
+        division = rng.choice(DIVISIONS)
+        region = rng.choice(REGIONS)
+        compte_id = det_uuid(rng)
+        created_at = det_date(rng)
+        yield 'comptes', {
+            'id': compte_id,
+            'raison_sociale': f'Société {rng.randrange(10 ** 8):08d}',
+            'division': division,
+            'adresse': f'{rng.randrange(1, 200)} rue du Marché',
+            'ville': ville,
+            'code_postal': code_postal,
+            'region': region,
+            'secteur': rng.choice(SECTEURS),
+            'taille': rng.choice(TAILLES),
+            'contact_nom': f'Contact {rng.randrange(10 ** 6)}',
+            'contact_poste': 'Responsable logistique',
+            'contact_email': f'contact{rng.randrange(10 ** 8)}@example.com',
+            'contact_telephone': f'01{rng.randrange(10 ** 8):08d}',
+            'source': rng.choice(CANAUX),
+            'created_by': rng.choice(commerciaux),
+            'created_at': created_at.isoformat()
+        }
+        for _ in range(OPPORTUNITES_PER_COMPTE):
+            depart, _ = rng.choice(VILLES)
+            arrivee, _ = rng.choice(VILLES)
+            yield 'opportunites', {
+                'id': det_uuid(rng),
+                'compte_id': compte_id,
+                'type_besoin': 'Transport régulier',
+                'volumes_estimes': f'{rng.randrange(1, 40)} palettes/semaine',
+                'temperatures': rng.choice(TEMPERATURES),
+                'frequence': rng.choice(['Quotidien', 'Hebdomadaire', 'Mensuel']),
+                'marchandises': 'Produits frais',
+                'depart': depart,
+                'arrivee': arrivee,
+                'contraintes_horaires': None,
+                'urgence': None,
+                'commercial_responsable': rng.choice(commerciaux),
+                'date_premier_contact': created_at.isoformat(),
+                'canal': rng.choice(CANAUX),
+                'statut': rng.choice(STATUTS),
+                'montant_estime': round(rng.uniform(1_000, 250_000), 2),
+                'prochaine_relance': None,
+                'commentaires': None,
+                'created_at': created_at.isoformat()
+            }
+        for _ in range(QUALITY_RECORDS_PER_COMPTE):
+            record_id = det_uuid(rng)
+            yield 'quality_records', {
+                'id': record_id,
+                'compte_id': compte_id,
+                'division': division,
+                'region': region,
+                'periode': f'{rng.choice([2024, 2025])}-{rng.randrange(1, 13):02d}',
+                'type_prestation': 'Livraison',
+                'taux_service': round(rng.uniform(85, 100), 1),
+                'nb_incidents': rng.randrange(0, 5),
+                'score_satisfaction': round(rng.uniform(4, 9), 1),
+                'commentaires': None,
+                'created_at': det_date(rng).isoformat()
+            }
+            if rng.random() < INCIDENTS_PER_QUALITY_RECORD:
+                statut = rng.choice(INCIDENT_STATUTS)
+                opened = det_date(rng)
+                yield 'incidents', {
+                    'id': det_uuid(rng),
+                    'quality_record_id': record_id,
+                    'type': rng.choice(INCIDENT_TYPES),
+                    'gravite': rng.choice(GRAVITES),
+                    'description': 'Incident synthétique',
+                    'statut': statut,
+                    'action_corrective': None,
+                    'closed_at': (opened + timedelta(hours=rng.randrange(1, 500))).isoformat()
+                    if statut in ('Clos', 'Résolu') else None,
+                    'created_at': opened.isoformat()
+                }
+        for _ in range(SURVEYS_PER_COMPTE):
+            response_id = det_uuid(rng)
+            yield 'survey_responses', {
+                'id': response_id,
+                'compte_id': compte_id,
+                'division': division,
+                'periode': f'2025-{rng.randrange(1, 13):02d}',
+                'note_globale': rng.randrange(0, 10),
+                'commentaires': None,
+                'submitted_at': det_date(rng).isoformat()
+            }
+            for theme in THEMES[:SCORES_PER_SURVEY]:
+                yield 'survey_scores', {
+                    'id': det_uuid(rng),
+                    'response_id': response_id,
+                    'theme': theme,
+                    'item_key': f'{theme.lower()}.global',
+                    'score': rng.randrange(0, 10)
+                }
+
+
+def seed(mongo_url: str, db_name: str, n_comptes: int, seed_value: int = 42, drop: bool = True) -> dict:
+    db = MongoClient(mongo_url)[db_name]
+    collections = ['users', 'comptes', 'opportunites', 'quality_records', 'incidents',
+                   'survey_responses', 'survey_scores']
+    if drop:
+        for name in collections:
+            db[name].drop()
+
+    users = build_users(random.Random(seed_value))
+    db.users.insert_many(users)
+    counts = {'users': len(users)}
+
+    # Stream documents into per-collection buffers, memory stays bounded by BATCH_SIZE
+    buffers = {name: [] for name in collections}
+    for name, doc in generate(n_comptes, seed_value, users):
+        buffer = buffers[name]
+        buffer.append(doc)
+        if len(buffer) >= BATCH_SIZE:
+            db[name].insert_many(buffer, ordered=False)
+            counts[name] = counts.get(name, 0) + len(buffer)
+            buffer.clear()
+    for name, buffer in buffers.items():
+        if buffer:
+            db[name].insert_many(buffer, ordered=False)
+            counts[name] = counts.get(name, 0) + len(buffer)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a MongoDB database with synthetic CRM data')
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default=os.environ.get('BENCH_DB_NAME', 'als_bench'))
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m or a number of comptes')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    counts = seed(args.mongo_url, args.db, parse_scale(args.scale), args.seed)
+    for name, count in counts.items():
+        print(f'{name}: {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py reads these at import; Motor connects lazily, so unit tests need no MongoDB
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'als_test')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    # Every handle the handlers read or write through points at one in-memory database
+    import server
+    from tests.fakes import FakeDatabase
+
+    database = FakeDatabase()
+    for name in ('db', 'analytics_db', 'list_db'):
+        monkeypatch.setattr(server, name, database)
+    return database
@@ -0,0 +1,213 @@
+"""In-memory stand-ins for the Motor and redis.asyncio API surface the
+server uses, so route logic can be unit-tested without MongoDB or Redis.
+Only the operators and commands the tested code paths issue are
+implemented."""
+import copy
+import itertools
+from types import SimpleNamespace
+
+_object_ids = itertools.count(1)
+
+
+def get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return SimpleNamespace(missing=True)
+        value = value[part]
+    return value
+
+
+def is_missing(value) -> bool:
+    return isinstance(value, SimpleNamespace)
+
+
+def sort_key(doc: dict, path: str) -> tuple:
+    # Missing and null sort first, as in MongoDB
+    value = get_path(doc, path)
+    return (0, '') if is_missing(value) or value is None else (1, value)
+
+
+def matches_condition(value, condition) -> bool:
+    if not (isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition)):
+        return not is_missing(value) and value == condition
+    for op, arg in condition.items():
+        if op == '$exists':
+            if is_missing(value) == bool(arg):
+                return False
+        elif op == '$in':
+            if is_missing(value) or value not in arg:
+                return False
+        elif op == '$nin':
+            if not is_missing(value) and value in arg:
+                return False
+        elif op == '$ne':
+            if not is_missing(value) and value == arg:
+                return False
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            if is_missing(value) or value is None:
+                return False
+            if not {'$gt': value > arg, '$gte': value >= arg, '$lt': value < arg, '$lte': value <= arg}[op]:
+                return False
+        else:
+            raise NotImplementedError(op)
+    return True
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif not matches_condition(get_path(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc: dict, projection: dict) -> dict:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    if any(v for k, v in projection.items()):
+        doc = {k: v for k, v in doc.items() if projection.get(k) or k == '_id'}
+    else:
+        doc = {k: v for k, v in doc.items() if k not in projection}
+    if projection.get('_id') == 0:
+        doc.pop('_id', None)
+    return doc
+
+
+class FakeCursor:
+    def __init__(self, docs: list):
+        self.docs = docs
+        self.limit_count = 0
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for key, order in reversed(keys):
+            self.docs.sort(key=lambda d: sort_key(d, key), reverse=order < 0)
+        return self
+
+    def limit(self, count: int):
+        self.limit_count = count
+        return self
+
+    async def to_list(self, length=None):
+        docs = self.docs[:self.limit_count] if self.limit_count else self.docs
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in await self.to_list(None):
+                yield doc
+        return iterate()
+
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: list = []
+        self.indexes: list = []
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([project(d, projection) for d in self.docs if matches(d, query or {})])
+
+    async def find_one(self, query=None, projection=None):
+        docs = await self.find(query, projection).to_list(1)
+        return docs[0] if docs else None
+
+    async def insert_one(self, doc: dict):
+        doc.setdefault('_id', next(_object_ids))
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc['_id'])
+
+    async def insert_many(self, docs: list, ordered=True):
+        for doc in docs:
+            await self.insert_one(doc)
+        return SimpleNamespace(inserted_ids=[d['_id'] for d in docs])
+
+    async def update_one(self, query: dict, update: dict, upsert=False):
+        return await self._update(query, update, many=False)
+
+    async def update_many(self, query: dict, update: dict):
+        return await self._update(query, update, many=True)
+
+    async def _update(self, query, update, many):
+        modified = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(copy.deepcopy(update.get('$set', {})))
+                modified += 1
+                if not many:
+                    break
+        return SimpleNamespace(matched_count=modified, modified_count=modified)
+
+    async def delete_many(self, query: dict):
+        kept = [d for d in self.docs if not matches(d, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def find_one_and_delete(self, query: dict, projection=None):
+        doc = await self.find_one(query)
+        if doc:
+            await self.delete_many({'_id': doc['_id']})
+        return project(doc, projection) if doc else None
+
+    async def bulk_write(self, requests: list, ordered=True):
+        for request in requests:
+            existing = [d for d in self.docs if matches(d, request._filter)]
+            if existing:
+                _id = existing[0]['_id']
+                existing[0].clear()
+                existing[0].update({**copy.deepcopy(request._doc), '_id': _id})
+            elif request._upsert:
+                await self.insert_one(copy.deepcopy(request._doc))
+
+    async def distinct(self, field: str, query=None):
+        return list({d[field] for d in self.docs if matches(d, query or {}) and field in d})
+
+    async def count_documents(self, query: dict):
+        return sum(1 for d in self.docs if matches(d, query))
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections: dict = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class FakeRedis:
+    # The redis.asyncio commands RedisResponseCache issues; several caches can share one store
+    def __init__(self):
+        self.values: dict = {}
+        self.expiry: dict = {}
+
+    async def get(self, key: str):
+        return self.values.get(key)
+
+    async def set(self, key: str, value, ex=None):
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+        self.expiry[key] = ex
+
+    async def mget(self, keys: list):
+        return [self.values.get(k) for k in keys]
+
+    async def incr(self, key: str):
+        value = int(self.values.get(key, b'0')) + 1
+        self.values[key] = str(value).encode()
+        return value
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import IncidentCreate, OpportuniteCreate, User
+
+ADMIN = User(email='direction@als.fr', name='Direction', role='Admin_Directeur')
+
+
+def test_editing_an_archived_opportunite_is_a_conflict(fake_db):
+    fake_db.opportunites_archive.docs = [{'id': 'o1', 'compte_id': 'c1', 'statut': 'Perdu'}]
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.update_opportunite('o1', OpportuniteCreate(compte_id='c1'), ADMIN))
+    assert error.value.status_code == 409
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.update_opportunite('unknown', OpportuniteCreate(compte_id='c1'), ADMIN))
+    assert error.value.status_code == 404
+
+
+def test_editing_an_archived_incident_is_a_conflict(fake_db):
+    fake_db.incidents_archive.docs = [{'id': 'i1', 'quality_record_id': 'q1', 'statut': 'Clos'}]
+    data = IncidentCreate(quality_record_id='q1', type='Retard', gravite='Faible', description='Livraison tardive')
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.update_incident('i1', data, ADMIN))
+    assert error.value.status_code == 409
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import server
+from server import audit_diff
+
+
+def test_audit_diff_lists_changed_fields_only():
+    before = {'_id': 1, 'id': 'c1', 'ville': 'Rungis', 'region': 'IDF', 'password_hash': 'old'}
+    after = {'_id': 2, 'id': 'c1', 'ville': 'Lille', 'region': 'IDF', 'password_hash': 'new', 'taille': 'PME'}
+    assert audit_diff(before, after) == {
+        'ville': {'before': 'Rungis', 'after': 'Lille'},
+        'taille': {'before': None, 'after': 'PME'}
+    }
+
+
+def test_audit_diff_of_create_and_delete():
+    doc = {'id': 'c1', 'ville': 'Rungis'}
+    assert audit_diff(None, doc) == {'id': {'before': None, 'after': 'c1'}, 'ville': {'before': None, 'after': 'Rungis'}}
+    assert audit_diff(doc, None) == {'id': {'before': 'c1', 'after': None}, 'ville': {'before': 'Rungis', 'after': None}}
+
+
+@pytest.fixture
+def audit(fake_db, monkeypatch):
+    monkeypatch.setattr(server, 'audit_stats', {'enqueued': 0, 'flushed': 0, 'dropped': 0})
+    monkeypatch.setattr(server, 'AUDIT_BATCH_SIZE', 3)
+    monkeypatch.setattr(server, 'AUDIT_FLUSH_SECONDS', 0.05)
+    batches = []
+    insert_many = fake_db.audit_log.insert_many
+
+    async def recording_insert_many(docs, ordered=True):
+        batches.append(len(docs))
+        return await insert_many(docs, ordered=ordered)
+
+    monkeypatch.setattr(fake_db.audit_log, 'insert_many', recording_insert_many)
+    return fake_db, batches
+
+
+def test_noop_update_is_not_audited(audit, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, 'audit_queue', asyncio.Queue(maxsize=10))
+        await server.audit_change('comptes', 'c1', 'update', 'u1', {'ville': 'Rungis'}, {'ville': 'Rungis'})
+        await server.audit_change('comptes', 'c1', 'update', 'u1', {'ville': 'Rungis'}, {'ville': 'Lille'})
+        return server.drain_audit_queue()
+
+    entries = asyncio.run(scenario())
+    assert [e['changes'] for e in entries] == [{'ville': {'before': 'Rungis', 'after': 'Lille'}}]
+
+
+def test_flusher_writes_full_batches_then_the_rest_after_the_delay(audit, monkeypatch):
+    fake_db, batches = audit
+
+    async def scenario():
+        monkeypatch.setattr(server, 'audit_queue', asyncio.Queue(maxsize=100))
+        for i in range(7):
+            await server.audit_change('comptes', f'c{i}', 'create', 'u1', None, {'id': f'c{i}'})
+        flusher = asyncio.create_task(server.audit_flusher())
+        await asyncio.sleep(0.15)
+        # Shutdown persists what is still buffered
+        for i in range(2):
+            await server.audit_change('comptes', f'd{i}', 'delete', 'u1', {'id': f'd{i}'}, None)
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert batches == [3, 3, 1, 2]
+    assert len(fake_db.audit_log.docs) == 9
+    assert server.audit_stats == {'enqueued': 9, 'flushed': 9, 'dropped': 0}
+
+
+def test_full_queue_drops_instead_of_blocking(audit, monkeypatch):
+    monkeypatch.setattr(server, 'AUDIT_ENQUEUE_TIMEOUT', 0.01)
+
+    async def scenario():
+        monkeypatch.setattr(server, 'audit_queue', asyncio.Queue(maxsize=1))
+        for i in range(3):
+            await server.audit_change('comptes', f'c{i}', 'create', 'u1', None, {'id': f'c{i}'})
+
+    asyncio.run(scenario())
+    assert server.audit_stats == {'enqueued': 1, 'flushed': 0, 'dropped': 2}
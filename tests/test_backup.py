@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import backup
+
+
+def stamp(offset_seconds: int = 0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat()
+
+
+def test_diff_ids_finds_added_and_removed():
+    previous = [ObjectId() for _ in range(5)]
+    added = ObjectId()
+    current = sorted([i for i in previous if i != previous[2]] + [added])
+    assert backup.diff_ids(iter(current), iter(previous)) == ([added], [previous[2]])
+
+
+def test_diff_ids_follows_mongodb_type_order():
+    oid = ObjectId()
+    previous = [1, 'a', oid]
+    current = [2.5, 'a', 'b', oid, True]
+    assert backup.diff_ids(iter(current), iter(previous)) == ([2.5, 'b', True], [1])
+
+
+@pytest.fixture
+def mongo():
+    # Round trips need a real server; they are skipped where none is reachable
+    client = MongoClient(os.environ['MONGO_URL'], serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        pytest.skip('MongoDB is not reachable')
+    names = ['als_backup_source', 'als_backup_target']
+    yield [client[n] for n in names]
+    for n in names:
+        client.drop_database(n)
+    client.close()
+
+
+def contents(db) -> dict:
+    return {n: sorted(db[n].find(), key=lambda d: d['_id']) for n in db.list_collection_names()}
+
+
+def test_incremental_chain_restores_to_the_source(mongo, tmp_path, monkeypatch):
+    source, target = mongo
+    monkeypatch.setattr(backup, 'CHUNK_DOCS', 7)
+    monkeypatch.setattr(backup, 'WATERMARK_LAG_SECONDS', 0)
+    source.comptes__als_pharma.insert_many([{'id': str(i), 'n': i, 'updated_at': stamp(-3600)} for i in range(30)])
+    source.opportunite_transitions.insert_many([{'i': i} for i in range(20)])
+    source.users.insert_many([{'u': i} for i in range(10)])
+    full = backup.run_backup(source, tmp_path)
+
+    # In-place update, delete, insert with an old stamp, append, and a collection created since
+    source.comptes__als_pharma.update_one({'id': '3'}, {'$set': {'n': 'changed', 'updated_at': stamp(1)}})
+    source.comptes__als_pharma.delete_one({'id': '5'})
+    source.comptes__als_pharma.insert_one({'id': 'new', 'updated_at': stamp(-7200)})
+    source.opportunite_transitions.delete_one({'i': 0})
+    source.opportunite_transitions.insert_one({'i': 'new'})
+    source.users.update_one({'u': 1}, {'$set': {'u': 'renamed'}})
+    source.incidents.insert_one({'id': 'i1', 'updated_at': stamp()})
+    delta = backup.run_backup(source, tmp_path)
+    assert delta['base'] == full['id']
+    assert delta['collections']['comptes__als_pharma']['mode'] == 'delta'
+    assert delta['collections']['comptes__als_pharma']['changed'] == 2
+    assert delta['collections']['comptes__als_pharma']['deleted'] == 1
+
+    source.comptes__als_pharma.update_one({'id': '7'}, {'$set': {'n': 'again', 'updated_at': stamp(2)}})
+    source.comptes__als_pharma.delete_one({'id': '3'})
+    last = backup.run_backup(source, tmp_path)
+    assert last['chain_length'] == 2
+
+    assert backup.verify_backup(tmp_path / last['id']) == []
+    backup.run_restore(target, tmp_path / last['id'])
+    assert contents(target) == contents(source)
+    # Everything in the chain is still needed by the latest backup
+    assert backup.prune_backups(tmp_path, 1) == []
@@ -0,0 +1,52 @@
+import pytest
+
+from server import lane_fields, place_key, temperature_regime
+
+
+@pytest.mark.parametrize('place', ['Rungis (94150)', 'rungis 94', 'RUNGIS', 'Rungis cedex', ' rungis  (94) '])
+def test_place_key_is_the_same_for_one_place(place):
+    assert place_key(place) == 'rungis'
+
+
+@pytest.mark.parametrize('place, key', [
+    ('St Denis (93200)', 'saint-denis'),
+    ('Ste Geneviève des Bois', 'sainte-genevieve-des-bois'),
+    ('Lyon 3e', 'lyon'),
+    ('94150', '94'),
+    ('97400', '974'),
+    ('(2A)', '2a'),
+    ('', None),
+    ('   ', None),
+    (None, None),
+])
+def test_place_key(place, key):
+    assert place_key(place) == key
+
+
+def test_lane_key_joins_both_ends():
+    assert lane_fields({'depart': 'Rungis (94150)', 'arrivee': 'LILLE'})['lane_key'] == 'rungis>lille'
+    assert lane_fields({'depart': 'Rungis', 'arrivee': ''})['lane_key'] is None
+
+
+@pytest.mark.parametrize('temperatures, regime', [
+    ('+20/+25', 'Pharma'),
+    ('+15/+25°C', 'Pharma'),
+    ('+8/+25', 'Pharma'),
+    ('2-8°C', 'Frais'),
+    ('+2/+4', 'Frais'),
+    ('0/4', 'Frais'),
+    ('+4', 'Frais'),
+    ('-18°C', 'Surgelé'),
+    ('- 25', 'Surgelé'),
+    ('-18/+4', 'Multi-température'),
+    ('Frais', 'Frais'),
+    ('surgelés', 'Surgelé'),
+    ('bi-température', 'Multi-température'),
+    ('Produits pharmaceutiques', 'Pharma'),
+    ('+12/+30', 'Autre'),
+    ('ambiant', 'Autre'),
+    ('', None),
+    (None, None),
+])
+def test_temperature_regime(temperatures, regime):
+    assert temperature_regime(temperatures) == regime
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+import server
+from server import MetricsMiddleware, metrics_inc, metrics_observe, render_metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(server, 'metrics_local', threading.local())
+    monkeypatch.setattr(server, 'metrics_shards', [])
+
+
+def in_thread(fn, *args):
+    thread = threading.Thread(target=fn, args=args)
+    thread.start()
+    thread.join()
+
+
+def test_counters_are_summed_across_shards():
+    labels = (('collection', 'comptes'), ('command', 'find'))
+    metrics_inc('mongodb_command_documents_total', labels, 3)
+    in_thread(metrics_inc, 'mongodb_command_documents_total', labels, 4)
+    assert len(server.metrics_shards) == 2
+    assert render_metrics({}).splitlines() == [
+        '# TYPE mongodb_command_documents_total counter',
+        'mongodb_command_documents_total{collection="comptes",command="find"} 7'
+    ]
+
+
+def test_histograms_are_cumulative_with_sum_and_count():
+    labels = (('method', 'GET'), ('route', '/api/comptes'))
+    metrics_observe('http_request_duration_seconds', labels, 0.004)
+    metrics_observe('http_request_duration_seconds', labels, 0.3)
+    in_thread(metrics_observe, 'http_request_duration_seconds', labels, 60)
+    lines = render_metrics({}).splitlines()
+    assert lines[0] == '# TYPE http_request_duration_seconds histogram'
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(' ', 1)[1]) for line in lines if '_bucket' in line}
+    assert buckets['0.005'] == 1 and buckets['0.25'] == 1 and buckets['0.5'] == 2 and buckets['10.0'] == 2
+    assert buckets['+Inf'] == 3
+    assert 'http_request_duration_seconds_sum{method="GET",route="/api/comptes"} 60.304' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/comptes"} 3' in lines
+
+
+def test_gauges_follow_the_collected_metrics():
+    metrics_inc('http_requests_total', (('method', 'GET'), ('route', '/api/comptes'), ('status', '200')))
+    text = render_metrics({'audit_queue_depth': 2, 'dashboard_streams': 0})
+    assert text.endswith('# TYPE audit_queue_depth gauge\naudit_queue_depth 2\n'
+                         '# TYPE dashboard_streams gauge\ndashboard_streams 0\n')
+    assert text.startswith('# TYPE http_requests_total counter\n')
+
+
+def test_requests_are_labelled_by_route_template():
+    router = APIRouter(prefix='/api')
+
+    @router.get('/comptes/{compte_id}')
+    async def get_compte(compte_id: str):
+        return {'id': compte_id}
+
+    @router.get('/boom')
+    async def boom():
+        raise RuntimeError('boom')
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            for compte_id in ('c1', 'c2'):
+                assert (await client.get(f'/api/comptes/{compte_id}')).status_code == 200
+            assert (await client.get('/api/inconnu/c3')).status_code == 404
+            assert (await client.get('/api/boom')).status_code == 500
+
+    asyncio.run(scenario())
+    assert server.metrics_counter_total('http_requests_total') == {
+        (('method', 'GET'), ('route', '/api/comptes/{compte_id}'), ('status', '200')): 2,
+        (('method', 'GET'), ('route', 'unmatched'), ('status', '404')): 1,
+        (('method', 'GET'), ('route', '/api/boom'), ('status', '500')): 1
+    }
+    durations = render_metrics({})
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/comptes/{compte_id}"} 2' in durations
+    assert 'c1' not in durations and 'c2' not in durations
@@ -0,0 +1,96 @@
+import math
+import random
+
+import pytest
+
+from server import percentile, percentile_accumulators, percentile_rank_stages, ranked_percentile
+
+QUANTILES = [0.5, 0.9, 0.95]
+
+
+def evaluate(expr, doc: dict):
+    # The aggregation operators percentile_accumulators emits
+    if isinstance(expr, str) and expr.startswith('$'):
+        return doc.get(expr[1:])
+    if not isinstance(expr, dict):
+        return expr
+    (op, args), = expr.items()
+    if op == '$floor':
+        return math.floor(evaluate(args, doc))
+    values = [evaluate(a, doc) for a in args]
+    if op == '$add':
+        return sum(values)
+    if op == '$multiply':
+        return math.prod(values)
+    if op == '$subtract':
+        return values[0] - values[1]
+    if op == '$min':
+        return min(values)
+    if op == '$and':
+        return all(values)
+    if op == '$eq':
+        return values[0] == values[1]
+    if op == '$cond':
+        return values[1] if values[0] else values[2]
+    raise NotImplementedError(op)
+
+
+def run_pipeline(docs: list) -> dict:
+    # percentile_rank_stages then a $group by 'group' with percentile_accumulators, in Python
+    stages = percentile_rank_stages('$group', 'value')
+    assert stages[0] == {'$set': {'_ranked': {'$isNumber': '$value'}}}
+    partitions: dict = {}
+    for doc in docs:
+        ranked = isinstance(doc.get('value'), (int, float)) and not isinstance(doc.get('value'), bool)
+        partitions.setdefault((doc['group'], ranked), []).append({**doc, '_ranked': ranked})
+    ranked_docs = []
+    for (_, ranked), members in partitions.items():
+        if ranked:
+            members.sort(key=lambda d: d['value'])
+        ranked_docs += [{**d, '_rank': i + 1, '_n': len(members)} for i, d in enumerate(members)]
+
+    rows: dict = {}
+    for name, accumulator in percentile_accumulators('value', QUANTILES).items():
+        for doc in ranked_docs:
+            value = evaluate(accumulator['$max'], doc)
+            row = rows.setdefault(doc['group'], {})
+            # $max ignores nulls
+            if value is not None and (row.get(name) is None or value > row[name]):
+                row[name] = value
+            row.setdefault(name, None)
+    return rows
+
+
+@pytest.mark.parametrize('values', [
+    [7],
+    [3, 1],
+    [5, 5, 5, 5],
+    [0.5, 12, 3.25, 8, 8, 1, 40, 2],
+    list(range(1, 101)),
+])
+def test_ranked_percentile_matches_percentile(values):
+    rows = run_pipeline([{'group': 'g', 'value': v} for v in values])
+    for q in QUANTILES:
+        assert ranked_percentile(rows['g'], q) == pytest.approx(percentile(sorted(values), q))
+
+
+def test_groups_are_ranked_separately_and_non_numbers_are_skipped():
+    rng = random.Random(7)
+    groups = {g: [rng.randint(0, 500) for _ in range(rng.randint(1, 40))] for g in 'abc'}
+    docs = [{'group': g, 'value': v} for g, values in groups.items() for v in values]
+    docs += [{'group': 'a', 'value': None}, {'group': 'b', 'value': 'n/a'}, {'group': 'c'}]
+    docs += [{'group': 'empty', 'value': None}, {'group': 'empty', 'value': True}]
+    rng.shuffle(docs)
+    rows = run_pipeline(docs)
+    for g, values in groups.items():
+        assert rows[g]['_n'] == len(values)
+        for q in QUANTILES:
+            assert ranked_percentile(rows[g], q) == pytest.approx(percentile(sorted(values), q))
+            assert ranked_percentile(rows[g], q, scale=3600) == pytest.approx(percentile(sorted(values), q) / 3600)
+    assert all(ranked_percentile(rows['empty'], q) is None for q in QUANTILES)
+
+
+def test_ranked_percentile_of_empty_rows():
+    assert ranked_percentile({}, 0.5) is None
+    assert ranked_percentile({'_n': 0, '_p50_lo': None, '_p50_hi': None}, 0.5) is None
+    assert percentile([], 0.5) is None
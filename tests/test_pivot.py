@@ -0,0 +1,60 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from server import PivotMeasure, PivotSpec, compute_pivot, validate_pivot_spec
+
+
+@pytest.mark.parametrize('spec', [
+    PivotSpec(source='users', rows=['role']),
+    PivotSpec(source='opportunites', rows=[]),
+    PivotSpec(source='opportunites', rows=['password_hash']),
+    PivotSpec(source='opportunites', rows=['created_at:week']),
+    PivotSpec(source='comptes', rows=['compte.region']),
+    PivotSpec(source='opportunites', rows=['statut'], measures=[PivotMeasure(field='montant_estime', agg='median')]),
+    PivotSpec(source='opportunites', rows=['statut'], measures=[PivotMeasure(field='secret', agg='sum')]),
+    PivotSpec(source='opportunites', rows=['statut'], measures=[PivotMeasure(agg='sum')]),
+    PivotSpec(source='opportunites', rows=['statut'], filters={'password_hash': 'x'}),
+])
+def test_validate_pivot_spec_rejects(spec):
+    with pytest.raises(HTTPException) as error:
+        validate_pivot_spec(spec)
+    assert error.value.status_code == 400
+
+
+def test_validate_pivot_spec_returns_the_fields_to_load():
+    spec = PivotSpec(source='opportunites', rows=['compte.region', 'created_at:month'], columns=['statut'],
+                     measures=[PivotMeasure(field='montant_estime', agg='sum')])
+    assert validate_pivot_spec(spec) == ['compte.region', 'created_at', 'montant_estime', 'statut']
+
+
+@pytest.mark.parametrize('value', [{'$ne': None}, [{'$gt': ''}], {'nested': 1}])
+def test_filter_values_cannot_be_operators(value):
+    with pytest.raises(ValidationError):
+        PivotSpec(source='opportunites', rows=['statut'], filters={'statut': value})
+
+
+def test_compute_pivot_counts_and_sums():
+    spec = PivotSpec(source='opportunites', rows=['statut'],
+                     measures=[PivotMeasure(agg='count'), PivotMeasure(field='montant_estime', agg='sum')])
+    columns = {'statut': ['Gagné', 'Perdu', 'Gagné', None], 'montant_estime': [100, 50, 25, 10]}
+    result = compute_pivot(spec, columns)
+    assert result['columns'] == ['statut', 'count(*)', 'sum(montant_estime)']
+    assert sorted(result['rows']) == [['(vide)', 1, 10], ['Gagné', 2, 125], ['Perdu', 1, 50]]
+
+
+def test_compute_pivot_buckets_dates_and_flattens_columns():
+    spec = PivotSpec(source='opportunites', rows=['created_at:month'], columns=['statut'])
+    columns = {
+        'created_at': ['2026-01-05T10:00:00+00:00', '2026-01-20T10:00:00+00:00', '2026-02-01T00:00:00+00:00',
+                       None, 'pas une date'],
+        'statut': ['Gagné', 'Perdu', 'Gagné', 'Gagné', 'Gagné']
+    }
+    result = compute_pivot(spec, columns)
+    assert result['columns'] == ['created_at:month', 'count(*) | Gagné', 'count(*) | Perdu']
+    assert sorted(result['rows'], key=str) == [['(vide)', 2, None], ['2026-01', 1, 1], ['2026-02', 1, None]]
+
+
+def test_compute_pivot_without_rows_of_data():
+    spec = PivotSpec(source='incidents', rows=['gravite'])
+    assert compute_pivot(spec, {'gravite': []}) == {'columns': ['gravite'], 'rows': []}
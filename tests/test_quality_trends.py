@@ -0,0 +1,43 @@
+import pytest
+
+from server import compute_quality_trends
+
+
+def rows(key: str, taux: list, satisfaction: float = 8.0, incidents: int = 1) -> list:
+    return [{'key': key, 'periode': f'2025-{m + 1:02d}' if m < 12 else f'2026-{m - 11:02d}', 'taux_service': t,
+             'score_satisfaction': satisfaction, 'nb_incidents': incidents, 'records': 1}
+            for m, t in enumerate(taux)]
+
+
+def test_rolling_windows_follow_the_periodes_of_each_key():
+    taux = [90 + m for m in range(14)]
+    # Shuffled input: the series is ordered by période before the windows are taken
+    result = compute_quality_trends(list(reversed(rows('A', taux))) + rows('B', [80, 70]), top=10)
+    series = [r for r in result['series'] if r['key'] == 'A']
+    assert [r['periode'] for r in series][:2] == ['2025-01', '2025-02']
+    last = series[-1]
+    assert last['taux_service_avg3'] == pytest.approx(sum(taux[-3:]) / 3)
+    assert last['taux_service_avg12'] == pytest.approx(sum(taux[-12:]) / 12)
+    assert last['taux_service_delta'] == 1
+    assert series[0]['taux_service_delta'] is None
+    # B's windows do not reach into A's rows
+    b = [r for r in result['series'] if r['key'] == 'B']
+    assert b[0]['taux_service_avg3'] == 80 and b[1]['taux_service_avg3'] == 75
+    assert result['periodes'] == 14
+
+
+def test_degrading_keys_are_ranked_by_how_far_they_fell():
+    steady = rows('steady', [90] * 12)
+    improving = rows('improving', [80] * 9 + [95] * 3)
+    slipping = rows('slipping', [90] * 9 + [85] * 3)
+    collapsing = rows('collapsing', [90] * 9 + [60] * 3)
+    result = compute_quality_trends(steady + improving + slipping + collapsing, top=10)
+    assert [r['key'] for r in result['degrading']] == ['collapsing', 'slipping']
+    assert result['degrading'][0]['taux_service_trend'] == pytest.approx(60 - 82.5)
+    assert [r['key'] for r in compute_quality_trends(slipping + collapsing, top=1)['degrading']] == ['collapsing']
+
+
+def test_missing_metrics_are_null_and_no_rows_is_empty():
+    result = compute_quality_trends(rows('A', [None, 90]), top=10)
+    assert result['series'][0]['taux_service'] is None
+    assert compute_quality_trends([], top=10) == {'series': [], 'degrading': []}
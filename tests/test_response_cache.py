@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+from server import InMemoryResponseCache, RedisResponseCache, cached_response, publish_event
+from tests.fakes import FakeRedis
+
+
+class Compute:
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {'calls': self.calls}
+
+
+def use_cache(monkeypatch, backend):
+    monkeypatch.setattr(server, 'response_cache', backend)
+    monkeypatch.setattr(server, 'response_cache_inflight', {})
+    monkeypatch.setattr(server, 'pending_tag_bumps', {})
+    return backend
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request, monkeypatch):
+    if request.param == 'memory':
+        return use_cache(monkeypatch, InMemoryResponseCache(100, 1 << 20))
+    return use_cache(monkeypatch, RedisResponseCache(FakeRedis()))
+
+
+def body(response) -> dict:
+    return json.loads(response.body)
+
+
+def test_repeated_request_is_served_from_cache(cache):
+    compute = Compute()
+
+    async def scenario():
+        first = await cached_response('/t', 'all', ['comptes'], compute, params={'page': 1})
+        second = await cached_response('/t', 'all', ['comptes'], compute, params={'page': 1})
+        other_scope = await cached_response('/t', 'IDF', ['comptes'], compute, params={'page': 1})
+        return first, second, other_scope
+
+    first, second, other_scope = asyncio.run(scenario())
+    assert body(first) == body(second) == {'calls': 1}
+    assert body(other_scope) == {'calls': 2}
+
+
+def test_write_to_a_tag_invalidates_only_its_entries(cache):
+    compute = Compute()
+
+    async def scenario():
+        await cached_response('/t', 'all', ['comptes'], compute)
+        publish_event('users', 'update')
+        unrelated = await cached_response('/t', 'all', ['comptes'], compute)
+        publish_event('comptes', 'update')
+        # Read-your-writes: the request right after the write awaits its bump
+        related = await cached_response('/t', 'all', ['comptes'], compute)
+        return unrelated, related
+
+    unrelated, related = asyncio.run(scenario())
+    assert body(unrelated) == {'calls': 1}
+    assert body(related) == {'calls': 2}
+
+
+def test_concurrent_misses_compute_once(cache):
+    compute = Compute(delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(*(cached_response('/t', 'all', ['comptes'], compute) for _ in range(5)))
+
+    responses = asyncio.run(scenario())
+    assert compute.calls == 1
+    assert all(body(r) == {'calls': 1} for r in responses)
+
+
+def test_bump_from_another_worker_invalidates(monkeypatch):
+    shared = FakeRedis()
+    here = use_cache(monkeypatch, RedisResponseCache(shared))
+    elsewhere = RedisResponseCache(shared)
+    compute = Compute()
+
+    async def scenario():
+        await cached_response('/t', 'all', ['opportunites'], compute)
+        await elsewhere.bump('opportunites')
+        return await cached_response('/t', 'all', ['opportunites'], compute)
+
+    assert body(asyncio.run(scenario())) == {'calls': 2}
+    assert asyncio.run(here.tag_versions(['opportunites'])) == [1]
+
+
+def test_every_pending_bump_is_awaited(monkeypatch):
+    class SlowFirstBump(InMemoryResponseCache):
+        calls = 0
+
+        async def bump(self, tag: str):
+            self.calls += 1
+            await asyncio.sleep(0.02 if self.calls == 1 else 0)
+            await super().bump(tag)
+
+    backend = use_cache(monkeypatch, SlowFirstBump(100, 1 << 20))
+
+    async def scenario():
+        publish_event('comptes', 'update')
+        await asyncio.sleep(0)
+        publish_event('comptes', 'update')
+        await cached_response('/t', 'all', ['comptes'], Compute())
+
+    asyncio.run(scenario())
+    assert backend.versions == {'comptes': 2}
+    assert list(backend.entries)[0].endswith('|2')
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = InMemoryResponseCache(max_entries=2, max_bytes=1000)
+
+    async def scenario():
+        await cache.set('a', b'1', 30)
+        await cache.set('b', b'2', 30)
+        await cache.get('a')
+        await cache.set('c', b'3', 30)
+        return [await cache.get(k) for k in 'abc']
+
+    assert asyncio.run(scenario()) == [b'1', None, b'3']
+
+
+def test_memory_cache_is_bounded_by_size_and_ttl():
+    cache = InMemoryResponseCache(max_entries=10, max_bytes=10)
+
+    async def scenario():
+        await cache.set('a', b'123456', 30)
+        await cache.set('b', b'654321', 30)
+        await cache.set('expired', b'x', -1)
+        return await cache.get('a'), await cache.get('b'), await cache.get('expired')
+
+    assert asyncio.run(scenario()) == (None, b'654321', None)
+    assert cache.size == 6
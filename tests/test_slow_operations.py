@@ -0,0 +1,82 @@
+from collections import deque
+
+import pytest
+
+import server
+from server import command_filter, query_shape, record_slow_command, summarize_explain
+
+
+def test_query_shape_keeps_fields_and_operators_only():
+    query = {'division': 'ALS PHARMA', 'montant_estime': {'$gte': 1000.5},
+             'statut': {'$in': ['Gagné', 'Perdu', 'En cours', 'Abandonné']},
+             '$or': [{'region': 'IDF'}, {'archived': {'$ne': True}}], 'compte_id': None}
+    assert query_shape(query) == {
+        'division': 'str', 'montant_estime': {'$gte': 'float'},
+        'statut': {'$in': ['str', 'str', 'str']},
+        '$or': [{'region': 'str'}, {'archived': {'$ne': 'bool'}}], 'compte_id': 'NoneType'
+    }
+
+
+@pytest.mark.parametrize('name, command, expected', [
+    ('find', {'find': 'comptes', 'filter': {'region': 'IDF'}}, {'region': 'IDF'}),
+    ('count', {'count': 'comptes', 'query': {'region': 'IDF'}}, {'region': 'IDF'}),
+    ('aggregate', {'aggregate': 'comptes', 'pipeline': [{'$match': {'region': 'IDF'}}]}, [{'$match': {'region': 'IDF'}}]),
+    ('update', {'update': 'comptes', 'updates': [{'q': {'id': 'c1'}, 'u': {}}]}, {'id': 'c1'}),
+    ('delete', {'delete': 'comptes', 'deletes': [{'q': {'id': 'c1'}, 'limit': 1}]}, {'id': 'c1'}),
+    ('insert', {'insert': 'comptes', 'documents': [{'id': 'c1'}]}, {}),
+])
+def test_command_filter(name, command, expected):
+    assert command_filter(name, command) == expected
+
+
+def test_summarize_explain_of_a_find():
+    explain = {
+        'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'region_1'}}},
+        'executionStats': {'nReturned': 12, 'totalKeysExamined': 12, 'totalDocsExamined': 12, 'executionTimeMillis': 3}
+    }
+    assert summarize_explain(explain) == {'plan': ['FETCH', 'IXSCAN'], 'n_returned': 12, 'keys_examined': 12,
+                                          'docs_examined': 12, 'execution_ms': 3}
+
+
+def test_summarize_explain_unwraps_sbe_and_aggregations():
+    cursor = {
+        'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}, 'slotBasedPlan': {}}},
+        'executionStats': {'nReturned': 1, 'totalKeysExamined': 0, 'totalDocsExamined': 5000, 'executionTimeMillis': 240}
+    }
+    summary = summarize_explain({'stages': [{'$cursor': cursor}, {'$group': {}}]})
+    assert summary['plan'] == ['COLLSCAN'] and summary['docs_examined'] == 5000
+
+
+def test_summarize_explain_without_stats():
+    assert summarize_explain({}) == {'plan': [], 'n_returned': None, 'keys_examined': None,
+                                     'docs_examined': None, 'execution_ms': None}
+
+
+class RecordingLoop:
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+
+@pytest.fixture
+def slow_ops(monkeypatch):
+    loop = RecordingLoop()
+    monkeypatch.setattr(server, 'slow_operations', deque(maxlen=10))
+    monkeypatch.setattr(server, 'slow_explain_last', {})
+    monkeypatch.setattr(server, 'slow_ops_state', {'loop': loop, 'profiling': False})
+    monkeypatch.setattr(server, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+    return loop
+
+
+def test_slow_commands_are_explained_once_per_shape(slow_ops):
+    record_slow_command('find', 'comptes', {'find': 'comptes', 'filter': {'region': 'IDF'}}, 250.04)
+    record_slow_command('find', 'comptes', {'find': 'comptes', 'filter': {'region': 'Nord'}}, 300)
+    record_slow_command('find', 'comptes', {'find': 'comptes', 'filter': {'ville': 'Lille'}}, 300)
+    record_slow_command('insert', 'comptes', {'insert': 'comptes', 'documents': []}, 300)
+    record_slow_command('getMore', 'comptes', {'getMore': 1}, 300)
+    assert [e['shape'] for e in server.slow_operations] == [{'region': 'str'}, {'region': 'str'}, {'ville': 'str'}, {}]
+    assert server.slow_operations[0]['duration_ms'] == 250.0
+    # Same shape with other literals is one explain; inserts cannot be explained
+    assert len(slow_ops.callbacks) == 2
@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import server
+from server import InMemoryRateLimitBackend, SurveyAdmissionMiddleware
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def take(backend, key='k', rate=1.0, burst=3.0) -> float:
+    return asyncio.run(backend.take(key, rate, burst))
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    backend = InMemoryRateLimitBackend(max_keys=10)
+    assert [take(backend) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take(backend) == pytest.approx(1.0)
+    clock[0] += 0.5
+    assert take(backend) == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert take(backend) == 0.0
+    # A long idle period refills up to the burst, not beyond
+    clock[0] += 3600
+    assert [take(backend) for _ in range(4)][-2:] == [0.0, pytest.approx(1.0)]
+
+
+def test_buckets_are_per_key_and_lru_bounded(clock):
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    take(backend, 'a', burst=1)
+    assert take(backend, 'a', burst=1) > 0
+    assert take(backend, 'b', burst=1) == 0.0
+    take(backend, 'c', burst=1)
+    assert list(backend.buckets) == ['b', 'c']
+    # An evicted key starts again from a full bucket
+    assert take(backend, 'a', burst=1) == 0.0
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(server, 'rate_limiter', InMemoryRateLimitBackend(100))
+    monkeypatch.setattr(server, 'survey_admission', {'in_flight': 0, 'rejected': 0})
+    monkeypatch.setattr(server, 'SURVEY_MAX_BODY_BYTES', 100)
+    monkeypatch.setattr(server, 'SURVEY_IP_RATE', 1 / 60)
+    monkeypatch.setattr(server, 'SURVEY_IP_BURST', 2)
+
+    app = FastAPI()
+    seen = []
+
+    @app.post('/api/surveys/responses')
+    async def receive_survey(request: Request):
+        seen.append(server.survey_admission['in_flight'])
+        return {'bytes': len(await request.body())}
+
+    @app.post('/api/comptes')
+    async def other(request: Request):
+        return {'bytes': len(await request.body())}
+
+    app.add_middleware(SurveyAdmissionMiddleware)
+    return app, seen
+
+
+def post(app, *requests):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return [await client.post(path, **kwargs) for path, kwargs in requests]
+    return asyncio.run(scenario())
+
+
+def test_admitted_requests_are_counted_in_flight(admission):
+    app, seen = admission
+    response, = post(app, ('/api/surveys/responses', {'content': b'{}'}))
+    assert response.json() == {'bytes': 2}
+    assert seen == [1] and server.survey_admission['in_flight'] == 0
+
+
+@pytest.mark.parametrize('headers, status', [
+    ({'Content-Length': '101'}, 413),
+    ({'Content-Length': 'abc'}, 400),
+])
+def test_body_size_is_checked_from_the_header(admission, headers, status):
+    app, seen = admission
+    response, = post(app, ('/api/surveys/responses', {'content': b'x', 'headers': headers}))
+    assert response.status_code == status and seen == []
+
+
+def test_chunked_body_is_cut_off_past_the_limit(admission):
+    app, _ = admission
+
+    async def chunks():
+        for _ in range(3):
+            yield b'x' * 60
+
+    response, = post(app, ('/api/surveys/responses', {'content': chunks()}))
+    assert response.status_code == 413
+    assert server.survey_admission['in_flight'] == 0
+
+
+def test_ip_rate_limit_answers_429_with_retry_after(admission):
+    app, _ = admission
+    responses = post(app, *[('/api/surveys/responses', {'content': b'{}'})] * 3, ('/api/comptes', {'content': b'{}'}))
+    assert [r.status_code for r in responses] == [200, 200, 429, 200]
+    assert 55 <= int(responses[2].headers['Retry-After']) <= 60
+    assert responses[2].json() == {'detail': 'Trop de requêtes, veuillez réessayer plus tard'}
+    assert server.survey_admission['rejected'] == 1
+
+
+def test_requests_past_the_concurrency_limit_are_shed(admission, monkeypatch):
+    app, seen = admission
+    monkeypatch.setattr(server, 'SURVEY_MAX_CONCURRENCY', 1)
+    server.survey_admission['in_flight'] = 1
+    response, = post(app, ('/api/surveys/responses', {'content': b'{}'}))
+    assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+    assert seen == []
@@ -0,0 +1,102 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import CompteCreate, User, changes_page, decode_sync_token, encode_sync_token
+
+
+def token(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize('since', [
+    '%%%',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    token(['comptes', 'x']),
+    token({'comptes': 'x'}),
+    token({'comptes': ['2026-01-01T00:00:00+00:00']}),
+    token({'comptes': [1, None]}),
+    token({'comptes': ['2026-01-01T00:00:00+00:00', 2]}),
+    token({'comptes': [None, None]}),
+])
+def test_decode_sync_token_rejects_malformed_tokens(since):
+    with pytest.raises(HTTPException) as error:
+        decode_sync_token(since)
+    assert error.value.status_code == 400
+
+
+def test_sync_token_round_trip():
+    positions = {'comptes': ['2026-01-01T00:00:00+00:00', 'c1'], 'comptes:deleted': ['2026-01-01T00:00:00+00:00', None]}
+    assert decode_sync_token(encode_sync_token(positions)) == positions
+
+
+def test_changes_page_walks_the_keyset_in_order(fake_db):
+    stamps = ['2026-01-01T00:00:01+00:00', '2026-01-01T00:00:02+00:00', '2026-01-01T00:00:03+00:00']
+    # Ties on updated_at across two partitions, ordered by id
+    fake_db.a.docs = [{'id': i, 'updated_at': stamps[n % 3]} for n, i in enumerate('acegik')]
+    fake_db.b.docs = [{'id': i, 'updated_at': stamps[n % 3]} for n, i in enumerate('bdfhjl')]
+    upper = '2026-01-01T00:00:02+00:00'
+
+    async def walk():
+        seen, position, more = [], None, True
+        while more:
+            docs, position, more = await changes_page(['a', 'b'], {}, position, upper, 3)
+            seen += [(d['updated_at'], d['id']) for d in docs]
+        return seen, position
+
+    seen, position = asyncio.run(walk())
+    expected = sorted((d['updated_at'], d['id']) for d in fake_db.a.docs + fake_db.b.docs if d['updated_at'] <= upper)
+    assert seen == expected
+    assert position == [upper, None]
+
+
+def test_changes_page_resumes_after_the_watermark(fake_db):
+    fake_db.a.docs = [{'id': 'x', 'updated_at': '2026-01-01T00:00:01+00:00'},
+                      {'id': 'y', 'updated_at': '2026-01-01T00:00:05+00:00'}]
+    docs, position, more = asyncio.run(changes_page(
+        ['a'], {}, ['2026-01-01T00:00:02+00:00', None], '2026-01-01T00:00:09+00:00', 10))
+    assert [d['id'] for d in docs] == ['y'] and not more
+
+
+@pytest.fixture
+def partitioned(fake_db, monkeypatch):
+    monkeypatch.setattr(server, 'DIVISION_PARTITIONING', True)
+    monkeypatch.setattr(server, 'legacy_collections', set())
+    monkeypatch.setattr(server, 'SYNC_LAG_SECONDS', 0)
+    return fake_db
+
+
+def test_division_change_reaches_the_old_division_as_a_deletion(partitioned):
+    admin = User(email='direction@als.fr', name='Direction', role='Admin_Directeur')
+    reader = User(email='pharma@als.fr', name='Pharma', role='Directrice_Clientele', division='ALS PHARMA')
+    partitioned['comptes__als_pharma'].docs = [{
+        'id': 'c1', 'raison_sociale': 'Labo', 'division': 'ALS PHARMA', 'region': 'IDF',
+        'created_by': admin.id, 'created_at': '2026-01-01T00:00:00+00:00', 'updated_at': '2026-01-01T00:00:00+00:00'
+    }]
+
+    async def scenario():
+        first = await server.sync_changes(None, 500, reader)
+        assert [c['id'] for c in first['changes']['comptes']['upserts']] == ['c1']
+        await asyncio.sleep(0.001)
+        await server.update_compte('c1', CompteCreate(raison_sociale='Labo', division='ALS FRESH FOOD', region='IDF'),
+                                   admin)
+        await asyncio.sleep(0.001)
+        return await server.sync_changes(first['token'], 500, reader)
+
+    after = asyncio.run(scenario())
+    assert after['changes']['comptes'] == {'upserts': [], 'deleted': ['c1']}
+    assert partitioned.tombstones.docs[0]['division'] == 'ALS PHARMA'
+
+
+def test_backfill_stamps_legacy_documents_past_any_watermark(fake_db):
+    fake_db.comptes.docs = [{'_id': 1, 'id': 'old', 'created_at': '2020-01-01T00:00:00+00:00'},
+                            {'_id': 2, 'id': 'new', 'updated_at': '2026-01-01T00:00:00+00:00'}]
+    before = server.datetime.now(server.timezone.utc).isoformat()
+    asyncio.run(server.backfill_updated_at())
+    stamps = {d['id']: d['updated_at'] for d in fake_db.comptes.docs}
+    assert stamps['old'] >= before
+    assert stamps['new'] == '2026-01-01T00:00:00+00:00'